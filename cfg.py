@@ -9,3 +9,11 @@ PRINT_REPEAT_SECONDS = 30
 # eviction 관련 (나중에 쓸 자리)
 # MAX_EVICT_PER_ROUND = 2
 # EVICT_COOLDOWN_SEC = 5
+
+# traces 시간 파티션 (trace_store.py)
+TRACE_PARTITIONED = True
+TRACE_PARTITION_DIR = "/home/ubuntu/fairness_control/traces.d"
+TRACE_PARTITION_SEC = 3600
+
+# 서비스별 실행 시간 분포 sketch (latency_sketch.py) 시간 bucket 크기
+LATENCY_SKETCH_BUCKET_SEC = 10
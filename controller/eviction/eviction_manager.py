@@ -11,8 +11,12 @@ SERVICE_RESOURCES = {
     "large":       {"cpu_m": 300, "mem_bytes": 512 * 1024 * 1024},
 }
 
+# node_resource_status row 를 실시간 값으로 믿을 최대 경과 시간 (초)
+# watcher 가 pod 이벤트 장부 값을 바뀔 때마다 + 5초마다 다시 기록하므로, 이보다 오래되면 watcher 가 멈춘 것
+NODE_STATUS_MAX_STALENESS_SEC = 15
+
 class EvictionManager:
-    def __init__(self, db_conn):
+    def __init__(self, db_conn, max_staleness_sec=NODE_STATUS_MAX_STALENESS_SEC):
         # 쿠버네티스 인증 (로컬 환경 kubeconfig 우선)
         try:
             config.load_kube_config()
@@ -21,6 +25,7 @@ class EvictionManager:
         
         self.v1 = client.CoreV1Api()
         self.conn = db_conn # 외부에서 관리되는 DB 연결 객체
+        self.max_staleness_sec = max_staleness_sec
 
     # ---------- 리소스 파싱 헬퍼 ----------
     def _parse_cpu(self, cpu_str):
@@ -49,6 +54,32 @@ class EvictionManager:
             mem += self._parse_mem(req.get("memory", "0"))
         return cpu, mem
 
+    def _is_fresh(self, last_updated):
+        """node_resource_status.last_updated 가 max_staleness_sec 이내인지 (watcher 가 멈췄으면 False)"""
+        if last_updated is None:
+            return False
+        try:
+            age = (datetime.now() - datetime.fromisoformat(str(last_updated))).total_seconds()
+        except ValueError:
+            return False
+        return age <= self.max_staleness_sec
+
+    def _load_node_free(self):
+        """
+        노드별 여유 리소스 {node_name: [cpu_free_m, mem_free_bytes]}
+        watcher 의 pod 이벤트 장부 (node_resource_status) 가 max_staleness_sec 이내면 그 값, 오래된 노드만 API로 즉시 계산
+        """
+        nodes = {}
+        for node_name, cpu_free, mem_free, last_updated in self.conn.execute(
+            "SELECT node_name, cpu_free_m, mem_free_bytes, last_updated FROM node_resource_status"
+        ).fetchall():
+            if self._is_fresh(last_updated):
+                nodes[node_name] = [cpu_free, mem_free]
+            else:
+                print(f"[warn] node_resource_status 가 오래됨 ({node_name}, {last_updated}): API로 계산")
+                nodes[node_name] = list(self._get_node_realtime_free(node_name))
+        return nodes
+
     def _get_node_realtime_free(self, node_name):
         """[핵심] 판단 직전, 해당 노드의 실제 여유 리소스를 API로 즉시 계산"""
         node = self.v1.read_node(node_name)
@@ -123,10 +154,7 @@ class EvictionManager:
         ).fetchone()
         trigger_min_c = validation[0]
 
-        nodes_dict = {
-            row[0]: [row[1], row[2]] 
-            for row in self.conn.execute("SELECT node_name, cpu_free_m, mem_free_bytes FROM node_resource_status").fetchall()
-        }
+        nodes_dict = self._load_node_free()
         # nodes = self.conn.execute("SELECT node_name, cpu_free_m, mem_free_bytes FROM node_resource_status").fetchall()
 
         # [Level 1] 단일 서비스 하나만으로 해결 가능한 노드가 있는지 전수 조사
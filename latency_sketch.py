@@ -0,0 +1,223 @@
+import math
+import sqlite3
+import struct
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import cfg
+
+# ----------------------------
+# 서비스별 실행 시간 분포 sketch
+# ----------------------------
+# log bucket histogram (DDSketch 방식): bucket k = ceil(log_gamma(x)), gamma = (1 + a) / (1 - a)
+# - 분위수 추정값의 상대 오차가 a (기본 1%) 이내
+# - bucket 별 count 를 더하면 merge 끝 → 시간 bucket sketch 몇 개로 임의 구간 p50/p95/p99 계산
+# watcher 가 trace 적재 시 (service, 10초 bucket) 단위로 갱신, profiler 는 window 에 걸친 sketch 를 합쳐 읽음
+
+_HEADER = struct.Struct("<BfII")   # version, relative_accuracy, zero_count, bin 수
+_VERSION = 1
+
+SKETCH_DDL = """
+CREATE TABLE IF NOT EXISTS latency_sketch (
+  service    TEXT    NOT NULL,
+  bucket_us  INTEGER NOT NULL,
+  count      INTEGER NOT NULL,
+  cold_cnt   INTEGER NOT NULL DEFAULT 0,
+  sketch     BLOB    NOT NULL,
+  PRIMARY KEY (service, bucket_us)
+);
+CREATE INDEX IF NOT EXISTS idx_latency_sketch_bucket
+  ON latency_sketch(bucket_us);
+"""
+
+
+class LatencySketch:
+    # 이 값 (ms) 이하는 0 bucket 으로
+    MIN_MS = 1e-3
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, values_ms: Sequence[float]) -> None:
+        values = np.asarray(values_ms, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        small = values <= self.MIN_MS
+        self.zero_count += int(small.sum())
+        keys, counts = np.unique(np.ceil(np.log(values[~small]) / self._log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for k, c in zip(keys.tolist(), counts.tolist()):
+            self.bins[k] = self.bins.get(k, 0) + c
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("relative_accuracy 가 다른 sketch 는 합칠 수 없음")
+        self.zero_count += other.zero_count
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """q 분위 추정값 (ms), 비어 있으면 None"""
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                return 2 * self.gamma ** k / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    # ----------------------------
+    # 직렬화 (header + int16 bucket 번호 + uint32 count)
+    # ----------------------------
+    def to_bytes(self) -> bytes:
+        keys = np.fromiter(sorted(self.bins), dtype=np.int16, count=len(self.bins))
+        counts = np.fromiter((self.bins[k] for k in keys.tolist()), dtype=np.uint32, count=len(self.bins))
+        header = _HEADER.pack(_VERSION, self.relative_accuracy, self.zero_count, len(self.bins))
+        return header + keys.tobytes() + counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LatencySketch":
+        version, accuracy, zero_count, n = _HEADER.unpack_from(data)
+        if version != _VERSION:
+            raise ValueError(f"지원하지 않는 sketch 버전: {version}")
+        sketch = cls(round(accuracy, 6))
+        offset = _HEADER.size
+        keys = np.frombuffer(data, dtype=np.int16, count=n, offset=offset)
+        counts = np.frombuffer(data, dtype=np.uint32, count=n, offset=offset + 2 * n)
+        sketch.bins = dict(zip(keys.tolist(), counts.tolist()))
+        sketch.zero_count = zero_count
+        return sketch
+
+
+class LatencySketchStore:
+    """
+    traces row (trace_store.TRACES_COLUMNS 순서) → latency_sketch 테이블 (service, bucket_sec 단위)
+
+    실행 시간 = duration_ms - queue_wait_ms (cold 요청은 sketch 에 넣지 않고 cold_cnt 로만 셈, exetime 과 같은 기준)
+    Jaeger 폴링 / span 수신기 중복은 최근 trace_id 로 걸러냄 (traces 의 INSERT OR IGNORE 와 같은 효과)
+    trace_id 는 commit 이 성공한 뒤에만 기억 (실패해서 BatchWriter 가 다시 넣은 배치가 중복으로 버려지지 않게)
+    재시작 시에는 seed_from_traces() 로 최근 traces 의 trace_id 를 먼저 기억 (Jaeger lookback 재조회 중복 방지)
+    """
+
+    def __init__(self, conn: sqlite3.Connection, bucket_sec: int = cfg.LATENCY_SKETCH_BUCKET_SEC,
+                 relative_accuracy: float = 0.01, seen_capacity: int = 100_000):
+        self.conn = conn
+        self.bucket_us = bucket_sec * 1_000_000
+        self.relative_accuracy = relative_accuracy
+        self.seen_capacity = seen_capacity
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self.conn.executescript(SKETCH_DDL)
+        self.conn.commit()
+
+    def _remember(self, trace_ids: List[str]) -> None:
+        for trace_id in trace_ids:
+            self._seen[trace_id] = None
+        while len(self._seen) > self.seen_capacity:
+            self._seen.popitem(last=False)
+
+    def seed_from_traces(self, since_us: int, trace_store=None) -> int:
+        """
+        start_time_us >= since_us 인 traces 의 trace_id 를 기억, 기억한 수 반환
+        traces 는 INSERT OR IGNORE 라 재조회에도 안전하지만 sketch 는 메모리 _seen 만으로 거르므로 시작할 때 채워 둠
+        trace_store: 파티션 모드면 TracePartitionStore (main.traces 에 남은 예전 row 도 같이 읽음)
+        """
+        trace_ids: List[str] = []
+        if trace_store is not None:
+            trace_ids.extend(row[0] for row in trace_store.iter_rows(since_us, 2 ** 62))
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'traces';"
+        ).fetchone()
+        if exists:
+            trace_ids.extend(r[0] for r in self.conn.execute(
+                "SELECT trace_id FROM traces WHERE start_time_us >= ? ORDER BY start_time_us;", (since_us,)
+            ))
+        self._remember(trace_ids[-self.seen_capacity:])
+        return min(len(trace_ids), self.seen_capacity)
+
+    def ingest(self, rows: List[Tuple]) -> Tuple[int, int]:
+        """BatchWriter handler: 반영한 요청 수 / 중복으로 버린 수"""
+        groups: Dict[Tuple[str, int], Tuple[List[float], List[int]]] = {}
+        ignored = 0
+        batch_ids = set()
+        for trace_id, creation_us, service, _revision, start_us, duration_ms, queue_wait_ms, cold in rows:
+            if trace_id in self._seen or trace_id in batch_ids:
+                ignored += 1
+                continue
+            batch_ids.add(trace_id)
+            ts = start_us if start_us is not None else creation_us
+            values, colds = groups.setdefault((service, ts - ts % self.bucket_us), ([], [0]))
+            if cold:
+                colds[0] += 1
+            elif duration_ms is not None:
+                values.append(duration_ms - (queue_wait_ms or 0))
+
+        if not groups:
+            return 0, ignored
+
+        with self.conn:
+            for (service, bucket_us), (values, colds) in groups.items():
+                row = self.conn.execute(
+                    "SELECT sketch FROM latency_sketch WHERE service = ? AND bucket_us = ?;", (service, bucket_us)
+                ).fetchone()
+                sketch = LatencySketch.from_bytes(row[0]) if row else LatencySketch(self.relative_accuracy)
+                sketch.add(values)
+                self.conn.execute(
+                    """
+                    INSERT INTO latency_sketch (service, bucket_us, count, cold_cnt, sketch)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (service, bucket_us) DO UPDATE SET
+                        count = excluded.count,
+                        cold_cnt = cold_cnt + excluded.cold_cnt,
+                        sketch = excluded.sketch;
+                    """,
+                    (service, bucket_us, sketch.count, colds[0], sketch.to_bytes()),
+                )
+        self._remember(list(batch_ids))
+        return sum(len(v) + c[0] for v, c in groups.values()), ignored
+
+
+def read_sketches(conn: sqlite3.Connection, start_us: int, end_us: int,
+                  services: Optional[Sequence[str]] = None,
+                  bucket_sec: int = cfg.LATENCY_SKETCH_BUCKET_SEC) -> Dict[str, LatencySketch]:
+    """[start_us, end_us] 에 걸친 bucket sketch 를 서비스별로 합쳐서 반환 (bucket 단위 경계)"""
+    bucket_us = bucket_sec * 1_000_000
+    out: Dict[str, LatencySketch] = {}
+    rows = conn.execute(
+        "SELECT service, sketch FROM latency_sketch WHERE bucket_us >= ? AND bucket_us <= ?;",
+        (start_us - start_us % bucket_us, end_us),
+    )
+    wanted = set(services) if services is not None else None
+    for service, blob in rows:
+        if wanted is not None and service not in wanted:
+            continue
+        sketch = LatencySketch.from_bytes(blob)
+        if service in out:
+            out[service].merge(sketch)
+        else:
+            out[service] = sketch
+    return out
+
+
+def percentiles(conn: sqlite3.Connection, start_us: int, end_us: int,
+                quantiles: Tuple[float, ...] = (0.5, 0.95, 0.99),
+                services: Optional[Sequence[str]] = None) -> Dict[str, Tuple[Optional[float], ...]]:
+    """{service: (p50, p95, p99)} (ms)"""
+    return {
+        service: tuple(sketch.quantile(q) for q in quantiles)
+        for service, sketch in read_sketches(conn, start_us, end_us, services).items()
+    }
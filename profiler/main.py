@@ -1,13 +1,70 @@
+import os
 import sqlite3
+import sys
 import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 저장소 루트의 cfg / trace_store 공용 모듈
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from watcher.writer import BatchWriter, DBWriterThread
+import cfg
+import latency_sketch
 
 import modules.exetime as exetime
 import modules.reqcnt as reqcnt
 import modules.qos as qos
 import modules.minmax as minmax
+from modules.window import SlidingWindowState
+from pipeline import ProfilerPipeline, RunContext, Stage
+from trace_store import attach_window, detach_window
+from trigger import DataVersionTrigger
 
 DB_PATH = "/home/ubuntu/fairness_control/trace_store.db"
 INTERVAL_SEC = 20
+WINDOW_SEC = 300
+
+# True: 고정 주기 대신 DB 변경 (PRAGMA data_version) 을 감지해서 실행 (trigger.DataVersionTrigger)
+#       변경 후 TRIGGER_DEBOUNCE_SEC 동안 조용하면 실행, 계속 바뀌어도 TRIGGER_MAX_DELAY_SEC 안에 실행
+#       변경이 없어도 INTERVAL_SEC 마다 1번은 실행 (max staleness)
+EVENT_DRIVEN = True
+TRIGGER_POLL_SEC = 0.2
+TRIGGER_DEBOUNCE_SEC = 0.5
+TRIGGER_MAX_DELAY_SEC = 2.0
+
+# True: t_execute / request_cnt 를 프로세스 안의 sliding window 상태로 계산 (새 traces 만 읽음)
+# False: 매 주기 window 전체를 SQLite 에서 다시 읽는 exetime / reqcnt 사용
+STREAMING_WINDOW = True
+
+# True: stage 입력의 watermark (traces 개수·최대 시작 시각, latency_sketch, service_profile, node_resource_status) 가
+#       이전 주기와 같으면 그 stage 를 건너뛰고, exetime / reqcnt / 분위수는 바뀐 서비스만 다시 계산
+MEMOIZE_STAGES = True
+
+# QoS 계산에 쓸 실행 시간 컬럼: t_execute (평균) 또는 t_execute_p50 / t_execute_p95 / t_execute_p99
+QOS_LATENCY_COLUMN = "t_execute"
+PERCENTILE_COLUMNS = ("t_execute_p50", "t_execute_p95", "t_execute_p99")
+
+# service_profile 갱신 (pipeline 트랜잭션 안에서 실행)
+PROFILE_UPDATE_SQL = """
+    UPDATE service_profile
+    SET
+        t_execute = ?,
+        request_cnt = ?,
+        t_execute_p50 = ?,
+        t_execute_p95 = ?,
+        t_execute_p99 = ?
+    WHERE
+        service = ?;
+"""
+RUN_STAMP_SQL = "UPDATE service_profile SET profile_run_id = ?;"
+
+# stage 별로 읽는 service_profile 컬럼 (watermark 용, 결과 컬럼도 포함 → 밖에서 바뀌어도 다시 계산)
+PROFILE_VALUE_COLUMNS = ("t_execute", "request_cnt") + PERCENTILE_COLUMNS
+QOS_INPUT_COLUMNS = ("t_warm", "t_execute", QOS_LATENCY_COLUMN, "qos")
+MINMAX_INPUT_COLUMNS = ("qos", "t_execute", "request_cnt", "t_warm", "t_cold", "weight",
+                        "active_container", "max_container", "min_container")
+# profiler 가 쓰는 컬럼 전체 (값이 그대로면 profile_run_id 도 이전 실행 id 유지)
+RUN_STAMP_INPUT_COLUMNS = PROFILE_VALUE_COLUMNS + ("qos", "max_container", "min_container")
 
 
 def now_us() -> int:
@@ -42,6 +99,13 @@ def init_db(conn: sqlite3.Connection) -> None:
     """)
     conn.commit()
 
+    # 이 값을 만든 profiler 실행 id (watcher 가 profile_hst 에 같이 기록) / 실행 시간 분위수 (ms)
+    cols = {row[1] for row in cur.execute("PRAGMA table_info(service_profile);")}
+    for col, decl in (("profile_run_id", "INTEGER"),) + tuple((c, "REAL") for c in PERCENTILE_COLUMNS):
+        if col not in cols:
+            cur.execute(f"ALTER TABLE service_profile ADD COLUMN {col} {decl};")
+    conn.commit()
+
 
 def seed_profile(conn: sqlite3.Connection) -> None:
     cur = conn.cursor()
@@ -49,85 +113,307 @@ def seed_profile(conn: sqlite3.Connection) -> None:
 
     # 예시: hello 서비스 1개 시드
 
-def run_once(conn: sqlite3.Connection) -> None:
-    cur = conn.cursor()
-
-    # (옵션) 현재 테이블 확인
-    cur.execute("SELECT * FROM service_profile;")
-    print("[before]", cur.fetchall())
-
-    # 1) t_execute 계산
-    t_execute_map = exetime.compute(
-        db_path=DB_PATH,
-        window_sec=300,
-    )
-    print("[t_execute_map]", t_execute_map)
+def build_writer() -> DBWriterThread:
+    # pipeline 은 이 writer 스레드의 연결 하나로 실행 (프로세스 안의 기록은 이 스레드만)
+    write_conn = sqlite3.connect(DB_PATH, timeout=5, check_same_thread=False)
+    db_writer = DBWriterThread(BatchWriter(write_conn), maxsize=100, flush_interval_sec=1.0)
+    db_writer.start()
+    return db_writer
 
-    # 2) request_cnt 계산
-    request_cnt_map = reqcnt.compute(
-        db_path=DB_PATH
-    )
-    print("[request_cnt_map]", request_cnt_map)
-
-    # 3) service_profile 업데이트 
-    update_sql = """
-        UPDATE service_profile
-        SET
-            t_execute = ?,
-            request_cnt = ?
-        WHERE
-            service = ?;
-    """
 
-    services = set(t_execute_map.keys()) | set(request_cnt_map.keys())
-    for svc in services:
-        t_execute = t_execute_map.get(svc)
-        request_cnt = request_cnt_map.get(svc)
+def profile_snapshot(conn: sqlite3.Connection, columns: Sequence[str]) -> Tuple[Tuple, ...]:
+    """service_profile 의 columns 값 (service 순)"""
+    return tuple(conn.execute(
+        f"SELECT service, {', '.join(columns)} FROM service_profile ORDER BY service;"
+    ).fetchall())
 
-        # None → 0 치환
-        t_execute = t_execute if t_execute is not None else 0.0
-        request_cnt = request_cnt if request_cnt is not None else 0
 
-        cur.execute(update_sql, (t_execute, request_cnt, svc))
+def read_watermarks(conn: sqlite3.Connection, start_us: int, end_us: int,
+                    sketch_start_us: int, sketch_end_us: int) -> Dict[str, Dict[str, Tuple]]:
+    """
+    서비스별 입력 watermark
+    - traces: [start_us, end_us] 요청의 (개수, 최대 start_time_us, start_time_us 합)
+      최대값만 보면 늦게 들어온 요청 / window 밖으로 나간 요청을 놓치므로 개수와 합도 같이 봄
+      ((service, start_time_us) 인덱스만 읽음)
+    - twarm: t_warm
+    - sketch: [sketch_start_us, sketch_end_us] 에 걸친 latency_sketch bucket 의 (요청 수 합, 첫 bucket, 마지막 bucket)
+      percentiles stage 와 같은 구간 / 같은 bucket 정렬이어야 bucket 이 빠지는 시점에 다시 계산됨
+    """
+    traces = {
+        svc: (cnt, max_start, sum_start)
+        for svc, cnt, max_start, sum_start in conn.execute(
+            """
+            SELECT service, COUNT(*), MAX(start_time_us), SUM(start_time_us)
+            FROM traces
+            WHERE start_time_us >= ? AND start_time_us <= ?
+            GROUP BY service;
+            """,
+            (start_us, end_us),
+        )
+    }
+    twarm = {svc: (t_warm,) for svc, t_warm in conn.execute("SELECT service, t_warm FROM service_profile;")}
+
+    bucket_us = cfg.LATENCY_SKETCH_BUCKET_SEC * 1_000_000
+    try:
+        sketch = {
+            svc: (total, first, last)
+            for svc, total, first, last in conn.execute(
+                """
+                SELECT service, SUM(count + cold_cnt), MIN(bucket_us), MAX(bucket_us)
+                FROM latency_sketch
+                WHERE bucket_us >= ? AND bucket_us <= ?
+                GROUP BY service;
+                """,
+                (sketch_start_us - sketch_start_us % bucket_us, sketch_end_us),
+            )
+        }
+    except sqlite3.OperationalError:
+        # watcher 가 아직 latency_sketch 를 만들지 않은 경우
+        sketch = {}
+    return {"traces": traces, "twarm": twarm, "sketch": sketch}
+
+
+def node_watermark(conn: sqlite3.Connection) -> Tuple[Tuple, ...]:
+    # minmax 가 노드별 남은 자원으로 배치를 계산하므로 합계가 아닌 노드별 값 (노드 수만큼의 row)
+    return tuple(conn.execute(
+        "SELECT node_name, cpu_free_m, mem_free_bytes FROM node_resource_status ORDER BY node_name;"
+    ).fetchall())
+
+
+# trigger 가 보는 service_profile 컬럼 (stage 입력 + profiler 결과, profile_run_id 제외)
+TRIGGER_PROFILE_COLUMNS = tuple(dict.fromkeys(MINMAX_INPUT_COLUMNS + QOS_INPUT_COLUMNS + RUN_STAMP_INPUT_COLUMNS))
+
+
+def input_fingerprint(conn: sqlite3.Connection) -> Tuple:
+    """
+    profiler 입력 전체의 요약 (stage watermark 와 같은 값, trigger 가 heartbeat commit 을 거르는 데 사용)
+    node_resource_status 는 last_updated 를 빼고 보므로 watcher 의 keyframe 재기록으로는 바뀌지 않음
+    """
+    run_id = now_us()
+    max_warm_ms = conn.execute("SELECT MAX(t_warm) FROM service_profile;").fetchone()[0] or 0
+    start_us, end_us = run_id - (WINDOW_SEC + 1) * 1_000_000, run_id + int(max_warm_ms * 1_000)
+    schemas = attach_window(conn, start_us, end_us)
+    try:
+        marks = read_watermarks(conn, start_us, end_us, run_id - WINDOW_SEC * 1_000_000, run_id)
+        return (
+            tuple(tuple(sorted(marks[kind].items())) for kind in ("traces", "twarm", "sketch")),
+            profile_snapshot(conn, TRIGGER_PROFILE_COLUMNS),
+            node_watermark(conn),
+            tuple(sorted(minmax.read_catalog(conn).items())),
+        )
+    finally:
+        detach_window(conn, schemas)
+
+
+def build_pipeline(window_state: Optional[SlidingWindowState] = None,
+                   memoize: bool = MEMOIZE_STAGES) -> ProfilerPipeline:
+    """profiler 1주기 stage 목록 (같은 연결, 계산은 읽기 트랜잭션 / service_profile 갱신은 쓰기 트랜잭션 1개)"""
+
+    def traces_window(conn: sqlite3.Connection) -> Tuple[int, int]:
+        # exetime / reqcnt / window 가 읽는 구간: [now - window (- 1초), now + 최대 t_warm]
+        end_us = now_us()
+        max_warm_ms = conn.execute("SELECT MAX(t_warm) FROM service_profile;").fetchone()[0] or 0
+        return end_us - (WINDOW_SEC + 1) * 1_000_000, end_us + int(max_warm_ms * 1_000)
+
+    def services(ctx: RunContext) -> List[str]:
+        before = ctx.conn.execute("SELECT * FROM service_profile;").fetchall()
+        print("[before]", before)
+        return [row[0] for row in before]
+
+    def watermarks(ctx: RunContext):
+        # 0) stage 입력 watermark (traces_window 와 같은 구간)
+        max_warm_ms = ctx.conn.execute("SELECT MAX(t_warm) FROM service_profile;").fetchone()[0] or 0
+        # sketch 는 percentiles stage 구간 ([run_id - window, run_id])
+        return read_watermarks(ctx.conn, ctx.run_id - (WINDOW_SEC + 1) * 1_000_000,
+                               ctx.run_id + int(max_warm_ms * 1_000),
+                               ctx.run_id - WINDOW_SEC * 1_000_000, ctx.run_id)
+
+    def per_service(ctx: RunContext, *kinds: str) -> Dict[str, Tuple]:
+        marks = ctx.results["watermarks"]
+        return {svc: tuple(marks[kind].get(svc) for kind in kinds) for svc in ctx.results["services"]}
+
+    def stream_window(ctx: RunContext):
+        # 1-2) 새 traces 만 반영한 window 상태에서 계산
+        ingested = window_state.update(conn=ctx.conn)
+        print(f"[window] ingested={ingested}")
+        return (
+            window_state.t_execute_map(ctx.results["services"]),
+            window_state.request_cnt_map(ctx.results["services"]),
+        )
+
+    def exetime_stage(ctx: RunContext, services: Optional[List[str]] = None):
+        # 1) t_execute 계산 (services: watermark 가 바뀐 서비스만)
+        return exetime.compute(db_path=DB_PATH, window_sec=WINDOW_SEC, conn=ctx.conn, services=services)
+
+    def reqcnt_stage(ctx: RunContext, services: Optional[List[str]] = None):
+        # 2) request_cnt 계산
+        return reqcnt.compute(db_path=DB_PATH, window_sec=WINDOW_SEC, conn=ctx.conn, services=services)
+
+    def percentiles(ctx: RunContext, services: Optional[List[str]] = None):
+        # 2-1) 실행 시간 분위수 (watcher 가 적재 시 갱신한 10초 bucket sketch 를 window 만큼 merge)
+        try:
+            percentile_map = latency_sketch.percentiles(ctx.conn, ctx.run_id - WINDOW_SEC * 1_000_000, ctx.run_id,
+                                                        services=services)
+        except sqlite3.OperationalError as e:
+            # watcher 가 아직 latency_sketch 를 만들지 않은 경우
+            print(f"[percentiles] 건너뜀: {e}")
+            percentile_map = {}
+        print("[percentile_map]", percentile_map)
+        return percentile_map
+
+    def profile_update(ctx: RunContext):
+        # 3) service_profile 업데이트
+        if window_state is not None:
+            t_execute_map, request_cnt_map = ctx.results["window"]
+        else:
+            t_execute_map, request_cnt_map = ctx.results["exetime"], ctx.results["reqcnt"]
+        print("[t_execute_map]", t_execute_map)
+        print("[request_cnt_map]", request_cnt_map)
+        percentile_map = ctx.results["percentiles"]
+
+        # 이미 같은 값이 들어 있는 서비스는 UPDATE 하지 않음
+        stored = {row[0]: row[1:] for row in profile_snapshot(ctx.conn, PROFILE_VALUE_COLUMNS)}
+
+        rows = []
+        for svc in set(t_execute_map.keys()) | set(request_cnt_map.keys()):
+            t_execute = t_execute_map.get(svc)
+            request_cnt = request_cnt_map.get(svc)
+
+            # None → 0 치환
+            t_execute = t_execute if t_execute is not None else 0.0
+            request_cnt = request_cnt if request_cnt is not None else 0
+
+            values = (t_execute, request_cnt, *(percentile_map.get(svc) or (None, None, None)))
+            if stored.get(svc) != values:
+                rows.append((*values, svc))
+        ctx.conn.executemany(PROFILE_UPDATE_SQL, rows)
+        return len(rows)
+
+    def qos_stage(ctx: RunContext):
+        # 4) QoS 업데이트
+        return qos.update_qos(DB_PATH, latency_column=QOS_LATENCY_COLUMN, conn=ctx.conn)
+
+    def minmax_stage(ctx: RunContext):
+        # 5) min/max 컨테이너 업데이트
+        return minmax.update_minmax(db_path=DB_PATH, window_sec=WINDOW_SEC, split_sec=20, conn=ctx.conn)
+
+    def run_stamp(ctx: RunContext):
+        # 6) 이번 실행이 만든 값임을 표시
+        ctx.conn.execute(RUN_STAMP_SQL, (ctx.run_id,))
+
+    if not memoize:
+        if window_state is not None:
+            compute_stages = [("window", stream_window)]
+        else:
+            compute_stages = [("exetime", exetime_stage), ("reqcnt", reqcnt_stage)]
+        return ProfilerPipeline(
+            [("services", services)]
+            + compute_stages
+            + [
+                ("percentiles", percentiles),
+                Stage("profile_update", profile_update, writes=True),
+                Stage("qos", qos_stage, writes=True),
+                Stage("minmax", minmax_stage, writes=True),
+                Stage("run_stamp", run_stamp, writes=True),
+            ],
+            window=traces_window,
+        )
+
+    # stage 별 입력 watermark (각 stage 직전에 같은 트랜잭션 안에서 읽음)
+    if window_state is not None:
+        # window 상태는 서비스 전체를 한 번에 갱신
+        compute_stages = [Stage("window", stream_window, inputs=lambda ctx: tuple(
+            sorted(per_service(ctx, "traces", "twarm").items())))]
+    else:
+        compute_stages = [
+            Stage("exetime", exetime_stage, per_service=True,
+                  inputs=lambda ctx: per_service(ctx, "traces")),
+            Stage("reqcnt", reqcnt_stage, per_service=True,
+                  inputs=lambda ctx: per_service(ctx, "traces", "twarm")),
+        ]
+
+    return ProfilerPipeline(
+        [Stage("services", services), Stage("watermarks", watermarks)]
+        + compute_stages
+        + [
+            Stage("percentiles", percentiles, per_service=True,
+                  inputs=lambda ctx: per_service(ctx, "sketch")),
+            Stage("profile_update", profile_update, writes=True),
+            Stage("qos", qos_stage, writes=True,
+                  inputs=lambda ctx: profile_snapshot(ctx.conn, QOS_INPUT_COLUMNS)),
+            Stage("minmax", minmax_stage, writes=True, inputs=lambda ctx: (
+                profile_snapshot(ctx.conn, MINMAX_INPUT_COLUMNS), node_watermark(ctx.conn),
+                tuple(sorted(minmax.read_catalog(ctx.conn).items())))),
+            Stage("run_stamp", run_stamp, writes=True,
+                  inputs=lambda ctx: profile_snapshot(ctx.conn, RUN_STAMP_INPUT_COLUMNS)),
+        ],
+        window=traces_window,
+    )
 
-    conn.commit()
 
-    #cur.execute("SELECT * FROM service_profile;")
-    # print("[after t_execute/request_cnt]", cur.fetchall())
+def run_once(conn: sqlite3.Connection, db_writer: DBWriterThread, pipeline: ProfilerPipeline) -> None:
+    run_id = now_us()  # 실행 시작 시각을 실행 id 로 사용
 
-    # 4) QoS 업데이트
-    qos.update_qos(DB_PATH)
-    #cur.execute("SELECT * FROM service_profile;")
-    # print("[after qos]", cur.fetchall())
+    # 모든 stage 를 writer 스레드의 연결로 실행 → service_profile 갱신은 commit 시점에 한 번에 반영
+    timings = db_writer.call(lambda write_conn: pipeline.run(write_conn, run_id))
+    print("[stage ms]", {name: round(ms, 1) for name, ms in timings.items()})
+    cached = {name: n for name, n in pipeline.last_cached.items() if n}
+    if cached:
+        print("[cached]", cached)   # -1: 전체 재사용, n: 재사용한 서비스 수
 
-    # 5) min/max 컨테이너 업데이트
-    minmax.update_minmax(
-        db_path=DB_PATH,
-        window_sec=300,
-        split_sec=20,
-    )
+    cur = conn.cursor()
     cur.execute("SELECT * FROM service_profile;")
     print("[after minmax]", cur.fetchall())
 
 
 def main() -> None:
     conn = sqlite3.connect(DB_PATH, timeout=5)
+    db_writer = None
+    trigger = None
     try:
         init_db(conn)
         seed_profile(conn)
-
-        print(f"Start loop: every {INTERVAL_SEC}s (Ctrl+C to stop)")
+        minmax.ensure_catalog(conn)
+        ProfilerPipeline.ensure_schema(conn)
+        db_writer = build_writer()
+        window_state = SlidingWindowState(DB_PATH, window_sec=WINDOW_SEC) if STREAMING_WINDOW else None
+        pipeline = build_pipeline(window_state)
+
+        if EVENT_DRIVEN:
+            trigger = DataVersionTrigger(
+                DB_PATH,
+                poll_sec=TRIGGER_POLL_SEC,
+                debounce_sec=TRIGGER_DEBOUNCE_SEC,
+                max_delay_sec=TRIGGER_MAX_DELAY_SEC,
+                max_staleness_sec=INTERVAL_SEC,
+                inputs=lambda: input_fingerprint(conn),
+            )
+            print(f"Start loop: on new data (debounce {TRIGGER_DEBOUNCE_SEC}s, "
+                  f"at least every {INTERVAL_SEC}s) (Ctrl+C to stop)")
+        else:
+            print(f"Start loop: every {INTERVAL_SEC}s (Ctrl+C to stop)")
 
         while True:
-            run_once(conn)
+            run_once(conn, db_writer, pipeline)
 
-            time.sleep(INTERVAL_SEC)
+            if trigger is None:
+                time.sleep(INTERVAL_SEC)
+                continue
+            # 이번 실행의 commit 이후부터 변경 감지
+            trigger.mark()
+            reason = trigger.wait()
+            print(f"[trigger] {reason}")
 
     except KeyboardInterrupt:
         print("\nKeyboardInterrupt received. Closing DB connection...")
 
     finally:
         try:
+            if db_writer is not None:
+                db_writer.stop(timeout=10)
+                db_writer.writer.conn.close()
+            if trigger is not None:
+                trigger.close()
             conn.close()
             print("DB connection closed. Bye.")
         except Exception as e:
@@ -1,6 +1,8 @@
 import sqlite3
 import time
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional
+
+from trace_store import open_window
 
 
 def now_us() -> int:
@@ -10,34 +12,56 @@ def now_us() -> int:
 def compute(
     db_path: str,
     window_sec: int = 330,
+    conn: Optional[sqlite3.Connection] = None,
+    services: Optional[Iterable[str]] = None,
 ) -> Dict[str, Optional[float]]:
+    """
+    conn: profiler pipeline 이 넘기는 공유 연결 (traces window 가 이미 붙어 있음, 닫지 않음)
+    services: 이 서비스만 계산 (None 이면 service_profile 전체)
+    """
+    only = list(services) if services is not None else None
+
+    # 2) window 계산 (파티션 모드면 window 에 걸친 traces 파티션만 붙임)
+    window_end_us = now_us()
+    window_start_us = window_end_us - window_sec * 1_000_000
 
-    conn = sqlite3.connect(db_path)
+    own_conn = conn is None
+    if own_conn:
+        conn = open_window(db_path, window_start_us, window_end_us)
     cur = conn.cursor()
 
     try:
         # 1) service 목록
         cur.execute("SELECT DISTINCT service FROM service_profile;")
         services = [r[0] for r in cur.fetchall()]
+        service_filter = ""
+        if only is not None:
+            services = [svc for svc in services if svc in set(only)]
+            service_filter = f"AND service IN ({', '.join('?' for _ in services)})"
 
-        # 2) window 계산
-        window_end_us = now_us()
-        window_start_us = window_end_us - window_sec * 1_000_000
         print(f"start time : ${window_start_us}, End Time: ${window_end_us}")
         # 3) 평균 실행시간 계산
+        #    activator 대기(queue_wait_ms)는 빼고, cold 요청은 제외 (cold 만 있는 서비스는 전체 평균)
         cur.execute(
             """
             SELECT
                 service,
-                AVG(duration_ms) AS avg_execute_ms
+                AVG(CASE WHEN COALESCE(cold, 0) = 0
+                         THEN duration_ms - COALESCE(queue_wait_ms, 0) END) AS warm_execute_ms,
+                AVG(duration_ms - COALESCE(queue_wait_ms, 0)) AS avg_execute_ms,
+                SUM(COALESCE(cold, 0)) AS cold_cnt
             FROM traces
-            WHERE start_time_us BETWEEN ? AND ?
+            WHERE start_time_us BETWEEN ? AND ? {service_filter}
             GROUP BY service;
-            """,
-            (window_start_us, window_end_us),
+            """.format(service_filter=service_filter),
+            (window_start_us, window_end_us, *(services if only is not None else ())),
         )
 
-        avg_map = {svc: avg for (svc, avg) in cur.fetchall()}
+        avg_map = {}
+        for svc, warm, avg, cold_cnt in cur.fetchall():
+            avg_map[svc] = warm if warm is not None else avg
+            if cold_cnt:
+                print(f"[exetime] {svc}: cold {cold_cnt}건 제외")
 
         # 4) 결과 정리 (service_profile 기준)
         result: Dict[str, Optional[float]] = {}
@@ -48,4 +72,5 @@ def compute(
         return result
 
     finally:
-        conn.close()
+        if own_conn:
+            conn.close()
@@ -1,26 +1,125 @@
 import sqlite3
-import time
-from typing import Dict, Optional
-import math
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+# ----------------------------
+# 서비스별 pod 1개 요청량 (min/max 컨테이너 계산용)
+# ----------------------------
+# 서비스 추가 시 코드 수정 없이 service_catalog 에 row 만 넣으면 됨
+SERVICE_CATALOG_DDL = """
+CREATE TABLE IF NOT EXISTS service_catalog (
+  service            TEXT    PRIMARY KEY,
+  cpu_request_m      INTEGER NOT NULL CHECK (cpu_request_m > 0),
+  mem_request_bytes  INTEGER NOT NULL CHECK (mem_request_bytes > 0)
+);
+"""
+
+# 기존 하드코딩 값 (service_catalog 가 비어 있을 때 시드)
+DEFAULT_SERVICE_RESOURCES = {
+    "small-fast":  {"cpu_m": 50,  "mem_bytes": 128 * 1024 * 1024},
+    "small-fast2": {"cpu_m": 50,  "mem_bytes": 128 * 1024 * 1024},
+    "medium-fast": {"cpu_m": 100, "mem_bytes": 256 * 1024 * 1024},
+    "medium-slow": {"cpu_m": 100, "mem_bytes": 256 * 1024 * 1024},
+    "large":       {"cpu_m": 300, "mem_bytes": 512 * 1024 * 1024},
+}
+
+
+def ensure_catalog(conn: sqlite3.Connection) -> None:
+    """service_catalog 생성 + 기본값 시드 (이미 있는 서비스는 그대로)"""
+    conn.executescript(SERVICE_CATALOG_DDL)
+    conn.executemany(
+        "INSERT OR IGNORE INTO service_catalog (service, cpu_request_m, mem_request_bytes) VALUES (?, ?, ?);",
+        [(svc, spec["cpu_m"], spec["mem_bytes"]) for svc, spec in DEFAULT_SERVICE_RESOURCES.items()],
+    )
+    conn.commit()
+
+
+def read_catalog(conn: sqlite3.Connection) -> Dict[str, Tuple[int, int]]:
+    """{service: (cpu_request_m, mem_request_bytes)}"""
+    return {
+        svc: (cpu_m, mem_bytes)
+        for svc, cpu_m, mem_bytes in conn.execute(
+            "SELECT service, cpu_request_m, mem_request_bytes FROM service_catalog;"
+        )
+    }
+
+
+def min_containers(request_cnt: np.ndarray, weight: np.ndarray, avg_qos_all: float) -> np.ndarray:
+    """
+    min = ceil(request_cnt / (2 / min(1, Q_all * weight) - 1))
+    분모가 0 이하 (또는 weight 가 없음) 이면 request_cnt 그대로
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denominator = 2 / np.minimum(1, avg_qos_all * weight) - 1
+        mins = np.where(denominator > 0, np.ceil(request_cnt / denominator), request_cnt)
+    return mins.astype(np.int64)
+
+
+# True: active_container 가 min_container 보다 적은 서비스의 부족분 pod 를 먼저 노드에 배치 (first-fit-decreasing)
+#       하고 남은 자원으로 max 계산 → 곧 뜰 min pod 가 쓸 자원을 다른 서비스 max 에 중복으로 세지 않음
+RESERVE_PENDING_MIN = True
+
+
+def reserve_pending(cpu_free: np.ndarray, mem_free: np.ndarray, cpu_req: np.ndarray, mem_req: np.ndarray,
+                    pending: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    서비스별 pending 개의 pod 를 노드 자원에 first-fit-decreasing 으로 배치
+
+    - 큰 pod (클러스터 전체 대비 cpu / mem 비율 중 큰 쪽) 부터, 앞 노드부터 들어가는 만큼 채움
+      (같은 서비스 pod 는 모양이 같으므로 노드별로 몇 개 들어가는지 한 번에 계산)
+
+    Returns:
+        (남은 cpu_free, 남은 mem_free, 배치하지 못한 pod 수)
+    """
+    cpu_free, mem_free = cpu_free.copy(), mem_free.copy()
+    total_cpu, total_mem = max(int(cpu_free.sum()), 1), max(int(mem_free.sum()), 1)
+    size = np.maximum(cpu_req / total_cpu, mem_req / total_mem)
+    unplaced = 0
+    for i in np.argsort(-size, kind="stable"):
+        remaining = int(pending[i])
+        if remaining <= 0:
+            continue
+        fits = np.minimum(cpu_free // cpu_req[i], mem_free // mem_req[i])
+        placed = np.minimum(fits, np.maximum(remaining - (np.cumsum(fits) - fits), 0))
+        cpu_free -= placed * cpu_req[i]
+        mem_free -= placed * mem_req[i]
+        unplaced += remaining - int(placed.sum())
+    return cpu_free, mem_free, unplaced
+
+
+def headroom(cpu_free: np.ndarray, mem_free: np.ndarray, cpu_req: np.ndarray, mem_req: np.ndarray) -> np.ndarray:
+    """
+    노드별 남은 자원에 더 띄울 수 있는 pod 수의 합 (서비스 × 노드 배열 연산)
+    pod 는 노드 하나에 들어가야 하므로 전체 합으로 나누면 자원이 쪼개져 있을 때 과대 계산됨
+    """
+    if cpu_free.size == 0:
+        return np.zeros(cpu_req.size, dtype=np.int64)
+    per_node = np.minimum(cpu_free[None, :] // cpu_req[:, None], mem_free[None, :] // mem_req[:, None])
+    return per_node.sum(axis=1)
 
 
 def update_minmax(
     db_path: str,
     window_sec: int,
     split_sec: int, # 이제 별 필요없음 (안씀)
+    conn: Optional[sqlite3.Connection] = None,
 ) -> int:
-
-    conn = sqlite3.connect(db_path, timeout=5)
+    """
+    모든 서비스의 min/max 컨테이너를 배열 연산 한 번으로 계산하여 UPDATE 한다.
+
+    - min: request_cnt 와 전체 평균 qos / weight 기준
+    - max: min + 노드별 남은 자원에 실제로 배치 가능한 pod 수 (pod 요청량은 service_catalog)
+    - service_catalog 에 없는 서비스는 max = min
+    - conn 을 주면 그 연결의 트랜잭션 안에서 실행 (commit / close 는 호출한 쪽)
+    """
+
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(db_path, timeout=5)
     cur = conn.cursor()
 
-    SERVICE_RESOURCES = {
-        "small-fast":  {"cpu_m": 50,  "mem_bytes": 128 * 1024 * 1024},
-        "small-fast2": {"cpu_m": 50,  "mem_bytes": 128 * 1024 * 1024},
-        "medium-fast": {"cpu_m": 100, "mem_bytes": 256 * 1024 * 1024},
-        "medium-slow": {"cpu_m": 100, "mem_bytes": 256 * 1024 * 1024},
-        "large":       {"cpu_m": 300, "mem_bytes": 512 * 1024 * 1024},
-    }
-
     try:
         # 0) compute window size
         # window = round(window_sec / split_sec)
@@ -43,92 +142,80 @@ def update_minmax(
             SET max_container = 0, min_container = 0
             """
             )
-            conn.commit()
+            if own_conn:
+                conn.commit()
             return 0
 
-        # 2) 서비스별 필요한 값 읽기
+        # 2) 서비스별 필요한 값 + pod 요청량 (catalog 에 없으면 NULL)
         cur.execute("""
             SELECT
-                service,
-                request_cnt,
-                t_warm,
-                t_cold,
-                weight
-            FROM service_profile
+                p.service,
+                p.request_cnt,
+                p.weight,
+                p.active_container,
+                c.cpu_request_m,
+                c.mem_request_bytes
+            FROM service_profile p
+            LEFT JOIN service_catalog c ON c.service = p.service
         """)
         service_rows = cur.fetchall()
+        if not service_rows:
+            return 1
 
+        # 노드별 남은 자원 (음수는 0)
         cur.execute("""
             SELECT
-                sum(cpu_free_m),
-                sum(mem_free_bytes)
+                cpu_free_m,
+                mem_free_bytes
             FROM node_resource_status
+            ORDER BY node_name
         """)
+        node_rows = cur.fetchall()
+        cpu_free = np.array([max(r[0] or 0, 0) for r in node_rows], dtype=np.int64)
+        mem_free = np.array([max(r[1] or 0, 0) for r in node_rows], dtype=np.int64)
+
+        services, request_cnt, weight, active, cpu_req, mem_req = zip(*service_rows)
+        request_cnt = np.array([c or 0 for c in request_cnt], dtype=np.float64)
+        weight = np.array(weight, dtype=np.float64)   # NULL → NaN
+        cpu_req = np.array([c or 0 for c in cpu_req], dtype=np.int64)
+        mem_req = np.array([m or 0 for m in mem_req], dtype=np.int64)
+        in_catalog = cpu_req > 0
+
+        # min 값
+        mins = min_containers(request_cnt, weight, avg_qos_all)
+
+        # 아직 안 뜬 min pod 자리 먼저 확보 (active_container 를 모르는 서비스는 제외)
+        if RESERVE_PENDING_MIN and in_catalog.any():
+            pending = mins - np.array([a if a is not None else m for a, m in zip(active, mins.tolist())],
+                                      dtype=np.int64)
+            cpu_free, mem_free, unplaced = reserve_pending(
+                cpu_free, mem_free, cpu_req[in_catalog], mem_req[in_catalog], pending[in_catalog])
+            if unplaced:
+                print(f"Warning: 노드 자원이 부족해 배치할 수 없는 min pod {unplaced}개")
+
+        # max 값 (catalog 에 있는 서비스만 headroom 계산)
+        extra = np.zeros(len(services), dtype=np.int64)
+        extra[in_catalog] = headroom(cpu_free, mem_free, cpu_req[in_catalog], mem_req[in_catalog])
+        maxs = mins + extra
+
+        missing = [svc for svc, ok in zip(services, in_catalog) if not ok]
+        if missing:
+            print(f"Warning: service_catalog 에 없는 서비스 (max = min): {missing}")
 
-        free_resources = cur.fetchone()
-        cpu_free = free_resources[0] if free_resources[0] is not None else 0
-        mem_free = free_resources[1] if free_resources[1] is not None else 0
-
-        # results: Dict[str, int] = {}
-        results: Dict[str, dict] = {}
-        min_container = 0
-        max_container = 0
-
-        # min 값 업데이트
-        for (
-            service,
-            request_cnt,
-            t_warm,
-            t_cold,
-            weight,
-        ) in service_rows:
-
-            # 분자
-            numerator = request_cnt 
-
-            # 분모
-            denominator = (
-                2/ min(1,(avg_qos_all * weight))
-                - 1
-            )
-
-            if denominator <= 0:
-                print(f"Error: denominator <= 0 for service={service} (den={denominator})")
-                min_container = numerator   
-            else:
-                min_container = math.ceil(numerator / denominator)
-
-            results.setdefault(service, {})
-            results[service]["min"] = min_container
-        
-        # max 값 업데이트
-        for service, spec in SERVICE_RESOURCES.items():
-            cpu_limit = cpu_free // spec["cpu_m"]
-            mem_limit = mem_free // spec["mem_bytes"]   # 🔹 bytes 기준
-
-            max_count = min(cpu_limit, mem_limit)
-            max_container = results[service]["min"] + max_count
-
-            results.setdefault(service, {})
-            results[service]["max"] = int(max_container)
-        
         # 3) DB 업데이트 (서비스별로 max_container 저장)
-        # for svc, data in results.items():
-        #     print(svc, data)
         cur.executemany(
             """
             UPDATE service_profile
             SET max_container = ?, min_container = ?
             WHERE service = ?
             """,
-            [
-                (data["max"], data["min"], svc)
-                for svc, data in results.items()
-            ]
+            zip(maxs.tolist(), mins.tolist(), services),
         )
-        conn.commit()
+        if own_conn:
+            conn.commit()
 
         return 1
 
     finally:
-        conn.close()
\ No newline at end of file
+        if own_conn:
+            conn.close()
@@ -1,34 +1,48 @@
 import sqlite3
+from typing import Optional
 
 
-def update_qos(db_path: str) -> int:
+LATENCY_COLUMNS = ("t_execute", "t_execute_p50", "t_execute_p95", "t_execute_p99")
+
+
+def update_qos(db_path: str, latency_column: str = "t_execute", conn: Optional[sqlite3.Connection] = None) -> int:
     """
     모든 서비스에 대해 '최신 service_profile row 1개'의 qos를 계산하여 UPDATE 한다.
 
     qos = t_warm / t_execute
     - t_execute가 0 또는 NULL이면 0으로 환산
     - t_warm이 NULL이면 0으로 처리
+    - latency_column 으로 분위수 컬럼 (예: t_execute_p95) 을 쓰면 그 값 기준, 분위수가 없으면 t_execute
+    - conn 을 주면 그 연결의 트랜잭션 안에서 실행 (commit / close 는 호출한 쪽)
 
     Returns:
         업데이트된 row 수
     """
 
-    conn = sqlite3.connect(db_path, timeout=5)
+    if latency_column not in LATENCY_COLUMNS:
+        raise ValueError(f"지원하지 않는 latency_column: {latency_column}")
+    t_execute = latency_column if latency_column == "t_execute" else f"COALESCE({latency_column}, t_execute)"
+
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(db_path, timeout=5)
     cur = conn.cursor()
 
     try:
-        sql = """
+        sql = f"""
         UPDATE service_profile
         SET qos =
             CASE 
-                WHEN t_execute IS NULL OR t_execute = 0.0 THEN 0.0 -- 기본값을 1에서 0으로 변경(그래프 표현의 직관성을 위해)
-                ELSE (t_warm / t_execute)
+                WHEN {t_execute} IS NULL OR {t_execute} = 0.0 THEN 0.0 -- 기본값을 1에서 0으로 변경(그래프 표현의 직관성을 위해)
+                ELSE (t_warm / {t_execute})
 
             END;
         """
         cur.execute(sql)
-        conn.commit()
+        if own_conn:
+            conn.commit()
         return cur.rowcount
 
     finally:
-        conn.close()
+        if own_conn:
+            conn.close()
@@ -1,6 +1,10 @@
 import sqlite3
 import time
-from typing import Dict
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from trace_store import open_window
 
 
 def now_us() -> int:
@@ -25,102 +29,67 @@ def select_twarm_us(conn: sqlite3.Connection) -> Dict[str, int]:
     return out
 
 
-def compute(db_path: str) -> Dict[str, int]:
+def max_in_window(starts: np.ndarray, anchor_end_us: int, warm_us: int) -> int:
+    """
+    정렬된 요청 시작 시각(us) 에서, anchor_end_us 이전에 시작한 각 요청 a 에 대해
+    [a, a + warm_us] 안에 시작한 요청 수 (a 자신 포함) 의 최대값
+
+    요청마다 구간 양 끝을 이분 탐색 → O(n log n)
+    """
+    anchors = starts[: np.searchsorted(starts, anchor_end_us, side="left")]
+    if anchors.size == 0:
+        return 0
+    lo = np.searchsorted(starts, anchors, side="left")
+    hi = np.searchsorted(starts, anchors + warm_us, side="right")
+    return int((hi - lo).max())
+
+
+def compute(db_path: str, window_sec: int = 300, conn: Optional[sqlite3.Connection] = None,
+            services: Optional[Iterable[str]] = None) -> Dict[str, int]:
     """
-    현재시간 기준 [now-120s, now) 범위의 요청을 분석해서,
-    서비스별 t_warm 이내에 들어온 요청의 '최대 동시 요청 수'를 반환.
-    동시성은 (service, revision) 단위로 계산한 뒤 service로 max 집계.
+    현재시간 기준 [now-window_sec, now) 에 시작한 요청마다
+    t_warm 이내에 들어온 요청 수를 세서 서비스별 최대값을 반환
+    서비스별 시작 시각을 한 번만 읽어 NumPy 로 계산 (이전 traces self-join SQL 의 O(n^2) 대신 O(n log n))
+    conn: profiler pipeline 의 공유 연결 (traces window 가 이미 붙어 있음, 닫지 않음)
+    services: 이 서비스만 계산 (None 이면 service_profile 전체)
     """
+    only = set(services) if services is not None else None
     window_end_us = now_us()
-    window_start_us = window_end_us - 300 * 1_000_000  # 5 minutes
+    window_start_us = window_end_us - window_sec * 1_000_000
 
-    conn = sqlite3.connect(db_path)
+    own_conn = conn is None
+    meta_conn = sqlite3.connect(db_path) if own_conn else conn
+    try:
+        twarm_us = select_twarm_us(meta_conn)
+        services = [r[0] for r in meta_conn.execute("SELECT DISTINCT service FROM service_profile;")
+                    if only is None or r[0] in only]
+    finally:
+        if own_conn:
+            meta_conn.close()
+    if not twarm_us:
+        return {}
+
+    max_warm_us = max(twarm_us.values(), default=0)
+    fetch_end = window_end_us + max_warm_us
+
+    if own_conn:
+        conn = open_window(db_path, window_start_us, fetch_end)
     try:
-        twarm_us = select_twarm_us(conn)
-        if not twarm_us:
-            return {}
-
-        max_warm_us = max(twarm_us.values(), default=0)
-
-        # warm 윈도우 때문에 window_end + max_warm 까지 읽어야 함
-        fetch_start = window_start_us
-        fetch_end = window_end_us + max_warm_us
-
-        cur = conn.cursor()
-
-        # service 목록: service_profile 기준 
-        cur.execute("SELECT DISTINCT service FROM service_profile;")
-        services = [r[0] for r in cur.fetchall()]
-
-        # service_profile 기준 서비스별 최대 concurrent를 전부 SQL로 계산
-        cur.execute(
-            """
-            WITH
-            window AS (
-              SELECT
-                ? AS start_us,
-                ? AS end_us,
-                ? AS max_warm_us
-            ),
-            t1 AS (
-              SELECT
-                tr.trace_id,
-                tr.service,
-                tr.start_time_us,
-                CAST(sp.t_warm AS INTEGER) * 1000 AS warm_us  -- ms -> us
-              FROM traces tr
-              JOIN service_profile sp
-                ON sp.service = tr.service
-              JOIN window w
-              WHERE tr.start_time_us >= w.start_us
-                AND tr.start_time_us <  w.end_us
-            ),
-            t2 AS (
-              SELECT
-                tr.trace_id,
-                tr.service,
-                tr.start_time_us
-              FROM traces tr
-              JOIN window w
-              WHERE tr.start_time_us >= w.start_us
-                AND tr.start_time_us <  w.end_us + w.max_warm_us
-            ),
-            per_req AS (
-              SELECT
-                a.service,
-                a.trace_id,
-                COUNT(b.trace_id) AS concurrent_cnt
-              FROM t1 a
-              JOIN t2 b
-                ON b.service = a.service
-               AND b.start_time_us BETWEEN a.start_time_us
-                                      AND a.start_time_us + a.warm_us
-              GROUP BY a.service, a.trace_id
-            )
-            SELECT
-              sp.service,
-              COALESCE(MAX(pr.concurrent_cnt), 0) AS max_concurrent_cnt
-            FROM service_profile sp
-            LEFT JOIN per_req pr
-              ON pr.service = sp.service
-            GROUP BY sp.service
-            ORDER BY max_concurrent_cnt DESC, sp.service;
-            """,
-            (fetch_start, window_end_us, max_warm_us),
-        )
-
-        max_map = {svc: int(mx) for (svc, mx) in cur.fetchall()}
-
-        # 3) service_profile 기준으로 결과 정리 (데이터 없는 서비스는 0)
         result: Dict[str, int] = {}
         for svc in services:
-            result[svc] = max_map.get(svc, 0)
-
+            if svc not in twarm_us:
+                result[svc] = 0
+                continue
+            rows = conn.execute(
+                "SELECT start_time_us FROM traces WHERE service = ? AND start_time_us >= ? AND start_time_us < ?;",
+                (svc, window_start_us, fetch_end),
+            ).fetchall()
+            starts = np.sort(np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)))
+            result[svc] = max_in_window(starts, window_end_us, twarm_us[svc])
         return result
-
-
     finally:
-        conn.close()
+        if own_conn:
+            conn.close()
 
 
 # def compute(
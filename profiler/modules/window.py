@@ -0,0 +1,254 @@
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from trace_store import open_window
+from modules.reqcnt import select_twarm_us
+
+
+def now_us() -> int:
+    return time.time_ns() // 1_000
+
+
+class ServiceWindow:
+    """
+    서비스 1개의 최근 window 요청 (시작 시각 순 ring buffer)
+
+    - starts: 요청 시작 시각 (us), exec_ms: duration - activator 대기, cold: cold 요청 여부
+    - counts[i]: [starts[i], starts[i] + warm_us] 에 시작한 요청 수 (reqcnt 의 요청별 동시 요청 수)
+    - 새 요청이 들어오면 영향을 받는 요청 (새 요청 - warm_us 이후) 의 counts 만 다시 계산
+    - 평균 실행 시간은 합계를 들고 있다가 들어오고 나갈 때만 더하고 뺌
+    """
+
+    def __init__(self, warm_us: int, capacity: int = 1024):
+        self.warm_us = warm_us
+        self.starts = np.zeros(capacity, dtype=np.int64)
+        self.exec_ms = np.zeros(capacity, dtype=np.float64)
+        self.cold = np.zeros(capacity, dtype=bool)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.head = 0
+        self.tail = 0
+
+        # (warm 합, warm 개수, 전체 합, 전체 개수)
+        self._sums = [0.0, 0, 0.0, 0]
+
+    def __len__(self) -> int:
+        return self.tail - self.head
+
+    # ----------------------------
+    # 버퍼 관리
+    # ----------------------------
+    def _reserve(self, n: int) -> None:
+        """뒤에 n 개 자리 확보 (앞으로 당기고, 부족하면 2배로 늘림)"""
+        if self.tail + n <= self.starts.size:
+            return
+        live = len(self)
+        capacity = self.starts.size
+        while live + n > capacity // 2:
+            capacity *= 2
+        for name in ("starts", "exec_ms", "cold", "counts"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:live] = old[self.head:self.tail]
+            setattr(self, name, new)
+        self.head, self.tail = 0, live
+
+    def _account(self, exec_ms: np.ndarray, cold: np.ndarray, sign: int) -> None:
+        valid = ~np.isnan(exec_ms)   # duration 이 없는 요청 (AVG 처럼 제외)
+        warm = valid & ~cold
+        self._sums[0] += sign * float(exec_ms[warm].sum())
+        self._sums[1] += sign * int(warm.sum())
+        self._sums[2] += sign * float(exec_ms[valid].sum())
+        self._sums[3] += sign * int(valid.sum())
+
+    def _recount(self, from_us: int) -> None:
+        """시작 시각이 from_us 이후인 요청의 counts 재계산"""
+        live = self.starts[self.head:self.tail]
+        i = self.head + int(np.searchsorted(live, from_us, side="left"))
+        anchors = self.starts[i:self.tail]
+        lo = np.searchsorted(live, anchors, side="left")
+        hi = np.searchsorted(live, anchors + self.warm_us, side="right")
+        self.counts[i:self.tail] = hi - lo
+
+    # ----------------------------
+    # 갱신
+    # ----------------------------
+    def add(self, starts: np.ndarray, exec_ms: np.ndarray, cold: np.ndarray) -> None:
+        """새 요청 추가 (늦게 들어온 요청은 뒤쪽 일부만 다시 정렬)"""
+        if starts.size == 0:
+            return
+        order = np.argsort(starts, kind="stable")
+        starts, exec_ms, cold = starts[order], exec_ms[order], cold[order]
+        self._account(exec_ms, cold, +1)
+
+        self._reserve(starts.size)
+        live = self.starts[self.head:self.tail]
+        pos = self.head + int(np.searchsorted(live, starts[0], side="right"))
+        if pos == self.tail:
+            merged = (starts, exec_ms, cold)
+        else:
+            # starts[0] 이후의 기존 요청과 합쳐서 정렬 (보통 overlap 구간 몇 개)
+            merged_starts = np.concatenate([self.starts[pos:self.tail], starts])
+            order = np.argsort(merged_starts, kind="stable")
+            merged = (
+                merged_starts[order],
+                np.concatenate([self.exec_ms[pos:self.tail], exec_ms])[order],
+                np.concatenate([self.cold[pos:self.tail], cold])[order],
+            )
+        end = pos + merged[0].size
+        self.starts[pos:end], self.exec_ms[pos:end], self.cold[pos:end] = merged
+        self.tail = end
+        self._recount(int(starts[0]) - self.warm_us)
+
+    def expire(self, before_us: int) -> None:
+        """시작 시각이 before_us 이전인 요청 제거"""
+        live = self.starts[self.head:self.tail]
+        n = int(np.searchsorted(live, before_us, side="left"))
+        if n == 0:
+            return
+        self._account(self.exec_ms[self.head:self.head + n], self.cold[self.head:self.head + n], -1)
+        self.head += n
+        if self.head == self.tail:
+            self.head = self.tail = 0
+            self._sums = [0.0, 0, 0.0, 0]
+
+    def set_warm(self, warm_us: int) -> None:
+        if warm_us != self.warm_us:
+            self.warm_us = warm_us
+            self._recount(np.iinfo(np.int64).min)
+
+    # ----------------------------
+    # 조회
+    # ----------------------------
+    def max_concurrency(self, before_us: int) -> int:
+        """before_us 이전에 시작한 요청 중 counts 최대값 (reqcnt.compute 와 같은 값)"""
+        live = self.starts[self.head:self.tail]
+        n = int(np.searchsorted(live, before_us, side="left"))
+        return int(self.counts[self.head:self.head + n].max()) if n else 0
+
+    def mean_exec_ms(self) -> Optional[float]:
+        """cold 제외 평균 (cold 만 있으면 전체 평균, 요청이 없으면 None) — exetime.compute 와 같은 기준"""
+        warm_sum, warm_n, all_sum, all_n = self._sums
+        if warm_n:
+            return warm_sum / warm_n
+        if all_n:
+            return all_sum / all_n
+        return None
+
+
+class SlidingWindowState:
+    """
+    profiler 프로세스가 들고 있는 서비스별 최근 window_sec 요청 상태
+
+    매 주기 마지막으로 본 start_time_us 이후의 traces 만 읽어서 반영하므로
+    주기당 비용이 window 전체가 아닌 새 요청 수에 비례함
+    수집 지연으로 늦게 들어오는 trace 는 late_sec 만큼 앞에서부터 읽고 trace_id 로 중복 제거
+    """
+
+    def __init__(self, db_path: str, window_sec: int = 300, late_sec: int = 10):
+        self.db_path = db_path
+        self.window_us = window_sec * 1_000_000
+        self.late_us = late_sec * 1_000_000
+        self.services: Dict[str, ServiceWindow] = {}
+        self._cursor_us: Optional[int] = None
+        self._recent: Dict[str, int] = {}   # {trace_id: start_time_us} (late 구간 중복 제거용)
+        self.twarm_us: Dict[str, int] = {}
+        self.last_end_us = 0
+        self.stats = {"ingested": 0, "duplicates": 0}
+
+    def _fetch(self, since_us: int, until_us: int, conn: Optional[sqlite3.Connection] = None) -> List[Tuple]:
+        own_conn = conn is None
+        if own_conn:
+            conn = open_window(self.db_path, since_us, until_us)
+        try:
+            return conn.execute(
+                """
+                SELECT trace_id, service, start_time_us,
+                       duration_ms - COALESCE(queue_wait_ms, 0), COALESCE(cold, 0)
+                FROM traces
+                WHERE start_time_us > ? AND start_time_us <= ?;
+                """,
+                (since_us, until_us),
+            ).fetchall()
+        finally:
+            if own_conn:
+                conn.close()
+
+    def update(self, end_us: Optional[int] = None, conn: Optional[sqlite3.Connection] = None) -> int:
+        """
+        새 traces 반영 + window 밖 요청 제거
+        conn: profiler pipeline 의 공유 연결 (traces window 가 이미 붙어 있음)
+
+        Returns:
+            이번에 반영한 요청 수
+        """
+        end_us = now_us() if end_us is None else end_us
+        start_us = end_us - self.window_us
+
+        meta_conn = sqlite3.connect(self.db_path) if conn is None else conn
+        try:
+            twarm_us = select_twarm_us(meta_conn)
+        finally:
+            if conn is None:
+                meta_conn.close()
+
+        since_us = start_us - 1 if self._cursor_us is None else max(start_us - 1, self._cursor_us - self.late_us)
+        rows = self._fetch(since_us, end_us, conn)
+
+        by_service: Dict[str, List[Tuple]] = {}
+        for trace_id, svc, start, exec_ms, cold in rows:
+            if trace_id in self._recent:
+                self.stats["duplicates"] += 1
+                continue
+            self._recent[trace_id] = start
+            by_service.setdefault(svc, []).append((start, exec_ms, cold))
+
+        self.twarm_us = twarm_us
+        for svc, warm_us in twarm_us.items():
+            window = self.services.get(svc)
+            if window is None:
+                window = self.services[svc] = ServiceWindow(warm_us)
+            window.set_warm(warm_us)
+
+        ingested = 0
+        for svc, items in by_service.items():
+            window = self.services.get(svc)
+            if window is None:
+                # t_warm 이 없는 서비스: 평균 실행 시간만 의미 있음
+                window = self.services[svc] = ServiceWindow(0)
+            starts, exec_ms, cold = zip(*items)
+            window.add(
+                np.asarray(starts, dtype=np.int64),
+                np.asarray(exec_ms, dtype=np.float64),
+                np.asarray(cold, dtype=bool),
+            )
+            ingested += len(items)
+
+        for window in self.services.values():
+            window.expire(start_us)
+
+        if rows:
+            self._cursor_us = max(self._cursor_us or 0, max(r[2] for r in rows))
+        elif self._cursor_us is None:
+            self._cursor_us = start_us
+        horizon = self._cursor_us - self.late_us
+        self._recent = {tid: s for tid, s in self._recent.items() if s >= horizon}
+
+        self.stats["ingested"] += ingested
+        self.last_end_us = end_us
+        return ingested
+
+    # ----------------------------
+    # exetime / reqcnt 대체 결과 (service_profile 서비스 기준)
+    # ----------------------------
+    def t_execute_map(self, services: Iterable[str]) -> Dict[str, Optional[float]]:
+        return {svc: self.services[svc].mean_exec_ms() if svc in self.services else None for svc in services}
+
+    def request_cnt_map(self, services: Iterable[str]) -> Dict[str, int]:
+        return {
+            svc: self.services[svc].max_concurrency(self.last_end_us)
+            if svc in self.services and svc in self.twarm_us else 0
+            for svc in services
+        }
@@ -0,0 +1,160 @@
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+from trace_store import attach_window, detach_window
+
+PROFILER_RUNS_DDL = """
+CREATE TABLE IF NOT EXISTS profiler_runs (
+  run_id    INTEGER NOT NULL,
+  stage     TEXT    NOT NULL,
+  wall_ms   REAL    NOT NULL,
+  cached    INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (run_id, stage)
+);
+"""
+
+# profiler_runs 에 주기 전체 소요 시간을 남길 때 쓰는 stage 이름
+TOTAL_STAGE = "total"
+
+
+class RunContext:
+    """한 주기 동안 stage 끼리 공유하는 값 (연결, 실행 id, 앞 stage 결과)"""
+
+    def __init__(self, conn: sqlite3.Connection, run_id: int):
+        self.conn = conn
+        self.run_id = run_id
+        self.results: Dict[str, Any] = {}
+
+
+class Stage:
+    """
+    pipeline stage 1개
+
+    inputs: fn(ctx) -> 이 stage 가 읽는 값의 watermark (예: 서비스별 traces 의 (개수, 최대 시작 시각))
+      - per_service=False: 해시 가능한 key 1개, 이전 주기와 같으면 fn 을 건너뛰고 이전 결과 재사용
+      - per_service=True: {service: key}, key 가 바뀐 서비스만 fn(ctx, services) 로 다시 계산하고
+        나머지는 이전 결과와 합침 (fn 은 {service: 값} 반환)
+    inputs 가 None 이면 매 주기 실행
+    writes=True: DB 에 기록하는 stage (write lock 을 잡은 뒤에 실행, 이후 stage 도 모두 같은 쓰기 트랜잭션)
+    """
+
+    def __init__(self, name: str, fn: Callable[..., Any],
+                 inputs: Optional[Callable[[RunContext], Any]] = None, per_service: bool = False,
+                 writes: bool = False):
+        self.name = name
+        self.fn = fn
+        self.inputs = inputs
+        self.per_service = per_service
+        self.writes = writes
+
+
+class ProfilerPipeline:
+    """
+    profiler 1주기 = stage 목록을 연결 1개로 실행 (읽기 트랜잭션 → 쓰기 트랜잭션)
+
+    - 시작 전에 traces window 파티션을 붙임 (ATTACH 는 트랜잭션 밖에서만 가능)
+    - 읽기 stage (traces 집계, window, 분위수 등 계산이 무거운 부분) 는 deferred BEGIN 의 snapshot 에서 실행
+      → write lock 을 잡지 않으므로 watcher 기록과 경쟁하지 않음
+    - 첫 writes stage 직전에 읽기 트랜잭션을 끝내고 BEGIN IMMEDIATE, 나머지 stage 와 profiler_runs 기록을 한 번에 commit
+      → service_profile 갱신은 commit 시점에 한 번에 보임
+        (controller 가 t_execute 만 바뀌고 qos / min·max 는 이전 값인 중간 상태를 읽지 않음)
+      (deferred 트랜잭션 안에서 쓰기로 올리면 그 사이 watcher 가 commit 했을 때 SQLITE_BUSY 라서 새로 시작)
+    - stage 별 소요 시간은 쓰기 트랜잭션으로 profiler_runs 에 기록
+    - stage 가 실패하면 주기 전체 rollback
+    - inputs 를 선언한 stage 는 watermark 가 그대로면 이전 결과 재사용 (cache 는 commit 성공 후에만 갱신)
+    """
+
+    def __init__(self, stages: Sequence[Union[Stage, Tuple[str, Callable[[RunContext], Any]]]],
+                 window: Optional[Callable[[sqlite3.Connection], Tuple[int, int]]] = None):
+        """
+        stages: Stage 또는 (이름, fn(ctx)), fn 의 반환값은 ctx.results[이름] 에 저장
+        window: fn(conn) -> (start_us, end_us), 이 주기에 붙일 traces 구간
+        """
+        self.stages = [s if isinstance(s, Stage) else Stage(*s) for s in stages]
+        self.window = window
+        self._cache: Dict[str, Tuple[Hashable, Any]] = {}   # {stage: (watermark, 결과)}
+        self.last_cached: Dict[str, int] = {}               # 직전 주기 stage 별 재사용 서비스 수 (전체 재사용은 -1)
+
+    @staticmethod
+    def ensure_schema(conn: sqlite3.Connection) -> None:
+        conn.executescript(PROFILER_RUNS_DDL)
+        cols = {row[1] for row in conn.execute("PRAGMA table_info(profiler_runs);")}
+        if "cached" not in cols:
+            conn.execute("ALTER TABLE profiler_runs ADD COLUMN cached INTEGER NOT NULL DEFAULT 0;")
+        conn.commit()
+
+    def invalidate(self) -> None:
+        """다음 주기는 모든 stage 를 다시 계산"""
+        self._cache.clear()
+
+    def _run_stage(self, stage: Stage, ctx: RunContext,
+                   pending: Dict[str, Tuple[Hashable, Any]]) -> Tuple[Any, int]:
+        """
+        Returns:
+            (결과, 재사용 표시) — 재사용 표시: 0 = 다시 계산, -1 = 전부 재사용, n > 0 = 재사용한 서비스 수
+        """
+        if stage.inputs is None:
+            return stage.fn(ctx), 0
+
+        key = stage.inputs(ctx)
+        cached = self._cache.get(stage.name)
+        if not stage.per_service:
+            if cached is not None and cached[0] == key:
+                return cached[1], -1
+            value = stage.fn(ctx)
+            pending[stage.name] = (key, value)
+            return value, 0
+
+        prev_keys, prev_values = cached if cached is not None else ({}, {})
+        changed = [svc for svc, k in key.items() if svc not in prev_keys or prev_keys[svc] != k]
+        if not changed and len(prev_keys) == len(key):
+            return prev_values, -1
+        fresh = stage.fn(ctx, changed) if changed else {}
+        changed_set = set(changed)
+        # 서비스 목록에서 빠진 서비스는 결과에서도 제거
+        value = {svc: fresh.get(svc) if svc in changed_set else prev_values.get(svc) for svc in key}
+        pending[stage.name] = (dict(key), value)
+        return value, len(key) - len(changed)
+
+    def run(self, conn: sqlite3.Connection, run_id: int) -> Dict[str, float]:
+        """
+        Returns:
+            {stage: wall_ms} (total 포함)
+        """
+        started = time.perf_counter()
+        schemas = attach_window(conn, *self.window(conn)) if self.window is not None else []
+        try:
+            ctx = RunContext(conn, run_id)
+            timings: Dict[str, float] = {}
+            cached: Dict[str, int] = {}
+            pending: Dict[str, Tuple[Hashable, Any]] = {}
+            writing = False
+            conn.execute("BEGIN;")
+            try:
+                for stage in self.stages:
+                    if stage.writes and not writing:
+                        conn.commit()   # 읽기 snapshot 종료
+                        conn.execute("BEGIN IMMEDIATE;")
+                        writing = True
+                    stage_started = time.perf_counter()
+                    ctx.results[stage.name], cached[stage.name] = self._run_stage(stage, ctx, pending)
+                    timings[stage.name] = (time.perf_counter() - stage_started) * 1000
+                if not writing:
+                    conn.commit()
+                    conn.execute("BEGIN IMMEDIATE;")
+                timings[TOTAL_STAGE] = (time.perf_counter() - started) * 1000
+                conn.executemany(
+                    "INSERT OR REPLACE INTO profiler_runs (run_id, stage, wall_ms, cached) VALUES (?, ?, ?, ?);",
+                    [(run_id, name, ms, cached.get(name, 0)) for name, ms in timings.items()],
+                )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            # rollback 된 주기의 결과는 cache 에 남기지 않음
+            self._cache.update(pending)
+            self.last_cached = cached
+            return timings
+        finally:
+            detach_window(conn, schemas)
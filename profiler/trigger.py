@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+import cfg
+from trace_store import TracePartitionStore, now_us
+
+
+class DataVersionTrigger:
+    """
+    profiler 주기를 새 데이터 기준으로 깨우는 trigger (PRAGMA data_version 폴링)
+
+    - data_version 은 다른 연결이 그 DB 파일에 commit 할 때마다 바뀜 (WAL 포함, 조회 비용 수 us)
+      → watcher 의 traces / latency_sketch / node_resource_status 기록을 프로세스 간 신호 없이 감지
+    - 감시 대상: main DB + 파티션 모드면 현재 / 직전 traces 파티션 파일 (없는 파일은 만들지 않음)
+    - 변경을 보면 debounce_sec 동안 추가 변경이 없을 때 실행, 계속 바뀌면 첫 변경 후 max_delay_sec 에 실행
+    - 변경이 없어도 마지막 실행 후 max_staleness_sec 가 지나면 실행 (window 밖으로 나가는 요청 반영)
+    - profiler 자신의 commit 도 data_version 을 바꾸므로 실행 후 mark() 로 기준값을 다시 잡음
+    - inputs: fn() -> profiler 가 읽는 값의 요약, 주면 data_version 이 바뀌어도 이 값이 mark() 때와 같으면
+      실행하지 않고 계속 대기 (watcher 의 node keyframe 처럼 last_updated 만 바꾸는 heartbeat commit 무시)
+    """
+
+    def __init__(self, db_path: str, poll_sec: float = 0.2, debounce_sec: float = 0.5,
+                 max_delay_sec: float = 2.0, max_staleness_sec: float = 20.0,
+                 inputs: Optional[Callable[[], Hashable]] = None):
+        self.db_path = db_path
+        self.poll_sec = poll_sec
+        self.debounce_sec = debounce_sec
+        self.max_delay_sec = max_delay_sec
+        self.max_staleness_sec = max_staleness_sec
+        self.inputs = inputs
+
+        self._conns: Dict[str, sqlite3.Connection] = {db_path: sqlite3.connect(db_path, timeout=5)}
+        self._store = TracePartitionStore() if cfg.TRACE_PARTITIONED else None
+        self._baseline: Optional[Tuple] = None
+        self._inputs: Optional[Hashable] = None
+        self._last_run = time.monotonic()
+        self.stats = {"change": 0, "stale": 0, "polls": 0, "ignored": 0}
+
+    # ----------------------------
+    # data_version 조회
+    # ----------------------------
+    def _watch_paths(self):
+        yield self.db_path
+        if self._store is not None:
+            current = self._store.partition_of(now_us())
+            for start_sec in (current - self._store.partition_sec, current):
+                path = self._store.partition_path(start_sec)
+                if os.path.exists(path):
+                    yield path
+
+    def _versions(self) -> Tuple:
+        paths = list(self._watch_paths())
+        for path in set(self._conns) - set(paths):
+            self._conns.pop(path).close()
+        versions = []
+        for path in paths:
+            conn = self._conns.get(path)
+            if conn is None:
+                conn = self._conns[path] = sqlite3.connect(path, timeout=5)
+            versions.append((path, conn.execute("PRAGMA data_version;").fetchone()[0]))
+        self.stats["polls"] += 1
+        return tuple(versions)
+
+    # ----------------------------
+    # 대기
+    # ----------------------------
+    def _read_inputs(self) -> Optional[Hashable]:
+        # 못 읽으면 (테이블이 아직 없는 등) None → 변경으로 취급해서 실행
+        if self.inputs is None:
+            return None
+        try:
+            return self.inputs()
+        except sqlite3.Error as e:
+            print(f"[trigger] 입력 요약 실패: {e}")
+            return None
+
+    def mark(self) -> None:
+        """profiler 실행 직후 호출: 지금까지의 변경 (자기 commit 포함) 을 반영한 것으로 봄"""
+        self._baseline = self._versions()
+        self._inputs = self._read_inputs()
+        self._last_run = time.monotonic()
+
+    def wait(self, stop_event: Optional[threading.Event] = None) -> Optional[str]:
+        """
+        다음 실행 시점까지 대기
+
+        Returns:
+            "change" (새 데이터) / "stale" (max_staleness_sec 경과) / None (stop_event)
+        """
+        if self._baseline is None:
+            self._baseline = self._versions()
+        first_change = last_change = None
+        seen = self._baseline
+
+        while stop_event is None or not stop_event.is_set():
+            now = time.monotonic()
+            versions = self._versions()
+            if versions != seen:
+                seen = versions
+                last_change = now
+                if first_change is None:
+                    first_change = now
+
+            if first_change is not None and (
+                now - last_change >= self.debounce_sec or now - first_change >= self.max_delay_sec
+            ):
+                current = self._read_inputs()
+                if current is not None and current == self._inputs:
+                    # profiler 입력과 무관한 commit: 기준만 옮기고 계속 대기
+                    self.stats["ignored"] += 1
+                    first_change = last_change = None
+                    continue
+                self.stats["change"] += 1
+                return "change"
+            if now - self._last_run >= self.max_staleness_sec:
+                self.stats["stale"] += 1
+                return "stale"
+
+            if stop_event is not None:
+                stop_event.wait(self.poll_sec)
+            else:
+                time.sleep(self.poll_sec)
+        return None
+
+    def close(self) -> None:
+        for conn in self._conns.values():
+            conn.close()
+        self._conns.clear()
+        if self._store is not None:
+            self._store.close()
@@ -0,0 +1,313 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+import cfg
+
+# ----------------------------
+# 시간 파티션 traces 저장소
+# ----------------------------
+# traces 를 partition_sec 단위 SQLite 파일 (traces_p<구간 시작 epoch 초>.db) 로 나눠 저장
+# - 파티션 키: start_time_us (없으면 creation_time_us) → 윈도우 조회는 겹치는 파일만 ATTACH
+# - 보관 기간이 지난 파티션은 DELETE 대신 파일 삭제 (unlink)
+
+TRACES_COLUMNS = (
+    "trace_id",
+    "creation_time_us",
+    "service",
+    "revision",
+    "start_time_us",
+    "duration_ms",
+    "queue_wait_ms",
+    "cold",
+)
+
+# 파티션 파일이 예전 스키마면 추가할 컬럼
+TRACES_ADDED_COLUMNS = (
+    ("queue_wait_ms", "REAL"),
+    ("cold", "INTEGER"),
+)
+
+TRACES_DDL = """
+CREATE TABLE IF NOT EXISTS {schema}.traces (
+  trace_id          TEXT    PRIMARY KEY,
+  creation_time_us  INTEGER NOT NULL,
+  service           TEXT    NOT NULL,
+  revision          TEXT    NOT NULL,
+  start_time_us     INTEGER,
+  duration_ms       REAL,
+  queue_wait_ms     REAL,
+  cold              INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS {schema}.idx_traces_start
+  ON traces(start_time_us);
+CREATE INDEX IF NOT EXISTS {schema}.idx_traces_srv_start
+  ON traces(service, start_time_us);
+"""
+
+_PARTITION_FILE = re.compile(r"^traces_p(\d+)\.db$")
+
+KST = timezone(timedelta(hours=9))
+
+
+def now_us() -> int:
+    return time.time_ns() // 1_000
+
+
+def kst_to_us(text: str) -> int:
+    """'YYYY-MM-DD HH:MM:SS' (KST, 시각화 스크립트 표기) → epoch us"""
+    return int(datetime.strptime(text, "%Y-%m-%d %H:%M:%S").replace(tzinfo=KST).timestamp() * 1_000_000)
+
+
+class TracePartitionStore:
+    def __init__(self, base_dir: str = cfg.TRACE_PARTITION_DIR, partition_sec: int = cfg.TRACE_PARTITION_SEC,
+                 max_attached: int = 8):
+        self.base_dir = base_dir
+        self.partition_sec = int(partition_sec)
+        self.max_attached = max_attached
+        os.makedirs(base_dir, exist_ok=True)
+
+        # 쓰기용 허브 연결: 파티션을 필요할 때 ATTACH, 오래 안 쓴 것부터 DETACH
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._attached: "OrderedDict[int, str]" = OrderedDict()   # {partition start: schema}
+        self._lock = threading.Lock()
+
+    # ----------------------------
+    # 파티션 이름 / 목록
+    # ----------------------------
+    def partition_of(self, ts_us: int) -> int:
+        sec = ts_us // 1_000_000
+        return sec - sec % self.partition_sec
+
+    def partition_path(self, start_sec: int) -> str:
+        return os.path.join(self.base_dir, f"traces_p{start_sec}.db")
+
+    def partitions(self, start_us: Optional[int] = None, end_us: Optional[int] = None) -> List[int]:
+        """[start_us, end_us] 와 겹치는 기존 파티션 시작 시각 (오름차순)"""
+        out = []
+        for name in os.listdir(self.base_dir):
+            m = _PARTITION_FILE.match(name)
+            if not m:
+                continue
+            start_sec = int(m.group(1))
+            if end_us is not None and start_sec * 1_000_000 > end_us:
+                continue
+            if start_us is not None and (start_sec + self.partition_sec) * 1_000_000 <= start_us:
+                continue
+            out.append(start_sec)
+        return sorted(out)
+
+    @staticmethod
+    def _attach(conn: sqlite3.Connection, path: str, schema: str) -> None:
+        conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+
+    @staticmethod
+    def migrate(conn: sqlite3.Connection, schema: str) -> None:
+        """예전 스키마 파티션에 새 컬럼 추가"""
+        have = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info(traces);")}
+        for column, decl in TRACES_ADDED_COLUMNS:
+            if column not in have:
+                conn.execute(f"ALTER TABLE {schema}.traces ADD COLUMN {column} {decl};")
+
+    @staticmethod
+    def _select_cols(conn: sqlite3.Connection, schema: str) -> str:
+        """TRACES_COLUMNS 순서의 select 목록 (예전 스키마 파일에 없는 컬럼은 NULL)"""
+        have = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info(traces);")}
+        return ", ".join(c if c in have else f"NULL AS {c}" for c in TRACES_COLUMNS)
+
+    # ----------------------------
+    # 쓰기
+    # ----------------------------
+    def _ensure_attached(self, start_sec: int) -> str:
+        schema = self._attached.get(start_sec)
+        if schema is not None:
+            self._attached.move_to_end(start_sec)
+            return schema
+
+        while len(self._attached) >= self.max_attached:
+            _, old = self._attached.popitem(last=False)
+            self._conn.execute(f"DETACH DATABASE {old}")
+
+        schema = f"p{start_sec}"
+        self._attach(self._conn, self.partition_path(start_sec), schema)
+        self._conn.execute(f"PRAGMA {schema}.journal_mode=WAL;")
+        self._conn.execute(f"PRAGMA {schema}.synchronous=NORMAL;")
+        self._conn.executescript(TRACES_DDL.format(schema=schema))
+        self.migrate(self._conn, schema)
+        self._attached[start_sec] = schema
+        return schema
+
+    def insert(self, rows: Iterable[Tuple]) -> Tuple[int, int]:
+        """
+        traces row (TRACES_COLUMNS 순서) 를 파티션별로 INSERT OR IGNORE
+
+        Returns:
+            (inserted, ignored)
+        """
+        by_partition = {}
+        for row in rows:
+            ts = row[4] if row[4] is not None else row[1]
+            by_partition.setdefault(self.partition_of(ts), []).append(row)
+        if not by_partition:
+            return 0, 0
+
+        placeholders = ", ".join("?" for _ in TRACES_COLUMNS)
+        total = sum(len(r) for r in by_partition.values())
+        with self._lock:
+            # ATTACH 는 트랜잭션 밖에서만 가능 → 먼저 붙여두고 한 번에 기록
+            schemas = {p: self._ensure_attached(p) for p in by_partition}
+            before = self._conn.total_changes
+            with self._conn:
+                for p, part_rows in by_partition.items():
+                    self._conn.executemany(
+                        f"INSERT OR IGNORE INTO {schemas[p]}.traces ({', '.join(TRACES_COLUMNS)}) "
+                        f"VALUES ({placeholders})",
+                        part_rows,
+                    )
+            inserted = self._conn.total_changes - before
+        return inserted, max(0, total - inserted)
+
+    # ----------------------------
+    # 조회
+    # ----------------------------
+    def connect(self, start_us: int, end_us: int, main_db: Optional[str] = None,
+                include_legacy: bool = True) -> sqlite3.Connection:
+        """
+        [start_us, end_us] 와 겹치는 파티션만 ATTACH 한 연결 반환
+        TEMP VIEW traces (UNION ALL) 가 main.traces 를 가리므로 기존 SQL 을 그대로 쓸 수 있음
+        main_db 를 주면 service_profile 등 나머지 테이블은 그 DB 에서 읽음
+        include_legacy: 파티션 도입 이전 main.traces 의 row 도 같이 조회
+        """
+        conn = sqlite3.connect(main_db or ":memory:")
+        try:
+            self.attach_window(conn, start_us, end_us, include_legacy=include_legacy and main_db is not None)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def attach_window(self, conn: sqlite3.Connection, start_us: int, end_us: int,
+                      include_legacy: bool = True) -> List[str]:
+        """
+        이미 열린 연결에 [start_us, end_us] 파티션을 붙이고 TEMP traces 를 만듦 (트랜잭션 밖에서 호출)
+
+        Returns:
+            붙인 schema 목록 (detach_window 에 전달)
+        """
+        parts = self.partitions(start_us, end_us)
+
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if hasattr(conn, "getlimit") else 10
+        if len(parts) > limit:
+            raise ValueError(
+                f"조회 구간이 파티션 {len(parts)}개에 걸침 (ATTACH 최대 {limit}개): "
+                f"iter_rows() 로 파티션별 조회 필요"
+            )
+
+        schemas = []
+        selects = []
+        for p in parts:
+            schema = f"p{p}"
+            self._attach(conn, self.partition_path(p), schema)
+            schemas.append(schema)
+            selects.append(f"SELECT {self._select_cols(conn, schema)} FROM {schema}.traces")
+
+        if include_legacy:
+            exists = conn.execute(
+                "SELECT 1 FROM main.sqlite_master WHERE type='table' AND name='traces';"
+            ).fetchone()
+            if exists:
+                selects.append(f"SELECT {self._select_cols(conn, 'main')} FROM main.traces")
+
+        if selects:
+            conn.execute("CREATE TEMP VIEW traces AS " + " UNION ALL ".join(selects))
+        else:
+            conn.executescript(TRACES_DDL.format(schema="temp"))
+        return schemas
+
+    @staticmethod
+    def detach_window(conn: sqlite3.Connection, schemas: Iterable[str]) -> None:
+        """attach_window 되돌리기 (트랜잭션 밖에서 호출)"""
+        row = conn.execute("SELECT type FROM temp.sqlite_master WHERE name='traces';").fetchone()
+        if row is not None:
+            conn.execute(f"DROP {'VIEW' if row[0] == 'view' else 'TABLE'} temp.traces;")
+        for schema in schemas:
+            conn.execute(f"DETACH DATABASE {schema}")
+
+    def iter_rows(self, start_us: int, end_us: int, where: str = "", params: Tuple = ()) -> Iterable[Tuple]:
+        """ATTACH 한도를 넘는 긴 구간용: 파티션 하나씩 열어 start_time_us 구간 row 를 순서대로 반환"""
+        extra = f" AND ({where})" if where else ""
+        for p in self.partitions(start_us, end_us):
+            conn = sqlite3.connect(self.partition_path(p))
+            try:
+                yield from conn.execute(
+                    f"SELECT {self._select_cols(conn, 'main')} FROM traces WHERE start_time_us BETWEEN ? AND ?{extra} "
+                    f"ORDER BY start_time_us",
+                    (start_us, end_us) + tuple(params),
+                )
+            finally:
+                conn.close()
+
+    # ----------------------------
+    # 보관 기간
+    # ----------------------------
+    def sealed(self, before_us: int) -> List[int]:
+        """구간 끝이 before_us 이전인 (더 이상 기록되지 않는) 파티션"""
+        return [p for p in self.partitions() if (p + self.partition_sec) * 1_000_000 <= before_us]
+
+    def drop(self, start_sec: int) -> None:
+        with self._lock:
+            schema = self._attached.pop(start_sec, None)
+            if schema is not None:
+                self._conn.execute(f"DETACH DATABASE {schema}")
+        path = self.partition_path(start_sec)
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.unlink(path + suffix)
+            except FileNotFoundError:
+                pass
+
+    def drop_before(self, cutoff_us: int) -> List[int]:
+        """구간 전체가 cutoff_us 이전인 파티션 파일 삭제"""
+        dropped = self.sealed(cutoff_us)
+        for p in dropped:
+            self.drop(p)
+        return dropped
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def attach_window(conn: sqlite3.Connection, start_us: int, end_us: int) -> List[str]:
+    """open_window 의 기존 연결 버전 (파티션 모드가 아니면 아무것도 안 함)"""
+    if not cfg.TRACE_PARTITIONED:
+        return []
+    store = TracePartitionStore()
+    try:
+        return store.attach_window(conn, start_us, end_us)
+    finally:
+        store.close()
+
+
+def detach_window(conn: sqlite3.Connection, schemas: List[str]) -> None:
+    if cfg.TRACE_PARTITIONED:
+        TracePartitionStore.detach_window(conn, schemas)
+
+
+def open_window(db_path: str, start_us: int, end_us: int) -> sqlite3.Connection:
+    """
+    profiler / 시각화용: 파티션 모드면 [start_us, end_us] 파티션만 붙인 연결, 아니면 db_path 그대로
+    """
+    if not cfg.TRACE_PARTITIONED:
+        return sqlite3.connect(db_path)
+    store = TracePartitionStore()
+    try:
+        return store.connect(start_us, end_us, main_db=db_path)
+    finally:
+        store.close()
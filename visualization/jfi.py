@@ -4,6 +4,8 @@ import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
+from series import profile_series
+
 plt.rcParams.update({"font.size": 20})
 
 DB_PATH = "/home/ubuntu/fairness_control/trace_store.db"
@@ -45,18 +47,8 @@ SCENARIOS = {
 
 
 def compute_jfi(conn, start, end, services):
-    service_placeholders = "', '".join(services)
-
-    query = f"""
-    SELECT service, qos, weight, creation_time
-    FROM profile_hst
-    WHERE datetime(creation_time / 1000000, 'unixepoch', '+9 hours')
-          BETWEEN '{start}' AND '{end}'
-          AND service IN ('{service_placeholders}')
-    ORDER BY creation_time ASC;
-    """
-
-    df = pd.read_sql_query(query, conn)
+    # 바뀐 서비스만 기록된 이력 → 시각마다 모든 서비스 값을 채워야 JFI 계산 가능
+    df = profile_series(conn, start, end, services, ["qos", "weight"])
 
     if df.empty:
         return pd.DataFrame(columns=["elapsed_sec", "jfi"])
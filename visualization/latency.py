@@ -1,9 +1,15 @@
-import sqlite3
+import os
+import sys
 import pandas as pd
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trace_store import kst_to_us, open_window
+
+DB_PATH = '/home/ubuntu/fairness_control/trace_store.db'
+
 plt.rcParams.update({'font.size': 20})
 
 SCENARIOS = {
@@ -90,10 +96,28 @@ def remove_outliers_iqr(s):
 
     return s[(s >= lower) & (s <= upper)]
 
-def plot_box_by_service(start_time, end_time, start_time2, end_time2, services, output_path):
-    conn = sqlite3.connect('/home/ubuntu/fairness_control/trace_store.db')
+def read_latency(start_time, end_time, services):
+    """구간(KST) 안 요청의 실행 시간 (traces 파티션은 구간에 걸친 것만 조회)"""
+    start_us = kst_to_us(start_time)
+    end_us = kst_to_us(end_time) + 999_999
     service_placeholders = "', '".join(services)
 
+    query = f"""
+    SELECT service, duration_ms as t_execute
+    FROM traces
+    WHERE start_time_us BETWEEN {start_us} AND {end_us}
+        AND service IN ('{service_placeholders}')
+    """
+
+    conn = open_window(DB_PATH, start_us, end_us)
+    try:
+        return pd.read_sql_query(query, conn)
+    finally:
+        conn.close()
+
+
+def plot_box_by_service(start_time, end_time, start_time2, end_time2, services, output_path):
+
     # query_template = """
     # SELECT service, t_execute
     # FROM profile_hst
@@ -103,32 +127,8 @@ def plot_box_by_service(start_time, end_time, start_time2, end_time2, services,
     # ORDER BY service, creation_time ASC;
     # """
 
-    query_template = """
-    SELECT service, duration_ms as t_execute
-    FROM traces
-    WHERE datetime(start_time_us / 1000000, 'unixepoch', '+9 hours')
-        BETWEEN '{start}' AND '{end}'
-        AND service IN ('{services}')
-    """
-
-    df_proposed = pd.read_sql_query(
-        query_template.format(
-            start=start_time,
-            end=end_time,
-            services=service_placeholders
-        ),
-        conn
-    )
-
-    df_lru = pd.read_sql_query(
-        query_template.format(
-            start=start_time2,
-            end=end_time2,
-            services=service_placeholders
-        ),
-        conn
-    )
-    conn.close()
+    df_proposed = read_latency(start_time, end_time, services)
+    df_lru = read_latency(start_time2, end_time2, services)
 
     box_data = []
     labels = []
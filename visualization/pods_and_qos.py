@@ -5,6 +5,8 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 
+from series import dense_pod_series, profile_series
+
 
 SCENARIOS = [
     {
@@ -43,7 +45,6 @@ SCENARIOS = [
 def create_combined_chart(start_time, end_time, services, output_path):
     conn = sqlite3.connect('/home/ubuntu/fairness_control/trace_store.db')
 
-    service_placeholders = "', '".join(services)
 
     service_colors = {
         'small-fast':  '#1f77b4',
@@ -53,25 +54,11 @@ def create_combined_chart(start_time, end_time, services, output_path):
         'large':       '#9467bd'
     }
 
-    pod_query = f"""
-    SELECT creation_time_us, service, pod_count
-    FROM pod_snapshots
-    WHERE datetime(creation_time_us / 1000000, 'unixepoch', '+9 hours') 
-          BETWEEN '{start_time}' AND '{end_time}'
-          AND service IN ('{service_placeholders}')
-    ORDER BY creation_time_us ASC;
-    """
-    df_pod = pd.read_sql_query(pod_query, conn)
-
-    qos_query = f"""
-    SELECT creation_time, service, qos
-    FROM profile_hst
-    WHERE datetime(creation_time / 1000000, 'unixepoch', '+9 hours') 
-          BETWEEN '{start_time}' AND '{end_time}'
-          AND service IN ('{service_placeholders}')
-    ORDER BY creation_time ASC;
-    """
-    df_qos = pd.read_sql_query(qos_query, conn)
+    # pod_snapshots 는 변경 시점만 기록 → 1초 격자로 펼침
+    df_pod = dense_pod_series(conn, start_time, end_time, services)
+
+    # profile_hst 는 바뀐 서비스만 기록 → 시각별로 직전 값을 채움
+    df_qos = profile_series(conn, start_time, end_time, services, ["qos"])
     conn.close()
 
     if df_pod.empty and df_qos.empty:
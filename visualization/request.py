@@ -1,6 +1,8 @@
 import sqlite3
 import pandas as pd
 
+from series import load_pod_steps
+
 DB_PATH = "/home/ubuntu/fairness_control/trace_store.db"
 
 SCENARIOS = {
@@ -91,18 +93,8 @@ SCENARIOS = {
 
 
 def count_cold_starts(conn, start, end, services):
-    service_placeholders = "', '".join(services)
-
-    query = f"""
-    SELECT creation_time_us, service, pod_count
-    FROM pod_snapshots
-    WHERE datetime(creation_time_us / 1000000, 'unixepoch', '+9 hours')
-          BETWEEN '{start}' AND '{end}'
-          AND service IN ('{service_placeholders}')
-    ORDER BY service, creation_time_us ASC;
-    """
-
-    df = pd.read_sql_query(query, conn)
+    # 변경 시점 row (+ 구간 시작 상태) 만 읽어도 증가량 합은 매초 기록과 같음
+    df = load_pod_steps(conn, start, end, services)
 
     result = {}
 
@@ -0,0 +1,143 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trace_store import kst_to_us
+
+
+# ----------------------------
+# pod_snapshots (변경 시점만 기록) → 시각화용 시계열
+# ----------------------------
+def load_pod_steps(conn, start_time, end_time, services):
+    """
+    구간(KST 문자열) 안의 pod 수 변경 row + 구간 시작 시점 상태
+
+    watcher 가 pod_count 가 바뀔 때만 (+ 주기적 keyframe) 기록하므로,
+    구간 시작 직전 마지막 row 를 start 시각으로 붙여야 처음 값이 맞음
+    (매초 기록된 예전 데이터에도 그대로 동작)
+
+    Returns:
+        DataFrame [creation_time_us, service, pod_count] (service, 시간 순)
+    """
+    start_us = kst_to_us(start_time)
+    end_us = kst_to_us(end_time) + 999_999
+
+    frames = []
+    for service in services:
+        prev = pd.read_sql_query(
+            """
+            SELECT ? AS creation_time_us, service, pod_count
+            FROM pod_snapshots
+            WHERE service = ? AND creation_time_us < ?
+            ORDER BY creation_time_us DESC
+            LIMIT 1;
+            """,
+            conn,
+            params=(start_us, service, start_us),
+        )
+        rows = pd.read_sql_query(
+            """
+            SELECT creation_time_us, service, pod_count
+            FROM pod_snapshots
+            WHERE service = ? AND creation_time_us BETWEEN ? AND ?
+            ORDER BY creation_time_us ASC;
+            """,
+            conn,
+            params=(service, start_us, end_us),
+        )
+        frames.extend(df for df in (prev, rows) if not df.empty)
+
+    if not frames:
+        return pd.DataFrame(columns=["creation_time_us", "service", "pod_count"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def dense_pod_series(conn, start_time, end_time, services, step_sec=1):
+    """
+    변경 row 를 step_sec 간격 격자로 펼친 계단형 시계열 (각 시점의 직전 값 유지)
+
+    Returns:
+        DataFrame [creation_time_us, service, pod_count] (시간 순)
+    """
+    steps = load_pod_steps(conn, start_time, end_time, services)
+    start_us = kst_to_us(start_time)
+    end_us = kst_to_us(end_time)
+    grid = np.arange(start_us, end_us + 1, int(step_sec * 1_000_000), dtype=np.int64)
+
+    frames = []
+    for service, group in steps.groupby("service", sort=False):
+        t = group["creation_time_us"].to_numpy(dtype=np.int64)
+        v = group["pod_count"].to_numpy()
+        idx = np.searchsorted(t, grid, side="right") - 1
+        valid = idx >= 0
+        frames.append(pd.DataFrame({
+            "creation_time_us": grid[valid],
+            "service": service,
+            "pod_count": v[idx[valid]],
+        }))
+
+    if not frames:
+        return pd.DataFrame(columns=["creation_time_us", "service", "pod_count"])
+    return pd.concat(frames, ignore_index=True).sort_values("creation_time_us", kind="stable")
+
+
+# ----------------------------
+# profile_hst (바뀐 서비스만 기록) → 시각별 전체 서비스 상태
+# ----------------------------
+def profile_series(conn, start_time, end_time, services, columns=("qos",)):
+    """
+    구간(KST 문자열) 안에서 어느 서비스든 값이 바뀐 시각마다 모든 서비스의 직전 값을 채운 표
+
+    watcher 가 service_profile 이 바뀐 서비스만 profile_hst 에 기록하므로
+    JFI 처럼 같은 시각의 전 서비스 값이 필요한 계산은 이 표를 사용
+
+    Returns:
+        DataFrame [creation_time, service, *columns] (시간 순)
+    """
+    start_us = kst_to_us(start_time)
+    end_us = kst_to_us(end_time) + 999_999
+    cols = ", ".join(columns)
+
+    frames = []
+    for service in services:
+        prev = pd.read_sql_query(
+            f"""
+            SELECT ? AS creation_time, service, {cols}
+            FROM profile_hst
+            WHERE service = ? AND creation_time < ?
+            ORDER BY creation_time DESC
+            LIMIT 1;
+            """,
+            conn,
+            params=(start_us, service, start_us),
+        )
+        rows = pd.read_sql_query(
+            f"""
+            SELECT creation_time, service, {cols}
+            FROM profile_hst
+            WHERE service = ? AND creation_time BETWEEN ? AND ?
+            ORDER BY creation_time ASC;
+            """,
+            conn,
+            params=(service, start_us, end_us),
+        )
+        frames.extend(df for df in (prev, rows) if not df.empty)
+
+    if not frames:
+        return pd.DataFrame(columns=["creation_time", "service", *columns])
+
+    changes = pd.concat(frames, ignore_index=True)
+    times = np.sort(changes["creation_time"].unique())
+
+    out = []
+    for service, group in changes.groupby("service", sort=False):
+        idx = np.searchsorted(group["creation_time"].to_numpy(), times, side="right") - 1
+        valid = idx >= 0
+        filled = group.iloc[idx[valid]].copy()
+        filled["creation_time"] = times[valid]
+        out.append(filled)
+
+    return pd.concat(out, ignore_index=True).sort_values("creation_time", kind="stable")
@@ -0,0 +1,261 @@
+import functools
+import gzip
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from kubernetes import client
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------
+# watcher 입력 기록 / 재생
+# ----------------------------
+# 클러스터 / Jaeger 없이 ingest · profiler 처리량을 재현 가능하게 측정하기 위한 로그
+# - 기록: 수집기가 받은 원본 응답 (K8s list / watch 이벤트, Jaeger JSON, Prometheus 응답) 을
+#         gzip JSON lines 로 저장 {"t": 수신 epoch 초, "src", "call", "key", "data"}
+# - 재생: 같은 수집기 객체의 API 호출 부분만 로그 조회로 바꿔 끼움
+#         (src, call, key) 별로 기록 순서대로 돌려주고, 기록 시각 간격을 speed 배속으로 유지
+#         speed=0 이면 대기 없이 최대 속도
+
+
+def _k8s_to_dict(obj) -> Any:
+    return client.ApiClient().sanitize_for_serialization(obj)
+
+
+class _RawResponse:
+    """ApiClient.deserialize() 가 읽는 응답 형태 (.data 에 JSON 문자열)"""
+
+    def __init__(self, data: Any):
+        self.data = json.dumps(data)
+
+
+def _k8s_from_dict(data: Any, type_name: Optional[str]) -> Any:
+    if type_name is None or data is None:
+        return data
+    return client.ApiClient().deserialize(_RawResponse(data), type_name)
+
+
+# K8s 수집기가 쓰는 list 호출 (watch=True 호출은 informer._watch_events 에서 이벤트 단위로 기록)
+K8S_LIST_CALLS = ("list_namespace", "list_node", "list_pod_for_all_namespaces")
+
+
+class ReplayExhausted(LookupError):
+    """재생할 기록이 더 없음"""
+
+
+class CaptureLog:
+    def __init__(self, path: str, compresslevel: int = 6, flush_interval_sec: float = 1.0):
+        self.path = path
+        self.flush_interval_sec = flush_interval_sec
+        self._fh = gzip.open(path, "at", compresslevel=compresslevel, encoding="utf-8")
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.stats = {"records": 0}
+
+    def write(self, src: str, call: str, key: str, data: Any) -> None:
+        line = json.dumps({"t": time.time(), "src": src, "call": call, "key": key, "data": data},
+                          separators=(",", ":"), default=str)
+        with self._lock:
+            self._fh.write(line + "\n")
+            self.stats["records"] += 1
+            # 비정상 종료 때 잃는 구간을 flush 주기 이내로 제한
+            if time.monotonic() - self._last_flush >= self.flush_interval_sec:
+                self._fh.flush()
+                self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+    # ----------------------------
+    # 수집기에 기록 훅 설치
+    # ----------------------------
+    def _wrap_k8s(self, v1) -> None:
+        for name in K8S_LIST_CALLS:
+            orig = getattr(v1, name)
+
+            # functools.wraps: watch.Watch 가 docstring 에서 반환 타입을 읽으므로 유지해야 함
+            @functools.wraps(orig)
+            def recorded(*args, _orig=orig, _name=name, **kwargs):
+                result = _orig(*args, **kwargs)
+                if not kwargs.get("watch"):
+                    self.write("k8s", _name, kwargs.get("field_selector") or "",
+                               {"type": type(result).__name__, "object": _k8s_to_dict(result)})
+                return result
+
+            setattr(v1, name, recorded)
+
+    def install(self, prom=None, jaeger=None, pods=None, manager=None) -> None:
+        """수집기 인스턴스의 API 호출을 감싸서 응답을 같이 기록 (동작은 그대로)"""
+        if prom is not None:
+            request = prom._request
+
+            def prom_request(path, params):
+                data = request(path, params)
+                self.write("prometheus", path, params.get("query", ""), data)
+                return data
+
+            prom._request = prom_request
+
+        if jaeger is not None:
+            get, stream = jaeger._get, jaeger._stream_traces
+
+            def jaeger_get(path, params=None):
+                data = get(path, params)
+                self.write("jaeger", "get", path, data)
+                return data
+
+            def jaeger_stream(params, chunk_size=64 * 1024):
+                traces = []
+                for tr in stream(params, chunk_size=chunk_size):
+                    traces.append(tr)
+                    yield tr
+                self.write("jaeger", "traces", params.get("service", ""), traces)
+
+            jaeger._get = jaeger_get
+            jaeger._stream_traces = jaeger_stream
+
+        if pods is not None:
+            self._wrap_k8s(pods.v1)
+            watch_events = pods._watch_events
+
+            def pod_events(w):
+                for evt in watch_events(w):
+                    obj = evt.get("object")
+                    self.write("k8s", "watch", "pods", {
+                        "type": evt.get("type", ""),
+                        "kind": type(obj).__name__ if obj is not None and not isinstance(obj, dict) else None,
+                        "object": _k8s_to_dict(obj),
+                    })
+                    yield evt
+
+            pods._watch_events = pod_events
+
+        if manager is not None and manager.v1 is not (pods.v1 if pods is not None else None):
+            self._wrap_k8s(manager.v1)
+
+
+class ReplayLog:
+    def __init__(self, path: str, speed: float = 1.0, end_grace_sec: float = 5.0):
+        self.path = path
+        self.speed = speed
+        self._queues: Dict[Tuple[str, str, str], Deque[Tuple[float, Any]]] = {}
+        self._lock = threading.Lock()
+
+        first_t = last_t = None
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                key = (rec["src"], rec["call"], rec["key"])
+                self._queues.setdefault(key, deque()).append((rec["t"], rec["data"]))
+                first_t = rec["t"] if first_t is None else min(first_t, rec["t"])
+                last_t = rec["t"] if last_t is None else max(last_t, rec["t"])
+
+        self.first_t = first_t or 0.0
+        self.last_t = last_t or 0.0
+        self.end_grace_sec = end_grace_sec
+        self._started = time.monotonic()
+
+        # 모든 기록을 돌려줬거나, (speed > 0 일 때) 재생 시각이 로그 끝을 지나면 set
+        self.finished = threading.Event()
+        self.stats = {"records": sum(len(q) for q in self._queues.values()), "replayed": 0, "missing": 0}
+
+    # ----------------------------
+    # 재생 시각
+    # ----------------------------
+    def clock(self) -> float:
+        """지금 재생 중인 기록 시각 (epoch 초)"""
+        if self.speed <= 0:
+            return float("inf")
+        return self.first_t + (time.monotonic() - self._started) * self.speed
+
+    def _wait_until(self, t: float) -> None:
+        if self.speed <= 0:
+            return
+        delay = (t - self.first_t) / self.speed - (time.monotonic() - self._started)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _check_finished(self) -> None:
+        # speed <= 0 이면 clock() 이 inf 라서 시각으로는 끝을 판단하지 않음 (기록이 다 빠질 때까지 재생)
+        if not any(self._queues.values()) or (
+            self.speed > 0 and self.clock() > self.last_t + self.end_grace_sec
+        ):
+            self.finished.set()
+
+    def take(self, src: str, call: str, key: str) -> Any:
+        """(src, call, key) 의 다음 기록 응답, 기록 시각까지 대기"""
+        with self._lock:
+            queue = self._queues.get((src, call, key))
+            if not queue:
+                self.stats["missing"] += 1
+                self._check_finished()
+                raise ReplayExhausted(f"재생할 기록 없음: {src} {call} {key!r}")
+            t, data = queue.popleft()
+            self.stats["replayed"] += 1
+        self._wait_until(t)
+        with self._lock:
+            self._check_finished()
+        return data
+
+    # ----------------------------
+    # 수집기를 로그 재생으로 전환
+    # ----------------------------
+    def k8s_api(self) -> "ReplayCoreV1Api":
+        """K8sPodInformer / NodeResourceManager 의 v1 인자로 전달"""
+        return ReplayCoreV1Api(self)
+
+    def install(self, prom=None, jaeger=None, pods=None) -> None:
+        if prom is not None:
+            def prom_request(path, params):
+                prom.stats["api_calls"] += 1
+                return self.take("prometheus", path, params.get("query", ""))
+
+            prom._request = prom_request
+
+        if jaeger is not None:
+            def jaeger_get(path, params=None):
+                jaeger.stats["api_calls"] += 1
+                return self.take("jaeger", "get", path)
+
+            def jaeger_stream(params, chunk_size=64 * 1024):
+                jaeger.stats["api_calls"] += 1
+                return iter(self.take("jaeger", "traces", params.get("service", "")))
+
+            jaeger._get = jaeger_get
+            jaeger._stream_traces = jaeger_stream
+
+        if pods is not None:
+            def pod_events(w):
+                while not pods.stop_event.is_set():
+                    try:
+                        data = self.take("k8s", "watch", "pods")
+                    except ReplayExhausted:
+                        # 기록 끝: watch 가 timeout 으로 끝난 것처럼 대기 후 반환
+                        pods.stop_event.wait(pods.watch_timeout_sec)
+                        return
+                    yield {"type": data["type"], "object": _k8s_from_dict(data["object"], data["kind"])}
+
+            pods._watch_events = pod_events
+
+
+class ReplayCoreV1Api:
+    """CoreV1Api 중 K8S_LIST_CALLS 만 로그에서 돌려주는 대역"""
+
+    def __init__(self, log: ReplayLog):
+        self.log = log
+
+    def _list(self, name: str, **kwargs) -> Any:
+        data = self.log.take("k8s", name, kwargs.get("field_selector") or "")
+        return _k8s_from_dict(data["object"], data["type"])
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if name in K8S_LIST_CALLS:
+            return functools.partial(self._list, name)
+        raise AttributeError(f"재생 모드에서 지원하지 않는 K8s 호출: {name}")
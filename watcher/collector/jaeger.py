@@ -1,23 +1,137 @@
+import codecs
+import json
+import logging
+import re
 import requests
 import time
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict, namedtuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 요청 1건에서 필요한 값만 담는 compact tuple
+# queue_wait_ms: activator 가 pod 자리를 기다린 시간 (throttler_try span 합, activator span 이 없으면 None)
+# cold: queue_wait_ms 가 COLD_WAIT_MS 이상이면 1 (cold start 대기로 간주)
+RequestInfo = namedtuple(
+    "RequestInfo",
+    ["trace_id", "start_us", "duration_ms", "service", "revision", "queue_wait_ms", "cold"],
+    defaults=(None, 0),
+)
+
+# Knative activator 의 span 이름
+ACTIVATOR_QUEUE_SPANS = ("throttler_try",)
+ACTIVATOR_PROXY_SPANS = ("activator_proxy",)
+
+_WS_COMMA = re.compile(r"[\s,]*")
+
+
+def iter_json_array(chunks: Iterable[str], key: str = "data") -> Iterator[Any]:
+    """
+    {"<key>": [ ... ], ...} 형태의 JSON 텍스트 스트림에서 배열 원소를 하나씩 decode 해서 반환
+    전체 응답을 메모리에 올리지 않고 원소(trace) 1개 분량만 유지함
+
+    줄어드는 것은 메모리 (최대 trace 1개 + chunk) 뿐이고 CPU 는 그대로:
+    원소마다 span / tag / process 전체를 stdlib json 으로 decode 한 뒤 request_from_trace 가 필요한 값만 고름
+    (handle / activator span 만 남기려면 이벤트 기반 parser 가 필요 → 의존성 추가라 하지 않음)
+    """
+    decoder = json.JSONDecoder()
+    it = iter(chunks)
+    buf = ""
+
+    # 1) "<key>": [ 위치까지 읽기
+    marker = f'"{key}"'
+    while True:
+        idx = buf.find(marker)
+        if idx >= 0:
+            bracket = buf.find("[", idx + len(marker))
+            if bracket >= 0:
+                buf = buf[bracket + 1:]
+                break
+        chunk = next(it, None)
+        if chunk is None:
+            return
+        buf += chunk
+
+    # 2) 원소 단위 decode
+    pos = 0
+    while True:
+        pos = _WS_COMMA.match(buf, pos).end()
+        if pos >= len(buf):
+            chunk = next(it, None)
+            if chunk is None:
+                return
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+
+        if buf[pos] == "]":
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # 원소가 아직 다 안 들어옴 → 남은 길이만큼 더 읽고 다시 시도 (재decode 비용을 선형으로 유지)
+            buf, pos = buf[pos:], 0
+            need, added = max(len(buf), 1), 0
+            while added < need:
+                chunk = next(it, None)
+                if chunk is None:
+                    break
+                buf += chunk
+                added += len(chunk)
+            if added == 0:
+                # 스트림이 끝났는데도 decode 불가 → 잘못된 응답
+                raise
+            continue
+
+        yield obj
+        pos = end
 
 
 class JaegerCollector:
-    def __init__(self, base_url: str, timeout_sec: int = 10):
+    def __init__(
+        self,
+        base_url: str,
+        timeout_sec: int = 10,
+        overlap_sec: int = 10,
+        min_split_sec: float = 0.5,
+        seen_capacity: int = 100_000,
+    ):
         self.base_url = base_url.rstrip("/")
         self.timeout_sec = timeout_sec
 
+        # 증분 조회 상태
+        # - service 별 마지막으로 수집한 trace startTime (high-water mark, epoch µs)
+        # - export 지연으로 늦게 보이는 trace 를 위해 hwm 보다 overlap 만큼 앞에서부터 조회
+        # - 중복은 최근 trace_id 집합(최대 seen_capacity 개)으로 SQLite 에 가기 전에 제거
+        self.overlap_us = int(overlap_sec * 1_000_000)
+        self.min_split_us = int(min_split_sec * 1_000_000)
+        self.seen_capacity = seen_capacity
+        self._hwm_us: Dict[str, int] = {}
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+
+        self.stats = {"api_calls": 0, "saturated_pages": 0}
+
     # ----------------------------
     # internal http helper
     # ----------------------------
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         url = f"{self.base_url}{path}"
+        self.stats["api_calls"] += 1
         resp = requests.get(url, params=params, timeout=self.timeout_sec)
         resp.raise_for_status()
         # print(f"[DEBUG] Jaeger GET: {resp.url}")
         return resp.json()
 
+    def _stream_traces(self, params: Dict[str, Any], chunk_size: int = 64 * 1024) -> Iterator[Dict[str, Any]]:
+        """/api/traces 응답을 trace 단위로 스트리밍 decode"""
+        url = f"{self.base_url}/api/traces"
+        self.stats["api_calls"] += 1
+        with requests.get(url, params=params, timeout=self.timeout_sec, stream=True) as resp:
+            resp.raise_for_status()
+            utf8 = codecs.getincrementaldecoder("utf-8")()
+            chunks = (utf8.decode(b) for b in resp.iter_content(chunk_size=chunk_size))
+            yield from iter_json_array(chunks, key="data")
+
     # ----------------------------
     # Jaeger에 등록된 service 목록
     # ----------------------------
@@ -47,11 +161,146 @@ class JaegerCollector:
         data = self._get("/api/traces", params=params)
         return data.get("data", [])
 
+    # ----------------------------
+    # 증분 요청 조회 (high-water mark)
+    # ----------------------------
+    def _get_requests_range(self, service: str, start_us: int, end_us: int, limit: int) -> List[RequestInfo]:
+        """
+        [start_us, end_us] 구간을 스트리밍으로 조회해서 RequestInfo 로 변환
+        trace 수가 limit 에 걸리면 구간을 반으로 나눠 다시 조회해서 잘리는 trace 가 없도록 함
+        """
+        params = {
+            "service": service,
+            "start": start_us,
+            "end": end_us,
+            "limit": limit,
+        }
+        n_traces = 0
+        out: List[RequestInfo] = []
+        for tr in self._stream_traces(params):
+            n_traces += 1
+            info = self.request_from_trace(tr)
+            if info is not None:
+                out.append(info)
+
+        if n_traces < limit:
+            return out
+
+        self.stats["saturated_pages"] += 1
+        if end_us - start_us <= self.min_split_us:
+            logger.warning(
+                f"trace 조회 구간을 더 나눌 수 없음 (service={service}, "
+                f"{start_us}~{end_us}, limit={limit}) → 일부 누락 가능"
+            )
+            return out
+
+        mid_us = (start_us + end_us) // 2
+        return (
+            self._get_requests_range(service, start_us, mid_us, limit)
+            + self._get_requests_range(service, mid_us, end_us, limit)
+        )
+
+    def _remember(self, trace_id: str) -> None:
+        self._seen[trace_id] = None
+        if len(self._seen) > self.seen_capacity:
+            self._seen.popitem(last=False)
+
+    def get_new_requests(
+        self,
+        service: str,
+        lookback_sec: int = 60,
+        limit: int = 500,
+    ) -> List[RequestInfo]:
+        """
+        마지막 수집 이후 새로 생긴 요청만 반환
+        - 첫 호출은 lookback_sec 만큼 조회
+        - 이후에는 (hwm - overlap) ~ 현재 구간만 조회
+        - hwm / seen 은 여기서 바꾸지 않음: writer 에 넘긴 뒤 mark_delivered() 로 반영
+          (writer 가 버린 batch 는 다음 조회에서 다시 나옴)
+        """
+        end_us = int(time.time() * 1_000_000)
+        hwm_us = self._hwm_us.get(service)
+        if hwm_us is None:
+            start_us = end_us - (lookback_sec * 1_000_000)
+        else:
+            start_us = hwm_us - self.overlap_us
+
+        new_requests: List[RequestInfo] = []
+        batch_ids = set()
+        for info in self._get_requests_range(service, start_us, end_us, limit):
+            if info.trace_id in self._seen or info.trace_id in batch_ids:
+                continue
+            batch_ids.add(info.trace_id)
+            new_requests.append(info)
+        return new_requests
+
+    def mark_delivered(self, service: str, requests_: Iterable[RequestInfo]) -> None:
+        """get_new_requests 결과가 writer 에 들어간 뒤 호출: seen 에 넣고 hwm 을 앞으로"""
+        max_start_us = self._hwm_us.get(service) or 0
+        for info in requests_:
+            self._remember(info.trace_id)
+            max_start_us = max(max_start_us, info.start_us)
+        if max_start_us:
+            self._hwm_us[service] = max_start_us
+
     # ----------------------------
     # 핵심: trace → 요청 단위 정보 추출
     # ----------------------------
-    @staticmethod
-    def extract_request_info(traces: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # activator 대기가 이 이상이면 cold start 로 판단 (warm pod 자리 대기는 보통 이보다 짧음)
+    COLD_WAIT_MS = 500.0
+
+    @classmethod
+    def request_from_trace(cls, tr: Dict[str, Any]) -> Optional[RequestInfo]:
+        """
+        handle span 과 kn.revision.name / kn.service.name 태그로 RequestInfo 생성
+        activator 의 throttler_try / activator_proxy span 이 있으면 대기 시간과 cold 여부도 채움
+        """
+        trace_id = tr.get("traceID")
+        if not trace_id:
+            return None
+
+        handle_span = None
+        queue_wait_us = 0
+        has_activator = False
+        for sp in tr.get("spans", ()):
+            op = sp.get("operationName")
+            if op == "handle":
+                if handle_span is None:
+                    handle_span = sp
+            elif op in ACTIVATOR_QUEUE_SPANS:
+                has_activator = True
+                queue_wait_us += sp.get("duration") or 0
+            elif op in ACTIVATOR_PROXY_SPANS:
+                has_activator = True
+
+        if not handle_span:
+            # handle span이 없으면 스킵(원하면 logging 추가)
+            return None
+
+        dur_us = handle_span.get("duration")  # Jaeger는 보통 microseconds
+        start_us = handle_span.get("startTime")  # Jaeger는 보통 microseconds
+        if dur_us is None or start_us is None:
+            return None
+
+        service = None
+        revision = None
+        for tag in handle_span.get("tags", ()):
+            key = tag.get("key")
+            if key == "kn.revision.name":
+                revision = tag.get("value")
+            elif key == "kn.service.name":
+                service = tag.get("value")
+            else:
+                continue
+            if service is not None and revision is not None:
+                break
+
+        queue_wait_ms = queue_wait_us / 1000.0 if has_activator else None
+        cold = int(queue_wait_ms is not None and queue_wait_ms >= cls.COLD_WAIT_MS)
+        return RequestInfo(trace_id, start_us, dur_us / 1000.0, service, revision, queue_wait_ms, cold)
+
+    @classmethod
+    def extract_request_info(cls, traces: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         반환 형태:
         {
@@ -60,52 +309,16 @@ class JaegerCollector:
           duration_ms,
           service,
           revision,
-          configuration
+          queue_wait_ms,
+          cold,
         }
         """
         out: List[Dict[str, Any]] = []
 
         for tr in traces:
-            trace_id = tr.get("traceID")
-            spans = tr.get("spans", [])
-
-            handle_span = None
-            for sp in spans:
-                if sp.get("operationName") == "handle":
-                    # print(sp.get("operationName"))
-                    handle_span = sp
-                    break
-
-            if not handle_span:
-                # handle span이 없으면 스킵(원하면 logging 추가)
-                continue
-
-            dur_us = handle_span.get("duration")  # Jaeger는 보통 microseconds
-            if dur_us is None:
-                continue
-            start_us = handle_span.get("startTime")  # Jaeger는 보통 microseconds
-            if dur_us is None:
-                continue
-
-            # tags에서 kn.revision.name 찾기
-            revision = None
-            for tag in handle_span.get("tags", []):
-                if tag.get("key") == "kn.revision.name":
-                    revision = tag.get("value")
-                if tag.get("key") == "kn.service.name":
-                    service = tag.get("value")
-
-
-            # print(trace_id, start_us, dur_us, service, revision)
-
-            out.append({
-                "trace_id": trace_id,
-                "start_us": start_us,
-                "duration_ms": dur_us / 1000.0,
-                "service": service,
-                "revision": revision,
-            })
-
+            info = cls.request_from_trace(tr)
+            if info is not None:
+                out.append(info._asdict())
 
         # 시간 역순 정렬 (최신 요청 먼저)
         out.sort(key=lambda x: x["start_us"], reverse=True)
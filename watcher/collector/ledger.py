@@ -0,0 +1,143 @@
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from collector.node import NodeResourceManager
+
+
+class NodeCapacityLedger:
+    """
+    pod 이벤트의 delta 만 반영해서 노드별 Request 합계 / 가용량을 메모리에 유지하는 장부
+
+    - ADDED/MODIFIED: 파드의 (node, cpu, mem) 기여분을 새 값으로 교체
+      (바인딩 전 → 0, 바인딩 → request 만큼, Succeeded/Failed 전환 → 0)
+    - DELETED: 기여분 제거
+    - reset(): watch 재list 시 전체 재구성 (놓친 이벤트 보정)
+
+    K8sPodInformer 의 listener 로 등록해서 사용하고,
+    NodeResourceManager 는 값이 바뀐 노드만 node_resource_status 에 기록함
+    (값이 그대로여도 keyframe_sec 마다 다시 기록 → 다른 프로세스 (controller) 는 last_updated 로 신선도 판단)
+    """
+
+    TERMINAL_PHASES = ("Succeeded", "Failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._allocatable: Dict[str, Tuple[int, int]] = {}   # {node: (cpu_m, mem_bytes)}
+        self._requested: Dict[str, List[int]] = {}            # {node: [cpu_m, mem_bytes]}
+        self._pods: Dict[str, Tuple[str, int, int]] = {}      # {uid: (node, cpu_m, mem_bytes)}
+        self._persisted: Dict[str, Tuple[int, int, int, int, int, int]] = {}
+        self._persisted_at: Dict[str, datetime] = {}
+        self.version = 0
+
+    # ----------------------------
+    # 이벤트 반영
+    # ----------------------------
+    def _contribution(self, pod) -> Optional[Tuple[str, int, int]]:
+        node_name = pod.spec.node_name if pod.spec else None
+        phase = pod.status.phase if pod.status else None
+        if not node_name or phase in self.TERMINAL_PHASES:
+            return None
+        cpu, mem = NodeResourceManager._get_pod_requests(pod)
+        return node_name, cpu, mem
+
+    def _add(self, uid: str, contrib: Tuple[str, int, int]) -> None:
+        node_name, cpu, mem = contrib
+        self._pods[uid] = contrib
+        req = self._requested.setdefault(node_name, [0, 0])
+        req[0] += cpu
+        req[1] += mem
+
+    def _remove(self, uid: str) -> None:
+        prev = self._pods.pop(uid, None)
+        if prev is None:
+            return
+        node_name, cpu, mem = prev
+        req = self._requested[node_name]
+        req[0] -= cpu
+        req[1] -= mem
+
+    def reset(self, pods: Iterable) -> None:
+        with self._lock:
+            self._pods.clear()
+            self._requested.clear()
+            for pod in pods:
+                contrib = self._contribution(pod)
+                if contrib is not None:
+                    self._add(pod.metadata.uid, contrib)
+            self.version += 1
+
+    def apply_event(self, etype: str, pod) -> None:
+        uid = pod.metadata.uid
+        contrib = None if etype == "DELETED" else self._contribution(pod)
+        with self._lock:
+            if self._pods.get(uid) == contrib:
+                return
+            self._remove(uid)
+            if contrib is not None:
+                self._add(uid, contrib)
+            self.version += 1
+
+    def set_nodes(self, allocatable: Dict[str, Tuple[int, int]]) -> None:
+        """워커 노드 목록과 allocatable 갱신 (목록에 없는 노드는 장부에서 제외)"""
+        with self._lock:
+            if allocatable != self._allocatable:
+                self._allocatable = dict(allocatable)
+                self.version += 1
+
+    # ----------------------------
+    # 조회 API (in-process, API/DB 호출 없음)
+    # ----------------------------
+    def _row(self, node_name: str) -> Tuple[int, int, int, int, int, int]:
+        cpu_total, mem_total = self._allocatable[node_name]
+        cpu_used, mem_used = self._requested.get(node_name, (0, 0))
+        return (
+            cpu_total, cpu_used, max(0, cpu_total - cpu_used),
+            mem_total, mem_used, max(0, mem_total - mem_used),
+        )
+
+    def get_free(self, node_name: str) -> Optional[Tuple[int, int]]:
+        """(cpu_free_m, mem_free_bytes), 모르는 노드면 None"""
+        with self._lock:
+            if node_name not in self._allocatable:
+                return None
+            row = self._row(node_name)
+            return row[2], row[5]
+
+    def snapshot(self) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+        """(version, {node: (cpu_free_m, mem_free_bytes)}) 를 한 시점 기준으로 반환"""
+        with self._lock:
+            free = {}
+            for node_name in self._allocatable:
+                row = self._row(node_name)
+                free[node_name] = (row[2], row[5])
+            return self.version, free
+
+    # ----------------------------
+    # DB 기록 (바뀐 노드만)
+    # ----------------------------
+    def changed_rows(self, keyframe_sec: Optional[float] = None) -> List[Tuple]:
+        """
+        마지막 기록 이후 값이 바뀐 노드의 node_resource_status row 목록
+        keyframe_sec: 값이 같아도 마지막 기록이 이보다 오래됐으면 포함 (last_updated heartbeat)
+        """
+        now = datetime.now()
+        rows = []
+        with self._lock:
+            for node_name in self._allocatable:
+                row = self._row(node_name)
+                persisted_at = self._persisted_at.get(node_name)
+                if self._persisted.get(node_name) == row and (
+                    keyframe_sec is None
+                    or (persisted_at is not None and (now - persisted_at).total_seconds() < keyframe_sec)
+                ):
+                    continue
+                rows.append((node_name, *row, now))
+        return rows
+
+    def mark_persisted(self, rows: List[Tuple]) -> None:
+        """commit 이 끝난 row 만 넘길 것 (버려진 row 는 다음 changed_rows 에서 다시 나와야 함)"""
+        with self._lock:
+            for row in rows:
+                self._persisted[row[0]] = tuple(row[1:7])
+                self._persisted_at[row[0]] = row[7]
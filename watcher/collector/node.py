@@ -1,12 +1,53 @@
 import sqlite3
+import time
 from datetime import datetime
+from typing import Dict, List, Tuple
 from kubernetes import client, config
 
+UPSERT_NODE_SQL = """
+INSERT INTO node_resource_status (
+    node_name, cpu_allocatable_m, cpu_request_total_m, cpu_free_m,
+    mem_allocatable_bytes, mem_request_total_bytes, mem_free_bytes, last_updated
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(node_name) DO UPDATE SET
+    cpu_allocatable_m=excluded.cpu_allocatable_m,
+    cpu_request_total_m=excluded.cpu_request_total_m,
+    cpu_free_m=excluded.cpu_free_m,
+    mem_allocatable_bytes=excluded.mem_allocatable_bytes,
+    mem_request_total_bytes=excluded.mem_request_total_bytes,
+    mem_free_bytes=excluded.mem_free_bytes,
+    last_updated=excluded.last_updated
+"""
+
+
 class NodeResourceManager:
-    def __init__(self, sqlite_conn: sqlite3.Connection):
+    def __init__(
+        self,
+        sqlite_conn: sqlite3.Connection,
+        single_list: bool = True,
+        ledger=None,
+        node_refresh_sec: float = 30,
+        v1=None,
+        keyframe_sec: float = 5,
+    ):
         self.conn = sqlite_conn
+        # True: 전체 파드를 한 번만 list 해서 노드별로 합산 (노드 수와 무관하게 API 2회)
+        # False: 노드마다 list_pod_for_all_namespaces 호출 (기존 방식)
+        self.single_list = single_list
+        # ledger(NodeCapacityLedger) 가 있으면 파드 합산은 pod 이벤트 delta 로 유지되고,
+        # 여기서는 노드 allocatable 만 node_refresh_sec 주기로 갱신 + 바뀐 노드만 기록
+        self.ledger = ledger
+        self.node_refresh_sec = node_refresh_sec
+        # ledger 모드에서 값이 그대로인 노드도 이 주기로 다시 기록 (last_updated = watcher 가 살아 있다는 표시)
+        self.keyframe_sec = keyframe_sec
+        self._last_node_refresh = 0.0
+        self.stats = {"api_calls": 0}
         self._prepare_table()
 
+        if v1 is not None:
+            # capture 재생 등: kube-config 없이 주어진 API 객체 사용
+            self.v1 = v1
+            return
 
         try:
             config.load_kube_config()
@@ -53,6 +94,19 @@ class NodeResourceManager:
                 return int(float(s[:-len(u)]) * mul)
         return int(float(s))
 
+    @classmethod
+    def _get_pod_requests(cls, pod) -> Tuple[int, int]:
+        """파드의 컨테이너 CPU/Mem Request 합계"""
+        cpu_sum = 0
+        mem_sum = 0
+        if not pod.spec or not pod.spec.containers:
+            return 0, 0
+        for container in pod.spec.containers:
+            req = (container.resources.requests or {}) if container.resources else {}
+            cpu_sum += cls._parse_cpu(req.get("cpu", "0"))
+            mem_sum += cls._parse_mem(req.get("memory", "0"))
+        return cpu_sum, mem_sum
+
     def _get_node_allocated_resource(self, node_name: str):
         """특정 노드에 배치된 모든 파드의 리소스 Request 합산"""
         # Succeeded(성공), Failed(실패) 상태인 파드는 리소스를 점유하지 않음
@@ -62,31 +116,72 @@ class NodeResourceManager:
         cpu_sum = 0
         mem_sum = 0
         for pod in pods:
-            if not pod.spec.containers: continue
-            for container in pod.spec.containers:
-                req = (container.resources.requests or {}) if container.resources else {}
-                cpu_sum += self._parse_cpu(req.get("cpu", "0"))
-                mem_sum += self._parse_mem(req.get("memory", "0"))
+            cpu, mem = self._get_pod_requests(pod)
+            cpu_sum += cpu
+            mem_sum += mem
         return cpu_sum, mem_sum
 
-    def sync_cluster_nodes_to_db(self):
+    def _get_all_nodes_allocated_resource(self) -> Dict[str, Tuple[int, int]]:
+        """종료되지 않은 전체 파드를 한 번만 조회해서 노드별 Request 합산 {node: (cpu, mem)}"""
+        field_selector = "status.phase!=Succeeded,status.phase!=Failed"
+        pods = self.v1.list_pod_for_all_namespaces(field_selector=field_selector).items
+
+        allocated: Dict[str, Tuple[int, int]] = {}
+        for pod in pods:
+            node_name = pod.spec.node_name if pod.spec else None
+            if not node_name:
+                # 아직 스케줄되지 않은 파드
+                continue
+            cpu, mem = self._get_pod_requests(pod)
+            prev_cpu, prev_mem = allocated.get(node_name, (0, 0))
+            allocated[node_name] = (prev_cpu + cpu, prev_mem + mem)
+        return allocated
+
+    @staticmethod
+    def _is_control_plane(node) -> bool:
+        labels = node.metadata.labels or {}
+        return "node-role.kubernetes.io/control-plane" in labels or "node-role.kubernetes.io/master" in labels
+
+    def _rows_from_ledger(self) -> List[Tuple]:
+        """ledger 모드: 노드 allocatable 만 가끔 갱신하고 값이 바뀐 노드 row 만 반환"""
+        if time.monotonic() - self._last_node_refresh >= self.node_refresh_sec:
+            node_list = self.v1.list_node().items
+            self.stats["api_calls"] += 1
+            self.ledger.set_nodes({
+                node.metadata.name: (
+                    self._parse_cpu(node.status.allocatable.get("cpu", "0")),
+                    self._parse_mem(node.status.allocatable.get("memory", "0")),
+                )
+                for node in node_list
+                if not self._is_control_plane(node)
+            })
+            self._last_node_refresh = time.monotonic()
+
+        # mark_persisted 는 writer 가 commit 한 뒤에 (queue 에서 버려지면 다음 주기에 다시 반환)
+        return self.ledger.changed_rows(self.keyframe_sec)
+
+    def collect_rows(self) -> List[Tuple]:
         """
-        클러스터의 모든 노드를 조회하여 리소스 상태를 DB에 동기화
+        node_resource_status 에 UPSERT 할 row 목록 (DB 에는 쓰지 않음)
+        API 조회 실패 시 예외를 그대로 올림
         """
+        if self.ledger is not None:
+            return self._rows_from_ledger()
+
         # 1. 현재 클러스터의 모든 노드 목록 조회
-        try:
-            node_list = self.v1.list_node().items
-        except Exception as e:
-            print(f"노드 목록 조회 실패: {e}")
-            return
-        
-        synced_count = 0
+        node_list = self.v1.list_node().items
+        self.stats["api_calls"] += 1
+        allocated = self._get_all_nodes_allocated_resource() if self.single_list else None
+        if allocated is not None:
+            self.stats["api_calls"] += 1
+
+        now = datetime.now()
+        rows = []
 
         for node in node_list:
             node_name = node.metadata.name
 
-            labels = node.metadata.labels or {}
-            if "node-role.kubernetes.io/control-plane" in labels or "node-role.kubernetes.io/master" in labels:
+            if self._is_control_plane(node):
                 # print(f"[skip] 마스터 노드 제외: {node_name}") # 필요시 로그 해제
                 continue
 
@@ -97,36 +192,45 @@ class NodeResourceManager:
             mem_total = self._parse_mem(allocatable.get("memory", "0"))
             
             # 해당 노드에서 현재 사용(예약) 중인 리소스 계산
-            cpu_used, mem_used = self._get_node_allocated_resource(node_name)
+            if allocated is not None:
+                cpu_used, mem_used = allocated.get(node_name, (0, 0))
+            else:
+                try:
+                    self.stats["api_calls"] += 1
+                    cpu_used, mem_used = self._get_node_allocated_resource(node_name)
+                except Exception as e:
+                    print(f"노드 파드 조회 실패 ({node_name}): {e}")
+                    continue
             
             # 순수 가용량 계산
             cpu_free = max(0, cpu_total - cpu_used)
             mem_free = max(0, mem_total - mem_used)
-            
-            # 2. DB 업데이트 (UPSERT: 있으면 업데이트, 없으면 삽입)
-            query = """
-            INSERT INTO node_resource_status (
-                node_name, cpu_allocatable_m, cpu_request_total_m, cpu_free_m,
-                mem_allocatable_bytes, mem_request_total_bytes, mem_free_bytes, last_updated
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(node_name) DO UPDATE SET
-                cpu_allocatable_m=excluded.cpu_allocatable_m,
-                cpu_request_total_m=excluded.cpu_request_total_m,
-                cpu_free_m=excluded.cpu_free_m,
-                mem_allocatable_bytes=excluded.mem_allocatable_bytes,
-                mem_request_total_bytes=excluded.mem_request_total_bytes,
-                mem_free_bytes=excluded.mem_free_bytes,
-                last_updated=excluded.last_updated
-            """
-            try:
-                self.conn.execute(query, (
-                    node_name, cpu_total, cpu_used, cpu_free,
-                    mem_total, mem_used, mem_free, datetime.now()
-                ))
-                self.conn.commit()
-            except Exception as e:
-                print(f"DB 업데이트 실패: {e}")
-                self.conn.rollback()
-                continue
-        
-        print(f"[{datetime.now()}] 총 {synced_count}개 워커 노드의 상태 동기화 완료.")
\ No newline at end of file
+
+            rows.append((
+                node_name, cpu_total, cpu_used, cpu_free,
+                mem_total, mem_used, mem_free, now
+            ))
+
+        return rows
+
+    def sync_cluster_nodes_to_db(self):
+        """
+        클러스터의 모든 노드를 조회하여 리소스 상태를 DB에 동기화
+        (모든 노드의 UPSERT 는 한 트랜잭션)
+        """
+        try:
+            rows = self.collect_rows()
+        except Exception as e:
+            print(f"노드 목록 조회 실패: {e}")
+            return
+
+        # 2. DB 업데이트 (UPSERT: 있으면 업데이트, 없으면 삽입)
+        try:
+            with self.conn:
+                self.conn.executemany(UPSERT_NODE_SQL, rows)
+        except Exception as e:
+            print(f"DB 업데이트 실패: {e}")
+            return
+
+        synced_count = len(rows)
+        print(f"[{datetime.now()}] 총 {synced_count}개 워커 노드의 상태 동기화 완료.")
@@ -1,4 +1,12 @@
-from kubernetes import client, config
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from kubernetes import client, config, watch
+from kubernetes.client.rest import ApiException
+
+logger = logging.getLogger(__name__)
 
 
 class K8sPodCollector:
@@ -51,4 +59,211 @@ class K8sPodCollector:
                     "pod_count": count
                 })
 
-        return pod_data
\ No newline at end of file
+        return pod_data
+
+
+class K8sPodInformer(threading.Thread):
+    """
+    list + watch 기반 pod 캐시 (informer 방식)
+
+    - 최초 1회 list_namespace / list_pod_for_all_namespaces 로 전체 상태를 적재
+    - 이후 resourceVersion 부터 watch 하며 ADDED/MODIFIED/DELETED 를 인덱스에 반영
+    - watch 가 만료(410)되면 다시 list 해서 인덱스를 재구성
+    - namespace 목록은 namespace_refresh_sec 마다 list_namespace 로 다시 읽음
+      (pod 없는 새 namespace 도 0 으로 나오고, 지워진 namespace 는 빠짐)
+    - (namespace, phase) 별 pod 수를 인덱스로 유지하므로 count() 는 O(1), API 호출 없음
+    - 노드에 배치된 (node_name 이 있고 Succeeded/Failed 가 아닌) pod 수도 namespace 별로 유지 (active_container)
+    """
+
+    TERMINAL_PHASES = ("Succeeded", "Failed")
+
+    EXCLUDE_NAMESPACES = {"default", "kube-system", "istio-system", "knative-serving", "observability", "kube-public", "kube-node-lease"}
+
+    def __init__(self, stop_event: Optional[threading.Event] = None, watch_timeout_sec: int = 30, v1=None,
+                 namespace_refresh_sec: float = 30):
+        super().__init__(name="pod-informer", daemon=True)
+        # v1 을 주면 (capture 재생 등) kube-config 없이 그 API 객체를 사용
+        if v1 is None:
+            try:
+                config.load_kube_config()
+            except Exception:
+                config.load_incluster_config()
+            v1 = client.CoreV1Api()
+
+        self.v1 = v1
+        self.stop_event = stop_event or threading.Event()
+        self.watch_timeout_sec = watch_timeout_sec
+        self.namespace_refresh_sec = namespace_refresh_sec
+        self._last_ns_refresh = 0.0
+
+        self._lock = threading.Lock()
+        self._pods: Dict[str, Tuple[str, str, bool]] = {}  # {uid: (namespace, phase, 노드 배치 여부)}
+        self._counts: Dict[Tuple[str, str], int] = {}      # {(namespace, phase): count}
+        self._bound: Dict[str, int] = {}                   # {namespace: 노드에 배치된 pod 수}
+        self._namespaces: Set[str] = set()
+        self._rv: Optional[str] = None
+
+        self.stats = {"list_calls": 0, "watch_calls": 0, "relists": 0, "events": 0, "namespace_refreshes": 0}
+
+        # pod 이벤트를 같이 받는 listener (reset(pods) / apply_event(etype, pod))
+        self._listeners: List = []
+
+        # 최초 list 가 끝났는지 (main 에서 wait 용)
+        self.synced = threading.Event()
+
+    # ----------------------------
+    # 인덱스 갱신
+    # ----------------------------
+    def _index_add(self, uid: str, pod) -> None:
+        namespace = pod.metadata.namespace
+        phase = (pod.status.phase or "") if pod.status else ""
+        bound = bool(pod.spec and pod.spec.node_name) and phase not in self.TERMINAL_PHASES
+        self._pods[uid] = (namespace, phase, bound)
+        key = (namespace, phase)
+        self._counts[key] = self._counts.get(key, 0) + 1
+        if bound:
+            self._bound[namespace] = self._bound.get(namespace, 0) + 1
+        self._namespaces.add(namespace)
+
+    def _index_remove(self, uid: str) -> None:
+        prev = self._pods.pop(uid, None)
+        if prev is None:
+            return
+        namespace, phase, bound = prev
+        key = (namespace, phase)
+        self._counts[key] -= 1
+        if self._counts[key] <= 0:
+            del self._counts[key]
+        if bound:
+            self._bound[namespace] -= 1
+            if self._bound[namespace] <= 0:
+                del self._bound[namespace]
+
+    def _relist(self) -> None:
+        """전체 list 로 인덱스를 재구성하고 watch 시작 resourceVersion 을 갱신"""
+        namespaces = [ns.metadata.name for ns in self.v1.list_namespace().items]
+        pod_list = self.v1.list_pod_for_all_namespaces()
+        self.stats["list_calls"] += 2
+        self.stats["relists"] += 1
+
+        with self._lock:
+            self._pods.clear()
+            self._counts.clear()
+            self._bound.clear()
+            self._namespaces = set(namespaces)
+            for pod in pod_list.items:
+                self._index_add(pod.metadata.uid, pod)
+            self._rv = pod_list.metadata.resource_version
+        self._last_ns_refresh = time.monotonic()
+
+        for listener in self._listeners:
+            listener.reset(pod_list.items)
+
+        self.synced.set()
+
+    def _refresh_namespaces(self) -> None:
+        """namespace 목록만 다시 읽음 (pod 가 남아 있는 namespace 는 지워지는 중이어도 유지)"""
+        # 실패해도 watch 는 계속하고 다음 주기에 다시 시도
+        self._last_ns_refresh = time.monotonic()
+        try:
+            namespaces = {ns.metadata.name for ns in self.v1.list_namespace().items}
+        except Exception as e:
+            logger.warning(f"namespace 목록 갱신 실패: {e}")
+            return
+        self.stats["list_calls"] += 1
+        self.stats["namespace_refreshes"] += 1
+        with self._lock:
+            self._namespaces = namespaces | {namespace for namespace, _ in self._counts}
+
+    def add_listener(self, listener) -> None:
+        """start() 전에 등록"""
+        self._listeners.append(listener)
+
+    def apply_event(self, etype: str, pod) -> None:
+        uid = pod.metadata.uid
+        with self._lock:
+            self._index_remove(uid)
+            if etype != "DELETED":
+                self._index_add(uid, pod)
+
+        for listener in self._listeners:
+            listener.apply_event(etype, pod)
+
+    # ----------------------------
+    # 조회 API (API 호출 없음)
+    # ----------------------------
+    def count(self, namespace: str, phase: str = "Running") -> int:
+        with self._lock:
+            return self._counts.get((namespace, phase), 0)
+
+    def get_service_info(self):
+        """K8sPodCollector.get_service_info 와 동일한 형태로 캐시에서 반환"""
+        with self._lock:
+            namespaces = sorted(ns for ns in self._namespaces if ns not in self.EXCLUDE_NAMESPACES)
+            return [
+                {
+                    "service": namespace,
+                    "revision": namespace,
+                    "pod_count": self._counts.get((namespace, "Running"), 0),
+                    "active_count": self._bound.get(namespace, 0),
+                }
+                for namespace in namespaces
+            ]
+
+    # ----------------------------
+    # watch 루프
+    # ----------------------------
+    def _watch_events(self, w: watch.Watch):
+        """resourceVersion 이후 pod 이벤트 스트림 (watch_timeout_sec 마다 끝남)"""
+        return w.stream(
+            self.v1.list_pod_for_all_namespaces,
+            resource_version=self._rv,
+            allow_watch_bookmarks=True,
+            timeout_seconds=self.watch_timeout_sec,
+        )
+
+    def run(self) -> None:
+        w = watch.Watch()
+
+        while not self.stop_event.is_set():
+            try:
+                if self._rv is None:
+                    self._relist()
+                elif time.monotonic() - self._last_ns_refresh >= self.namespace_refresh_sec:
+                    self._refresh_namespaces()
+
+                self.stats["watch_calls"] += 1
+                for evt in self._watch_events(w):
+                    if self.stop_event.is_set():
+                        break
+
+                    etype = evt.get("type", "")
+                    if etype == "ERROR":
+                        # 410 Gone 이 ERROR 이벤트로 오는 경우
+                        self._rv = None
+                        break
+
+                    pod = evt.get("object")
+                    if pod is None or pod.metadata is None:
+                        continue
+                    if etype != "BOOKMARK":
+                        self.stats["events"] += 1
+                        self.apply_event(etype, pod)
+                    if pod.metadata.resource_version:
+                        self._rv = pod.metadata.resource_version
+
+            except ApiException as e:
+                if self.stop_event.is_set():
+                    break
+                if e.status == 410:
+                    logger.warning("pod watch 만료(410), 재list 합니다")
+                    self._rv = None
+                    continue
+                logger.warning(f"pod watch api 오류: {e} (2초 후 재시도)")
+                time.sleep(2)
+
+            except Exception as e:
+                if self.stop_event.is_set():
+                    break
+                logger.warning(f"pod watch 오류: {e} (2초 후 재시도)")
+                time.sleep(2)
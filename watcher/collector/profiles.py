@@ -1,45 +1,96 @@
 import sqlite3
 import time
+from typing import Dict, List, Tuple
+
+
+def ensure_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> None:
+    """테이블에 컬럼이 없으면 추가 (profiler 와 동시에 실행돼도 안전하게)"""
+    cols = {row[1] for row in conn.execute(f"PRAGMA table_info({table});")}
+    if not cols or column in cols:
+        return
+    try:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl};")
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        if "duplicate column" not in str(e):
+            raise
 
 
 class ProfileCollector:
+    """
+    service_profile 이 바뀐 서비스만 profile_hst 에 추가 (delta 기록)
+
+    profiler 는 20초마다 갱신하므로 매초 전체를 복사하면 같은 row 가 ~20번 반복됨
+    비교는 값 컬럼만 (profile_run_id 제외), 기록 row 에는 값을 만든 profiler 실행 id 를 같이 남김
+    읽는 쪽은 시각화 series.profile_series() 처럼 직전 값을 이어 붙여 사용
+    """
+
+    COLUMNS = (
+        "t_warm",
+        "t_cold",
+        "t_execute",
+        "weight",
+        "qos",
+        "max_container",
+        "min_container",
+        "active_container",
+        "request_cnt",
+    )
+
+    INSERT_SQL = f"""
+        INSERT INTO profile_hst (
+            service,
+            creation_time,
+            {", ".join(COLUMNS)},
+            profile_run_id
+        )
+        VALUES ({", ".join("?" for _ in range(len(COLUMNS) + 3))})
+    """
+
     def __init__(self, conn: sqlite3.Connection):
         self.conn = conn
         self.cur = conn.cursor()
+        self._last: Dict[str, Tuple] = {}   # {service: 마지막으로 기록한 값}
+        self.stats = {"changed": 0, "unchanged": 0}
+        self.ensure_schema()
+
+    def ensure_schema(self) -> None:
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS profile_hst (
+              service           TEXT    NOT NULL,
+              creation_time     INTEGER NOT NULL,
+              {", ".join(f"{c} REAL" for c in self.COLUMNS)},
+              profile_run_id    INTEGER
+            );
+        """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_profile_hst_srv_time ON profile_hst(service, creation_time);"
+        )
+        self.conn.commit()
+        ensure_column(self.conn, "profile_hst", "profile_run_id", "INTEGER")
+        ensure_column(self.conn, "service_profile", "profile_run_id", "INTEGER")
+
+    def rows(self) -> List[Tuple]:
+        """값이 바뀐 서비스의 INSERT_SQL 파라미터 row"""
+        creation_time = time.time_ns() // 1_000
+        self.cur.execute(f"SELECT service, {', '.join(self.COLUMNS)}, profile_run_id FROM service_profile;")
+
+        out: List[Tuple] = []
+        for row in self.cur.fetchall():
+            service, values, run_id = row[0], tuple(row[1:-1]), row[-1]
+            if self._last.get(service) == values:
+                self.stats["unchanged"] += 1
+                continue
+            self._last[service] = values
+            out.append((service, creation_time, *values, run_id))
+
+        self.stats["changed"] += len(out)
+        return out
 
     def save_profile(self):
-        now_us = time.time_ns() // 1_000  #
         try:
-            self.cur.execute("""
-                INSERT INTO profile_hst (
-                    service,
-                    creation_time,
-                    t_warm,
-                    t_cold,
-                    t_execute,
-                    weight,
-                    qos,
-                    max_container,
-                    min_container,
-                    active_container,
-                    request_cnt
-                )
-                SELECT
-                    service,
-                    ?,
-                    t_warm,
-                    t_cold,
-                    t_execute,
-                    weight,
-                    qos,
-                    max_container,
-                    min_container,
-                    active_container,
-                    request_cnt
-                FROM service_profile
-            """, (now_us,))
-
+            self.cur.executemany(self.INSERT_SQL, self.rows())
             self.conn.commit()
         except sqlite3.Error as e:
             print(f"DB 업데이트 실패: {e}")
-            self.conn.rollback()
\ No newline at end of file
+            self.conn.rollback()
@@ -1,38 +1,125 @@
+import math
+import time
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
 
 # 로그 출력 설정
 logger = logging.getLogger(__name__)
 
+
 class PrometheusCollector:
-    def __init__(self, prometheus_url):
+    # 클러스터 전체 상태용 PromQL: name → (query, 서비스 레이블)
+    CLUSTER_QUERIES: Dict[str, Tuple[str, str]] = {
+        "pod_count": (
+            'sum by (kn_service_name) (kn_revision_pods_count)',
+            "kn_service_name",
+        ),
+        "request_rate": (
+            'sum by (service_name) (rate(activator_request_count[1m]))',
+            "service_name",
+        ),
+        "queue_depth": (
+            'sum by (service_name) (activator_request_concurrency)',
+            "service_name",
+        ),
+    }
+
+    def __init__(self, prometheus_url, timeout_sec: float = 20, pool_size: int = 8, max_workers: int = 4):
         # URL 끝에 /가 있으면 제거하여 일관성 유지
         self.prometheus_url = prometheus_url.rstrip('/')
         self.services = []
+        self.timeout_sec = timeout_sec
+
+        # keep-alive 커넥션 풀 (호출마다 TCP 연결을 새로 맺지 않음)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # query_batch 동시 실행용
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="promql")
+
+        self.stats = {"api_calls": 0, "errors": 0}
+
+    # ----------------------------
+    # internal http helper
+    # ----------------------------
+    def _request(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Prometheus HTTP API 호출, 성공 시 data 부분 반환 (실패 시 예외)"""
+        self.stats["api_calls"] += 1
+        response = self.session.get(f"{self.prometheus_url}{path}", params=params, timeout=self.timeout_sec)
+        result = response.json()
+        if result.get('status') != 'success':
+            self.stats["errors"] += 1
+            raise RuntimeError(f"Prometheus 쿼리 실패: {result.get('error')}")
+        return result['data']
 
+    # ----------------------------
+    # instant / batch / range 쿼리
+    # ----------------------------
+    def query(self, expr: str, at: Optional[float] = None) -> List[Dict[str, Any]]:
+        params = {'query': expr}
+        if at is not None:
+            params['time'] = at
+        return self._request("/api/v1/query", params)['result']
+
+    def query_batch(self, exprs: Dict[str, str], at: Optional[float] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        여러 PromQL 을 동시에 평가 (같은 평가 시각 기준)
+        실패한 쿼리는 빈 리스트로 반환
+        """
+        at = time.time() if at is None else at
+        futures = {name: self._executor.submit(self.query, expr, at) for name, expr in exprs.items()}
+
+        out: Dict[str, List[Dict[str, Any]]] = {}
+        for name, fut in futures.items():
+            try:
+                out[name] = fut.result()
+            except Exception as e:
+                logger.error(f"PromQL '{name}' 실패: {e}")
+                out[name] = []
+        return out
+
+    @staticmethod
+    def align_range(start: float, end: float, step: float) -> Tuple[float, float]:
+        """start/end 를 step 배수에 맞춤 (Prometheus 결과 캐시 재사용 및 샘플 시각 고정)"""
+        return math.floor(start / step) * step, math.ceil(end / step) * step
+
+    def query_range(self, expr: str, start: float, end: float, step: float) -> List[Dict[str, Any]]:
+        """
+        range 쿼리 (epoch 초), step 에 맞춰 정렬된 구간으로 조회
+
+        Returns:
+            [{metric: {...}, values: [[ts, value], ...]}, ...]
+        """
+        start, end = self.align_range(start, end, step)
+        params = {'query': expr, 'start': start, 'end': end, 'step': step}
+        return self._request("/api/v1/query_range", params)['result']
+
+    # ----------------------------
+    # 수집 API
+    # ----------------------------
     def get_service_info(self):
         """
         특정 서비스의 현재 실행 중인(Running) Pod 개수를 쿼리합니다.
         """
         # Collecting Metric
         query = 'kn_revision_pods_count'
-        endpoint = f"{self.prometheus_url}/api/v1/query"
-        
+
         try:
-            response = requests.get(endpoint, params={'query': query}, timeout=20)
-            result = response.json()
-            if result['status'] != 'success':
-                logger.error(f"Prometheus 쿼리 실패: {result.get('error')}")
-                return []
             pod_data = []
-            for item in result['data']['result']:
+            for item in self.query(query):
                 metric_labels = item['metric']
                 value = item['value'][1]  # [timestamp, value] 형태 중 value 추출
 
                 # 필요한 레이블 추출 (Key 에러 방지를 위해 .get() 사용)
                 service_name = metric_labels.get('kn_service_name', 'N/A')
                 revision_name = metric_labels.get('kn_revision_name', 'N/A')
-                
+
                 pod_data.append({
                     'service': service_name,
                     'revision': revision_name,
@@ -43,4 +130,32 @@ class PrometheusCollector:
 
         except Exception as e:
             logger.error(f"데이터 수집 중 오류 발생: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def get_cluster_status(self) -> List[Dict[str, Any]]:
+        """
+        서비스별 pod 수 / activator 요청률 / 대기 요청 수를 한 주기에 동시 조회
+        (namespace 별 Kubernetes list 없이 클러스터 전체를 쿼리 3번으로)
+
+        Returns:
+            [{service, pod_count, request_rate, queue_depth}, ...]
+        """
+        results = self.query_batch({name: q for name, (q, _) in self.CLUSTER_QUERIES.items()})
+
+        status: Dict[str, Dict[str, Any]] = {}
+        for name, (_, label) in self.CLUSTER_QUERIES.items():
+            for item in results[name]:
+                service_name = item['metric'].get(label)
+                if not service_name:
+                    continue
+                row = status.setdefault(service_name, {
+                    'service': service_name,
+                    'pod_count': 0,
+                    'request_rate': 0.0,
+                    'queue_depth': 0.0,
+                })
+                row[name] = float(item['value'][1])
+
+        for row in status.values():
+            row['pod_count'] = int(row['pod_count'])
+        return sorted(status.values(), key=lambda r: r['service'])
@@ -0,0 +1,279 @@
+import base64
+import json
+import logging
+import struct
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from collector.jaeger import ACTIVATOR_PROXY_SPANS, ACTIVATOR_QUEUE_SPANS, JaegerCollector, RequestInfo
+
+logger = logging.getLogger(__name__)
+
+try:
+    # OTLP/protobuf 는 opentelemetry-proto 가 설치된 경우에만 지원 (없으면 JSON 만)
+    from google.protobuf.json_format import MessageToDict
+    from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+except ImportError:
+    ExportTraceServiceRequest = None
+
+# 요청 하나의 최대 body 크기 (gzip 이면 압축 해제 후 기준), 넘으면 413
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+# ----------------------------
+# trace id 정규화 (Jaeger query API 와 같은 표기)
+# ----------------------------
+def normalize_trace_id(hex_id: str) -> str:
+    hex_id = hex_id.lower()
+    if len(hex_id) == 32 and hex_id.startswith("0" * 16):
+        return hex_id[16:]
+    return hex_id
+
+
+def _b64_to_hex(value: str) -> str:
+    return base64.b64decode(value).hex() if value else ""
+
+
+def _gunzip(body: bytes, max_bytes: int) -> bytes:
+    """gzip 해제 (결과가 max_bytes 를 넘으면 ValueError, 잘못된 gzip 은 zlib.error)"""
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    out = d.decompress(body, max_bytes + 1)
+    if len(out) > max_bytes:
+        raise ValueError(f"압축 해제 크기가 {max_bytes} bytes 초과")
+    if not d.eof:
+        raise zlib.error("gzip 스트림이 끝나지 않음")
+    return out
+
+
+# ----------------------------
+# OTLP (JSON 매핑) → Jaeger span 형태
+# ----------------------------
+def _otlp_attr_value(value: Dict[str, Any]) -> Any:
+    for key in ("stringValue", "intValue", "doubleValue", "boolValue"):
+        if key in value:
+            return value[key]
+    return None
+
+
+def _scope_spans(rs: Dict[str, Any]):
+    # 예전 exporter 는 scopeSpans 대신 instrumentationLibrarySpans
+    return rs.get("scopeSpans", rs.get("instrumentationLibrarySpans", ()))
+
+
+def iter_otlp_spans(payload: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """ExportTraceServiceRequest(JSON) 에서 (trace_id, jaeger 형태 span) 반환"""
+    for rs in payload.get("resourceSpans", ()):
+        for ss in _scope_spans(rs):
+            for sp in ss.get("spans", ()):
+                start_ns = int(sp.get("startTimeUnixNano", 0))
+                end_ns = int(sp.get("endTimeUnixNano", 0))
+                yield normalize_trace_id(sp.get("traceId", "")), {
+                    "operationName": sp.get("name"),
+                    "startTime": start_ns // 1_000,
+                    "duration": (end_ns - start_ns) // 1_000,
+                    "tags": [
+                        {"key": a.get("key"), "value": _otlp_attr_value(a.get("value", {}))}
+                        for a in sp.get("attributes", ())
+                    ],
+                }
+
+
+# ----------------------------
+# Jaeger Thrift (TBinaryProtocol) → Jaeger span 형태
+# ----------------------------
+class _ThriftReader:
+    """jaeger.thrift Batch 를 읽기 위한 최소한의 TBinaryProtocol 디코더 (struct 는 {field_id: value})"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def _unpack(self, fmt: str, size: int):
+        value = struct.unpack_from(fmt, self.data, self.pos)[0]
+        self.pos += size
+        return value
+
+    def _read_binary(self) -> bytes:
+        n = self._unpack("!i", 4)
+        value = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return value
+
+    def read_value(self, ttype: int) -> Any:
+        if ttype == 2:
+            return self._unpack("!?", 1)
+        if ttype == 3:
+            return self._unpack("!b", 1)
+        if ttype == 4:
+            return self._unpack("!d", 8)
+        if ttype == 6:
+            return self._unpack("!h", 2)
+        if ttype == 8:
+            return self._unpack("!i", 4)
+        if ttype == 10:
+            return self._unpack("!q", 8)
+        if ttype == 11:
+            return self._read_binary()
+        if ttype == 12:
+            return self.read_struct()
+        if ttype == 13:
+            ktype, vtype, n = self._unpack("!B", 1), self._unpack("!B", 1), self._unpack("!i", 4)
+            return {self.read_value(ktype): self.read_value(vtype) for _ in range(n)}
+        if ttype in (14, 15):
+            etype, n = self._unpack("!B", 1), self._unpack("!i", 4)
+            return [self.read_value(etype) for _ in range(n)]
+        raise ValueError(f"지원하지 않는 thrift type: {ttype}")
+
+    def read_struct(self) -> Dict[int, Any]:
+        fields: Dict[int, Any] = {}
+        while True:
+            ttype = self._unpack("!B", 1)
+            if ttype == 0:
+                return fields
+            fid = self._unpack("!h", 2)
+            fields[fid] = self.read_value(ttype)
+
+
+def _thrift_tag_value(tag: Dict[int, Any]) -> Any:
+    for fid in (3, 4, 5, 6, 7):
+        if fid in tag:
+            value = tag[fid]
+            return value.decode("utf-8", "replace") if isinstance(value, bytes) else value
+    return None
+
+
+def iter_thrift_spans(body: bytes) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """jaeger.thrift Batch 에서 (trace_id, jaeger 형태 span) 반환"""
+    batch = _ThriftReader(body).read_struct()
+    for sp in batch.get(2, ()):
+        low = sp.get(1, 0) & 0xFFFFFFFFFFFFFFFF
+        high = sp.get(2, 0) & 0xFFFFFFFFFFFFFFFF
+        trace_id = f"{low:016x}" if high == 0 else f"{high:016x}{low:016x}"
+        yield trace_id, {
+            "operationName": sp.get(5, b"").decode("utf-8", "replace"),
+            "startTime": sp.get(8),
+            "duration": sp.get(9),
+            "tags": [
+                {"key": tag.get(1, b"").decode("utf-8", "replace"), "value": _thrift_tag_value(tag)}
+                for tag in sp.get(10, ())
+            ],
+        }
+
+
+_KEEP_SPANS = ("handle",) + ACTIVATOR_QUEUE_SPANS + ACTIVATOR_PROXY_SPANS
+
+
+def extract_requests(spans: Iterator[Tuple[str, Dict[str, Any]]]) -> List[RequestInfo]:
+    """
+    handle / activator span 을 trace 별로 모아 JaegerCollector 와 같은 방식으로 RequestInfo 생성
+    (같은 batch 에 activator span 이 없으면 queue_wait_ms 는 None)
+    """
+    by_trace: Dict[str, List[Dict[str, Any]]] = {}
+    for trace_id, span in spans:
+        if span.get("operationName") in _KEEP_SPANS:
+            by_trace.setdefault(trace_id, []).append(span)
+
+    out: List[RequestInfo] = []
+    for trace_id, trace_spans in by_trace.items():
+        info = JaegerCollector.request_from_trace({"traceID": trace_id, "spans": trace_spans})
+        if info is not None:
+            out.append(info)
+    return out
+
+
+# ----------------------------
+# HTTP 수신 서버
+# ----------------------------
+class SpanReceiver(threading.Thread):
+    """
+    exporter 가 직접 push 하는 span 을 받는 HTTP 서버
+    - POST /v1/traces : OTLP/HTTP (application/json, protobuf 는 opentelemetry-proto 설치 시)
+    - POST /api/traces: Jaeger Thrift over HTTP (application/x-thrift)
+    handle span 을 RequestInfo 로 바꿔 sink(requests) 로 넘김 (수신 스레드에서 호출)
+    """
+
+    def __init__(self, sink: Callable[[List[RequestInfo]], None], host: str = "0.0.0.0", port: int = 4318,
+                 max_body_bytes: int = MAX_BODY_BYTES):
+        super().__init__(name="span-receiver", daemon=True)
+        self.sink = sink
+        self.max_body_bytes = max_body_bytes
+        self.stats = {"requests": 0, "spans_accepted": 0, "errors": 0, "too_large": 0}
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass
+
+            def _reply(self, code: int, body: bytes = b"{}", ctype: str = "application/json") -> None:
+                self.send_response(code)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                receiver.stats["requests"] += 1
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                except ValueError:
+                    length = -1
+                if length < 0 or length > receiver.max_body_bytes:
+                    # body 를 읽지 않으므로 연결은 닫음
+                    receiver.stats["too_large" if length > 0 else "errors"] += 1
+                    self.close_connection = True
+                    self._reply(413 if length > 0 else 400)
+                    return
+                body = self.rfile.read(length)
+                ctype = self.headers.get("Content-Type", "").split(";")[0].strip()
+
+                try:
+                    if self.headers.get("Content-Encoding", "") == "gzip":
+                        body = _gunzip(body, receiver.max_body_bytes)
+                    if self.path == "/v1/traces":
+                        if ctype == "application/x-protobuf":
+                            if ExportTraceServiceRequest is None:
+                                self._reply(415)
+                                return
+                            msg = ExportTraceServiceRequest()
+                            msg.ParseFromString(body)
+                            payload = MessageToDict(msg)
+                            # protobuf → JSON 변환 시 id 가 base64 로 나오므로 hex 로 바꿔줌
+                            for rs in payload.get("resourceSpans", ()):
+                                for ss in _scope_spans(rs):
+                                    for sp in ss.get("spans", ()):
+                                        sp["traceId"] = _b64_to_hex(sp.get("traceId", ""))
+                                        sp["spanId"] = _b64_to_hex(sp.get("spanId", ""))
+                        else:
+                            payload = json.loads(body)
+                        spans = iter_otlp_spans(payload)
+                    elif self.path == "/api/traces":
+                        spans = iter_thrift_spans(body)
+                    else:
+                        self._reply(404)
+                        return
+
+                    requests_ = extract_requests(spans)
+                except Exception as e:
+                    receiver.stats["errors"] += 1
+                    logger.warning(f"span 수신 처리 실패 ({self.path}): {e}")
+                    self._reply(400)
+                    return
+
+                if requests_:
+                    receiver.stats["spans_accepted"] += len(requests_)
+                    receiver.sink(requests_)
+                if self.path == "/api/traces":
+                    self._reply(202, b"", "text/plain")
+                else:
+                    self._reply(200)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+
+    def run(self) -> None:
+        logger.info(f"span receiver 시작: {self.server.server_address}")
+        self.server.serve_forever()
+
+    def stop(self) -> None:
+        self.server.shutdown()
@@ -1,49 +1,83 @@
+import argparse
+import asyncio
+import functools
+import os
+import sys
 import time
 import logging
 import sqlite3
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+
+# 저장소 루트의 cfg / trace_store 공용 모듈
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cfg
+from trace_store import TracePartitionStore
+from latency_sketch import LatencySketchStore
 
 from collector.prometheus import PrometheusCollector
 from collector.jaeger import JaegerCollector
-from collector.node import NodeResourceManager
-from collector.pods import K8sPodCollector
+from collector.node import NodeResourceManager, UPSERT_NODE_SQL
+from collector.ledger import NodeCapacityLedger
+from collector.pods import K8sPodInformer
 from collector.profiles import ProfileCollector
+from collector.receiver import SpanReceiver
+from writer import BatchWriter, ChangeOnlyFilter, DBWriterThread, enable_wal
+from scheduler import CollectorScheduler, CollectorTask
+from metrics import MetricsRegistry, MetricsServer
+from retention import RAW_TTL_SEC, TIER_TTL_SEC, RetentionEngine
+from capture import CaptureLog, ReplayLog
 
 # ----------------------------
 # DB 생성
 # ----------------------------
-conn = sqlite3.connect("/home/ubuntu/fairness_control/trace_store.db")
-cur = conn.cursor()
-
-cur.executescript("""
-CREATE TABLE IF NOT EXISTS pod_snapshots (
-  creation_time_us INTEGER NOT NULL,
-  service          TEXT    NOT NULL,
-  revision         TEXT    NOT NULL,
-  pod_count        INTEGER NOT NULL,
-  PRIMARY KEY (creation_time_us, service, revision)
-);
-
-CREATE TABLE IF NOT EXISTS traces (
-  trace_id          TEXT    PRIMARY KEY,
-  creation_time_us  INTEGER NOT NULL,
-  service           TEXT    NOT NULL,
-  revision          TEXT    NOT NULL,
-  start_time_us     INTEGER,
-  duration_ms       REAL
-);
-
-CREATE INDEX IF NOT EXISTS idx_pods_time
-  ON pod_snapshots(creation_time_us);
-CREATE INDEX IF NOT EXISTS idx_pods_srv_rev_time
-  ON pod_snapshots(service, revision, creation_time_us);
-
-CREATE INDEX IF NOT EXISTS idx_traces_time
-  ON traces(creation_time_us);
-CREATE INDEX IF NOT EXISTS idx_traces_srv_rev_time
-  ON traces(service, revision, creation_time_us);
-""")
-conn.commit()
+DB_PATH = cfg.DB_PATH
+
+
+def init_db(db_path: str) -> sqlite3.Connection:
+    """watcher 기록용 연결 + 테이블 생성 (시작 이후에는 DBWriterThread 만 이 연결을 사용)"""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    enable_wal(conn)
+    cur = conn.cursor()
+
+    cur.executescript("""
+    CREATE TABLE IF NOT EXISTS pod_snapshots (
+      creation_time_us INTEGER NOT NULL,
+      service          TEXT    NOT NULL,
+      revision         TEXT    NOT NULL,
+      pod_count        INTEGER NOT NULL,
+      PRIMARY KEY (creation_time_us, service, revision)
+    );
+
+    CREATE TABLE IF NOT EXISTS traces (
+      trace_id          TEXT    PRIMARY KEY,
+      creation_time_us  INTEGER NOT NULL,
+      service           TEXT    NOT NULL,
+      revision          TEXT    NOT NULL,
+      start_time_us     INTEGER,
+      duration_ms       REAL,
+      queue_wait_ms     REAL,
+      cold              INTEGER
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_pods_time
+      ON pod_snapshots(creation_time_us);
+    CREATE INDEX IF NOT EXISTS idx_pods_srv_rev_time
+      ON pod_snapshots(service, revision, creation_time_us);
+
+    CREATE INDEX IF NOT EXISTS idx_traces_time
+      ON traces(creation_time_us);
+    CREATE INDEX IF NOT EXISTS idx_traces_srv_rev_time
+      ON traces(service, revision, creation_time_us);
+    """)
+    conn.commit()
+
+    # 예전 스키마 traces 에 activator 대기 / cold 컬럼 추가
+    trace_cols = {row[1] for row in cur.execute("PRAGMA table_info(traces);")}
+    for col, decl in (("queue_wait_ms", "REAL"), ("cold", "INTEGER")):
+        if col not in trace_cols:
+            cur.execute(f"ALTER TABLE traces ADD COLUMN {col} {decl};")
+    conn.commit()
+    return conn
 
 
 # ----------------------------
@@ -58,115 +92,426 @@ logging.basicConfig(
 def now_us() -> int:
     return time.time_ns() // 1_000 
 
+
+# ----------------------------
+# 수집기별 실행 주기 / 타임아웃 (초)
+# ----------------------------
+COLLECTOR_SCHEDULE: Dict[str, Tuple[float, float]] = {
+    "pods":       (1, 5),
+    "jaeger":     (1, 15),
+    "nodes":      (1, 10),
+    "profiles":   (1, 5),
+    "prometheus": (10, 20),
+    "retention":  (30, 300),
+}
+
+# 수집 주기 하한 (재생 배속이 0 이어도 수집기가 busy loop 가 되지 않게)
+MIN_COLLECTOR_INTERVAL_SEC = 0.05
+
+# DB writer 스레드: queue 최대 항목 수 / flush 주기 / 즉시 flush 할 row 수 / queue 가득 찼을 때 대기 시간
+WRITER_QUEUE_MAXSIZE = 1000
+WRITER_FLUSH_INTERVAL_SEC = 1.0
+WRITER_FLUSH_ROWS = 5000
+WRITER_PUT_TIMEOUT_SEC = 1.0
+
+# pod_snapshots: pod 수가 바뀔 때만 기록 (+ keyframe 주기마다 1번), False 면 매초 전체 기록
+POD_SNAPSHOT_CHANGE_ONLY = True
+POD_SNAPSHOT_KEYFRAME_SEC = 60
+
+# service_profile.active_container 갱신 (informer 의 노드 배치 pod 수, 값이 같으면 row 를 건드리지 않음)
+# profiler minmax 의 pending min pod 자리 확보가 이 값을 씀
+ACTIVE_CONTAINER_SQL = """
+    UPDATE service_profile
+    SET active_container = ?
+    WHERE service = ? AND active_container IS NOT ?;
+"""
+
+# 보관 정책: raw row 는 roll-up(10s / 1m) 후 RAW_TTL_SEC 이 지나면 삭제 (traces 파티션은 파일 삭제)
+# 기본은 꺼 둠: visualization/ 의 분석 스크립트 (jfi, pods_and_qos*, latency, series) 는 raw 테이블
+# (pod_snapshots / profile_hst / traces) 만 읽으므로, 켜면 TTL 이 지난 실험 구간의 그래프가 비게 됨
+# 켤 때는 분석할 실험 기간보다 긴 TTL 로
+RETENTION_ENABLED = False
+RETENTION_RAW_TTL_SEC = RAW_TTL_SEC
+RETENTION_TIER_TTL_SEC = dict(TIER_TTL_SEC)
+
+# 서비스별 실행 시간 분포 sketch (latency_sketch 테이블, profiler 의 p50/p95/p99 용)
+LATENCY_SKETCH_ENABLED = True
+LATENCY_SKETCH_TTL_SEC = 86400
+# 시작할 때 이 구간의 traces trace_id 로 sketch 중복 필터를 채움 (Jaeger 첫 조회 lookback 60초보다 길게)
+LATENCY_SKETCH_SEED_SEC = 120
+
+# exporter 가 span 을 직접 push 하는 수신기 (port-forward 없이 ms 단위로 traces 적재)
+SPAN_RECEIVER_ENABLED = False
+SPAN_RECEIVER_HOST = "0.0.0.0"
+SPAN_RECEIVER_PORT = 4318
+
+# watcher 자체 지표 (/metrics)
+METRICS_ENABLED = True
+METRICS_HOST = "0.0.0.0"
+METRICS_PORT = 9108
+
+
+def trace_rows(requests_) -> List[Tuple]:
+    """RequestInfo 목록 → traces row"""
+    creation_time_us = now_us()              # 수집 시점
+    return [
+        (r.trace_id, creation_time_us, r.service, r.revision, r.start_us, r.duration_ms, r.queue_wait_ms, r.cold)
+        for r in requests_
+    ]
+
+
+def print_pod_status(pods_results: List[Dict]) -> None:
+    print("\n=== Knative Service Status ===")
+    if not pods_results:
+        print("No services found.")
+        return
+    print(f"{'SERVICE':<20} | {'REVISION':<30} | {'POD COUNT':<10}")
+    print("-" * 70)
+    for m in pods_results:
+        print(
+            f"{m['service']:<20} | "
+            f"{m['revision']:<30} | "
+            f"{m['pod_count']:<10}"
+        )
+
+
+def build_scheduler(
+    db_writer: DBWriterThread,
+    prom: PrometheusCollector,
+    jaeger: JaegerCollector,
+    pods: K8sPodInformer,
+    manager: NodeResourceManager,
+    profiles: ProfileCollector,
+    retention: Optional[RetentionEngine] = None,
+    pod_filter: Optional[ChangeOnlyFilter] = None,
+    interval_scale: float = 1.0,
+    submit_traces=None,
+) -> CollectorScheduler:
+    """
+    interval_scale: 수집 주기 배율 (capture 재생 배속이면 1 / speed)
+    submit_traces: traces row 를 writer 로 넘기는 함수 (없으면 traces 테이블로만)
+
+    sink 는 이벤트 루프 스레드에서 실행되므로 writer queue 가 가득 차도 기다리지 않음 (block=False, 버린 row 는 stats)
+    """
+    scheduler = CollectorScheduler()
+    if submit_traces is None:
+        submit_traces = lambda rows, block=True: db_writer.submit("traces", rows, block=block)
+    submit = functools.partial(db_writer.submit, block=False)
+
+    def task(name, fn, sink=None) -> None:
+        interval_sec, timeout_sec = COLLECTOR_SCHEDULE[name]
+        scheduler.add(CollectorTask(name, fn, max(interval_sec * interval_scale, MIN_COLLECTOR_INTERVAL_SEC),
+                                    timeout_sec, sink=sink))
+
+    # 1) pod 스냅샷 (informer 캐시)
+    def pods_sink(pods_results: List[Dict]) -> None:
+        print_pod_status(pods_results)
+        creation_time_us = now_us()
+        rows = [
+            (creation_time_us, m["service"], m["revision"], int(m["pod_count"]))
+            for m in pods_results
+        ]
+        if pod_filter is not None:
+            rows = pod_filter.filter(rows)
+        submit("pod_snapshots", rows)
+        submit("service_active", [
+            (int(m["active_count"]), m["service"], int(m["active_count"])) for m in pods_results
+        ])
+
+    # 2) Jaeger 요청 단위 정보 (마지막 수집 이후 새 요청만)
+    def jaeger_fetch():
+        return jaeger.get_new_requests(service="activator", lookback_sec=60, limit=500)
+
+    def jaeger_sink(jaeger_results) -> None:
+        # writer 가 받은 경우에만 hwm 전진 (버려지면 다음 조회에서 같은 trace 를 다시 가져옴)
+        if submit_traces(trace_rows(jaeger_results), block=False):
+            jaeger.mark_delivered("activator", jaeger_results)
+
+    # 3) 노드 정보 / 4) 프로필 이력 → writer 로 합류
+
+    # 5) Prometheus (서비스별 pod 수 / 요청률 / 대기 요청 수, 참고용)
+    def prom_sink(prom_results: List[Dict]) -> None:
+        for r in prom_results:
+            logging.debug(
+                f"[prometheus] {r['service']}: pods={r['pod_count']}, "
+                f"rps={r['request_rate']:.2f}, queue={r['queue_depth']:.0f}"
+            )
+
+    task("pods", pods.get_service_info, pods_sink)
+    task("jaeger", jaeger_fetch, jaeger_sink)
+    task("nodes", manager.collect_rows, lambda rows: submit("node_resource_status", rows))
+    task("profiles", profiles.rows, lambda rows: submit("profile_hst", rows))
+    task("prometheus", prom.get_cluster_status, prom_sink)
+
+    # 6) 보관 정책 (전용 연결로 수집기 스레드에서 실행, batch 마다 commit 해서 writer 를 오래 막지 않음)
+    def retention_sink(result) -> None:
+        deleted = {t: n for t, n in result["deleted"].items() if n}
+        if deleted or result["dropped_partitions"] or result["vacuumed_pages"]:
+            logging.info(
+                f"[retention] deleted={deleted}, dropped_partitions={result['dropped_partitions']}, "
+                f"vacuumed_pages={result['vacuumed_pages']}"
+            )
+
+    if retention is not None:
+        task("retention", retention.run_once, retention_sink)
+    return scheduler
+
+
+def build_metrics(
+    registry: MetricsRegistry,
+    scheduler: CollectorScheduler,
+    db_writer: DBWriterThread,
+    prom: PrometheusCollector,
+    jaeger: JaegerCollector,
+    pods: K8sPodInformer,
+    manager: NodeResourceManager,
+    profiles: ProfileCollector,
+    receiver=None,
+    retention: Optional[RetentionEngine] = None,
+    pod_filter: Optional[ChangeOnlyFilter] = None,
+) -> None:
+    """수집 주기별 시간이 어디에 쓰이는지 보기 위한 watcher 자체 지표 연결"""
+    collector_latency = registry.histogram(
+        "watcher_collector_duration_seconds", "collector call latency", ["collector", "outcome"])
+    collector_runs = registry.counter(
+        "watcher_collector_runs_total", "collector calls by outcome", ["collector", "outcome"])
+    loop_lag = registry.gauge("watcher_loop_lag_seconds", "asyncio event loop lag (last probe)")
+    loop_lag_hist = registry.histogram(
+        "watcher_loop_lag_distribution_seconds", "asyncio event loop lag",
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+    rows_written = registry.counter("watcher_rows_written_total", "rows inserted per table", ["table"])
+    rows_ignored = registry.counter("watcher_rows_ignored_total", "rows ignored (duplicates) per table", ["table"])
+    commit_latency = registry.histogram("watcher_sqlite_commit_seconds", "writer flush transaction latency")
+
+    def observe_collector(name: str, duration_sec: float, outcome: str) -> None:
+        collector_latency.observe(duration_sec, collector=name, outcome=outcome)
+        collector_runs.inc(collector=name, outcome=outcome)
+
+    def observe_lag(lag_sec: float) -> None:
+        loop_lag.set(lag_sec)
+        loop_lag_hist.observe(lag_sec)
+
+    def observe_flush(stats: Dict[str, Tuple[int, int]], seconds: float) -> None:
+        commit_latency.observe(seconds)
+        for table, (inserted, ignored) in stats.items():
+            rows_written.inc(inserted, table=table)
+            rows_ignored.inc(ignored, table=table)
+
+    scheduler.observer = observe_collector
+    scheduler.on_lag = observe_lag
+    db_writer.writer.on_flush = observe_flush
+
+    def api_calls() -> Dict[Tuple, float]:
+        out = {
+            ("jaeger",): jaeger.stats["api_calls"],
+            ("prometheus",): prom.stats["api_calls"],
+            ("kubernetes_pods",): pods.stats["list_calls"] + pods.stats["watch_calls"],
+            ("kubernetes_nodes",): manager.stats["api_calls"],
+        }
+        if receiver is not None:
+            out[("span_receiver",)] = receiver.stats["requests"]
+        return out
+
+    registry.callback("watcher_api_calls_total", "outbound API calls (receiver: inbound pushes)", "counter",
+                      api_calls, ["source"])
+    registry.callback("watcher_jaeger_saturated_pages_total", "Jaeger pages that hit the limit", "counter",
+                      lambda: {(): jaeger.stats["saturated_pages"]})
+    registry.callback("watcher_pod_informer_events_total", "pod watch events applied", "counter",
+                      lambda: {(): pods.stats["events"]})
+    registry.callback("watcher_pod_informer_relists_total", "pod informer relists", "counter",
+                      lambda: {(): pods.stats["relists"]})
+    registry.callback("watcher_writer_queue_depth", "writer queue items / rows waiting to be written", "gauge",
+                      lambda: dict(zip([("items",), ("rows",)], db_writer.depth())), ["unit"])
+    registry.callback("watcher_writer_backpressure_total", "writer queue full events", "counter",
+                      lambda: {("blocked_puts",): db_writer.stats["blocked_puts"],
+                               ("dropped_rows",): db_writer.stats["dropped_rows"],
+                               ("nowait_dropped_rows",): db_writer.stats["nowait_dropped_rows"]}, ["kind"])
+    registry.callback("watcher_profile_hst_rows_total", "service_profile rows by delta check result", "counter",
+                      lambda: {("written",): profiles.stats["changed"],
+                               ("unchanged",): profiles.stats["unchanged"]}, ["result"])
+    if pod_filter is not None:
+        registry.callback("watcher_pod_snapshot_rows_total", "pod_snapshots rows by change-only filter result",
+                          "counter", lambda: {("written",): pod_filter.stats["passed"],
+                                              ("suppressed",): pod_filter.stats["suppressed"]}, ["result"])
+    if retention is not None:
+        registry.callback("watcher_retention_rows_total", "rows rolled up / deleted by retention", "counter",
+                          lambda: {("rolled",): retention.stats["rolled_rows"],
+                                   ("deleted",): retention.stats["deleted_rows"]}, ["action"])
+        registry.callback("watcher_retention_vacuumed_pages_total", "pages released by incremental vacuum",
+                          "counter", lambda: {(): retention.stats["vacuumed_pages"]})
+        registry.callback("watcher_retention_dropped_partitions_total", "trace partition files unlinked",
+                          "counter", lambda: {(): retention.stats["dropped_partitions"]})
+    registry.callback("watcher_writer_flush_failures_total", "failed writer flushes", "counter",
+                      lambda: {(): db_writer.writer.stats["failures"]})
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Knative watcher")
+    parser.add_argument("--capture", metavar="PATH",
+                        help="수집기가 받은 원본 입력을 gzip 로그로 같이 기록")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="클러스터 / Jaeger / Prometheus 대신 capture 로그를 입력으로 사용")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="재생 배속 (1: 기록 시간 그대로, 0: 대기 없이 최대 속도)")
+    parser.add_argument("--db", metavar="PATH",
+                        help=f"기록할 SQLite 파일 (기본 {DB_PATH}, 재생 모드에서는 필수, traces 파티션은 <PATH>.traces.d)")
+    args = parser.parse_args()
+    # 재생은 현재 시각으로 기록하므로 실제 수집 DB 와 섞이지 않게 별도 파일만 허용
+    if args.replay and (not args.db or os.path.abspath(args.db) == os.path.abspath(DB_PATH)):
+        parser.error(f"--replay 는 {DB_PATH} 가 아닌 별도 --db 경로가 필요함")
+    return args
+
+
 def main():
     PROMETHEUS_URL = "http://localhost:9090"
     JAEGER_URL = "http://localhost:16686"
+    args = parse_args()
+    db_path = args.db or DB_PATH
+    conn = init_db(db_path)
+
+    capture = CaptureLog(args.capture) if args.capture else None
+    replay = ReplayLog(args.replay, speed=args.replay_speed) if args.replay else None
+    if replay is not None:
+        logging.info(f"[replay] {args.replay}: {replay.stats['records']}건, {args.replay_speed}배속")
 
     prom = PrometheusCollector(PROMETHEUS_URL)
     jaeger = JaegerCollector(JAEGER_URL)
-    pods = K8sPodCollector()
-    manager = NodeResourceManager(conn)
-    profiles = ProfileCollector(conn)
+    # pod 수 / 노드 가용량은 list+watch 캐시에서 읽으므로 매 주기 파드 list 호출이 없음
+    ledger = NodeCapacityLedger()
+    pods = K8sPodInformer(v1=replay.k8s_api() if replay is not None else None)
+    pods.add_listener(ledger)
+    manager = NodeResourceManager(conn, ledger=ledger, v1=replay.k8s_api() if replay is not None else None)
+    if replay is not None:
+        replay.install(prom=prom, jaeger=jaeger, pods=pods)
+    elif capture is not None:
+        capture.install(prom=prom, jaeger=jaeger, pods=pods, manager=manager)
+    pods.start()
+    if not pods.synced.wait(timeout=30):
+        logging.warning("pod informer 초기 동기화 대기 시간 초과")
+    # service_profile 읽기 전용 연결 (writer 트랜잭션과 섞이지 않도록)
+    profiles_conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+    profiles = ProfileCollector(profiles_conn)
+    writer = BatchWriter(conn)
 
+    # 노드 row 는 commit 뒤에만 장부에 기록된 것으로 표시 (queue 에서 버려지거나 실패하면 다음 주기에 다시 나옴)
+    def upsert_nodes(rows: List[Tuple]) -> Tuple[int, int]:
+        with conn:
+            conn.executemany(UPSERT_NODE_SQL, rows)
+        ledger.mark_persisted(rows)
+        return len(rows), 0
 
-    logging.info("Knative profiler 시작 (Prometheus / Jaeger 분리 모드)")
+    writer.register_handler("node_resource_status", upsert_nodes)
+    writer.register("profile_hst", ProfileCollector.INSERT_SQL)
 
-    jaeger_store: Dict[str, Dict] = {}
+    # traces 는 시간 파티션 파일로 (windowed 조회는 해당 파티션만, 만료는 파일 삭제)
+    trace_store = None
+    if cfg.TRACE_PARTITIONED:
+        trace_dir = os.path.splitext(db_path)[0] + ".traces.d" if args.db else cfg.TRACE_PARTITION_DIR
+        trace_store = TracePartitionStore(trace_dir)
+        writer.register_handler("traces", trace_store.insert)
 
-    try:
-        while True:
-            creation_time_us = now_us()
-            # =====================================================
-            # 1) Prometheus 출력 (상태 스냅샷)
-            # =====================================================
-            # prom_results = prom.get_service_info()
-            pods_results = pods.get_service_info()
-
-            print("\n=== Prometheus: Knative Service Status ===")
-            if not pods_results:
-                print("No services found.")
-            else:
-                print(f"{'SERVICE':<20} | {'REVISION':<30} | {'POD COUNT':<10}")
-                print("-" * 70)
-                for m in pods_results:
-                    print(
-                        f"{m['service']:<20} | "
-                        f"{m['revision']:<30} | "
-                        f"{m['pod_count']:<10}"
-                    )
-                    try:
-                        cur.execute("""
-                            INSERT OR IGNORE INTO pod_snapshots
-                            (creation_time_us, service, revision, pod_count)
-                            VALUES (?, ?, ?, ?)
-                        """, (creation_time_us, m["service"], m["revision"], int(m["pod_count"])))
-                        conn.commit()
-                    except Exception as e:
-                        print(f"테이블 생성 실패: {e}")
-                        conn.rollback()
-            # =====================================================
-            # 2) Jaeger 출력 (요청 단위 trace 정보)
-            # =====================================================
-            print("\n=== Jaeger: Request-level Durations ===")
-
-            # Jaeger에서 현재 관측 가능한 service 목록
-            try:
-                jaeger_services: List[str] = jaeger.list_services()
-                print(jaeger_services)
-            except Exception as e:
-                logging.error(f"Jaeger service 목록 조회 실패: {e}")
-                time.sleep(10)
-                continue
-
-            try:
-                traces = jaeger.get_traces(
-                    service="activator",
-                    lookback_sec=60,
-                    limit=500
-                )
-            except Exception as e:
-                logging.warning(f"trace 조회 실패: {e}")
-                continue
-
-            jager_results = jaeger.extract_request_info(traces)
-            if jager_results:
-                for r in jager_results:
-                    cur.execute("""
-                        INSERT OR IGNORE INTO traces
-                        (trace_id, creation_time_us, service, revision, start_time_us, duration_ms)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (
-                        r["trace_id"],
-                        creation_time_us,        # 수집 시점
-                        r["service"],
-                        r["revision"],
-                        r["start_us"],           # 이벤트 시점
-                        r["duration_ms"],
-                    ))
-                    conn.commit()
-
-            # =====================================================
-            # 3) 노드 정보 수집
-            # =====================================================
-            manager.sync_cluster_nodes_to_db()
-
-            # =====================================================
-            # 4) 프로필 정보 저장
-            # =====================================================
-            profiles.save_profile()
-
-            time.sleep(1)
+    # traces 와 같은 row 로 서비스별 실행 시간 sketch 갱신 (writer 스레드, 같은 연결)
+    sketches = None
+    if LATENCY_SKETCH_ENABLED:
+        sketches = LatencySketchStore(conn)
+        seeded = sketches.seed_from_traces(now_us() - LATENCY_SKETCH_SEED_SEC * 1_000_000, trace_store)
+        logging.info(f"[latency_sketch] 최근 traces trace_id {seeded}개로 중복 필터 시작")
+        writer.register_handler("latency_sketch", sketches.ingest)
 
-    except KeyboardInterrupt:
-        logging.info("종료 신호 수신, 요약 출력")
+    # service_profile 은 profiler 가 만드므로 아직 없으면 버림 (다시 넣어도 같은 실패)
+    def update_active_containers(rows: List[Tuple]) -> Tuple[int, int]:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'service_profile';").fetchone() is None:
+            return 0, len(rows)
+        with conn:
+            before = conn.total_changes
+            conn.executemany(ACTIVE_CONTAINER_SQL, rows)
+            updated = conn.total_changes - before
+        return updated, len(rows) - updated
 
-        conn.close()
+    writer.register_handler("service_active", update_active_containers)
 
-        print("\n=== Jaeger Summary ===")
-        for svc, data in jaeger_store.items():
-            print(
-                f"SERVICE={svc}, total_requests={len(data['requests'])}"
-            )
+    def submit_traces(rows: List[Tuple], block: bool = True) -> bool:
+        if sketches is not None:
+            db_writer.submit("latency_sketch", rows, block=block)
+        return db_writer.submit("traces", rows, block=block)
+
+    retention = None
+    retention_conn = None
+    if RETENTION_ENABLED:
+        # writer 스레드 call 로 돌리면 보관 정책이 도는 동안 적재가 멈추므로 별도 연결
+        retention_conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        retention = RetentionEngine(
+            retention_conn,
+            raw_ttl_sec=RETENTION_RAW_TTL_SEC,
+            tier_ttl_sec=RETENTION_TIER_TTL_SEC,
+            trace_store=trace_store,
+            ttl_tables={"latency_sketch": ("bucket_us", LATENCY_SKETCH_TTL_SEC)} if sketches is not None else None,
+        )
+
+    pod_filter = ChangeOnlyFilter(keyframe_sec=POD_SNAPSHOT_KEYFRAME_SEC) if POD_SNAPSHOT_CHANGE_ONLY else None
+
+    # 모든 기록은 이 스레드 하나로 (생산자는 bounded queue 에 넣기만 함)
+    def log_flush(stats: Dict[str, Tuple[int, int]]) -> None:
+        for table, (inserted, ignored) in stats.items():
+            logging.info(f"[writer] {table}: inserted={inserted}, ignored={ignored}")
+
+    db_writer = DBWriterThread(
+        writer,
+        maxsize=WRITER_QUEUE_MAXSIZE,
+        flush_interval_sec=WRITER_FLUSH_INTERVAL_SEC,
+        flush_rows=WRITER_FLUSH_ROWS,
+        put_timeout_sec=WRITER_PUT_TIMEOUT_SEC,
+        on_result=log_flush,
+    )
+    db_writer.start()
+
+    interval_scale = 1.0
+    if replay is not None:
+        interval_scale = 1.0 / replay.speed if replay.speed > 0 else 0.0
+    scheduler = build_scheduler(db_writer, prom, jaeger, pods, manager, profiles, retention, pod_filter,
+                                interval_scale=interval_scale, submit_traces=submit_traces)
+
+    # push 수신기: 받은 handle span 을 바로 writer 로 (Jaeger 폴링과 중복은 INSERT OR IGNORE 로 제거)
+    receiver = None
+    if SPAN_RECEIVER_ENABLED:
+        receiver = SpanReceiver(
+            lambda requests_: submit_traces(trace_rows(requests_)),
+            host=SPAN_RECEIVER_HOST,
+            port=SPAN_RECEIVER_PORT,
+        )
+        receiver.start()
+
+    metrics_server = None
+    if METRICS_ENABLED:
+        registry = MetricsRegistry()
+        build_metrics(registry, scheduler, db_writer, prom, jaeger, pods, manager, profiles, receiver, retention, pod_filter)
+        metrics_server = MetricsServer(registry, host=METRICS_HOST, port=METRICS_PORT)
+        metrics_server.start()
+
+    logging.info("Knative watcher 시작 (수집기별 독립 주기 asyncio 모드)")
+
+    try:
+        # 재생 모드는 로그를 다 돌려주면 종료
+        asyncio.run(scheduler.run(replay.finished if replay is not None else None))
+        if replay is not None:
+            logging.info(f"[replay] 완료: {replay.stats}")
+    except KeyboardInterrupt:
+        logging.info("종료 신호 수신, 남은 row 기록")
+    finally:
+        pods.stop_event.set()
+        if capture is not None:
+            capture.close()
+        if receiver is not None:
+            receiver.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        db_writer.stop(timeout=30)
+        conn.close()
+        profiles_conn.close()
+        if retention_conn is not None:
+            retention_conn.close()
+        if trace_store is not None:
+            trace_store.close()
 
 
 if __name__ == "__main__":
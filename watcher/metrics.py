@@ -0,0 +1,159 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# 기본 latency bucket (초)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _fmt_labels(labelnames: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    mtype = "untyped"
+
+    def __init__(self, name: str, help_: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(str(labels.get(k, "")) for k in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.mtype}"]
+
+
+class Counter(_Metric):
+    mtype = "counter"
+
+    def __init__(self, name: str, help_: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_fmt_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    mtype = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    mtype = "histogram"
+
+    def __init__(self, name: str, help_: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_, labelnames)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple, List[float]] = {}   # {labels: [bucket counts..., sum, count]}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = self.header()
+        for key, row in items:
+            for upper, cnt in zip(self.buckets, row):
+                le = 'le="%s"' % upper
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cnt}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {row[-1]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {row[-2]}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {row[-1]}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """scrape 시점에 fn() 으로 값을 읽어오는 metric ({label 값 tuple: value})"""
+
+    def __init__(self, name: str, help_: str, mtype: str, fn: Callable[[], Dict[Tuple, float]], labelnames: Sequence[str] = ()):
+        super().__init__(name, help_, labelnames)
+        self.mtype = mtype
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name}{_fmt_labels(self.labelnames, k)} {v}" for k, v in self.fn().items()]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help_, labelnames))
+
+    def gauge(self, name: str, help_: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help_, labelnames))
+
+    def histogram(self, name: str, help_: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_, labelnames, buckets))
+
+    def callback(self, name: str, help_: str, mtype: str, fn: Callable[[], Dict[Tuple, float]], labelnames: Sequence[str] = ()) -> CallbackMetric:
+        return self._add(CallbackMetric(name, help_, mtype, fn, labelnames))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer(threading.Thread):
+    """GET /metrics 로 Prometheus text format 을 노출하는 HTTP 서버"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "0.0.0.0", port: int = 9108):
+        super().__init__(name="metrics-server", daemon=True)
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+
+    def run(self) -> None:
+        self.server.serve_forever()
+
+    def stop(self) -> None:
+        self.server.shutdown()
@@ -0,0 +1,479 @@
+import logging
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def now_us() -> int:
+    return time.time_ns() // 1_000
+
+
+# ----------------------------
+# roll-up 대상 정의
+# ----------------------------
+# source: {
+#   time_col:   삭제/증분 roll-up 기준 시간 컬럼 (us, 인덱스 있어야 함)
+#   bucket_col: 집계 bucket 을 정하는 시간 식 (us)
+#   keys:       group by 컬럼
+#   aggs:       [(rollup 컬럼, 집계 식, merge 방식 "+" / "max" / "min")]
+# }
+ROLLUP_SOURCES: Dict[str, Dict] = {
+    "traces": {
+        "time_col": "creation_time_us",
+        "bucket_col": "COALESCE(start_time_us, creation_time_us)",
+        "keys": ("service", "revision"),
+        "aggs": (
+            ("req_cnt", "COUNT(*)", "+"),
+            ("duration_sum_ms", "SUM(duration_ms)", "+"),
+            ("duration_max_ms", "MAX(duration_ms)", "max"),
+            ("cold_cnt", "SUM(cold)", "+"),
+            ("queue_wait_sum_ms", "SUM(queue_wait_ms)", "+"),
+        ),
+    },
+    "pod_snapshots": {
+        "time_col": "creation_time_us",
+        "bucket_col": "creation_time_us",
+        "keys": ("service", "revision"),
+        "aggs": (
+            ("samples", "COUNT(*)", "+"),
+            ("pod_count_sum", "SUM(pod_count)", "+"),
+            ("pod_count_min", "MIN(pod_count)", "min"),
+            ("pod_count_max", "MAX(pod_count)", "max"),
+        ),
+    },
+    "profile_hst": {
+        "time_col": "creation_time",
+        "bucket_col": "creation_time",
+        "keys": ("service",),
+        "aggs": (
+            ("samples", "COUNT(*)", "+"),
+            ("qos_sum", "SUM(qos)", "+"),
+            ("qos_min", "MIN(qos)", "min"),
+            ("t_execute_sum", "SUM(t_execute)", "+"),
+            ("request_cnt_max", "MAX(request_cnt)", "max"),
+            ("max_container_max", "MAX(max_container)", "max"),
+            ("min_container_max", "MAX(min_container)", "max"),
+            ("active_container_max", "MAX(active_container)", "max"),
+        ),
+    },
+}
+
+# tier 이름 → bucket 크기 (초)
+ROLLUP_TIERS: Dict[str, int] = {"10s": 10, "1m": 60}
+
+_MERGE = {
+    "+": "COALESCE({c}, 0) + COALESCE(excluded.{c}, 0)",
+    "max": "MAX(COALESCE({c}, excluded.{c}), COALESCE(excluded.{c}, {c}))",
+    "min": "MIN(COALESCE({c}, excluded.{c}), COALESCE(excluded.{c}, {c}))",
+}
+
+
+# 기본 보관 기간: 실험 데이터 (visualization/ 가 읽는 raw 테이블) 가 지워지지 않도록 길게
+RAW_TTL_SEC = 14 * 86400
+TIER_TTL_SEC: Dict[str, float] = {"10s": 30 * 86400, "1m": 365 * 86400}
+
+
+def rollup_table(source: str, tier: str) -> str:
+    return f"{source}_{tier}"
+
+
+class RetentionEngine:
+    """
+    trace_store.db 보관 정책
+
+    1) roll-up: raw row 를 10s / 1m 집계 테이블로 증분 반영
+       (retention_state 의 watermark 이후, settle_sec 보다 오래된 row 만 / 같은 bucket 은 누적 upsert)
+    2) 만료: roll-up 이 끝난 raw row 중 raw_ttl_sec 보다 오래된 것, tier_ttl_sec 보다 오래된 집계 row 를
+       batch_rows 단위 트랜잭션으로 삭제 (writer 가 write lock 을 오래 기다리지 않도록)
+    3) PRAGMA incremental_vacuum 으로 빈 페이지 반환, analyze_interval_sec 마다 ANALYZE
+    4) trace_store (시간 파티션) 사용 시: 닫힌 파티션 파일을 rowid watermark 이후 row 만 증분 roll-up
+       (닫힌 뒤 늦게 들어온 row 도 다음 주기에 반영), raw_ttl_sec 이 지나면 마지막으로 roll-up 후 unlink
+
+    watcher 의 writer 와 별도 연결(WAL)로 돌리는 것을 가정
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        raw_ttl_sec: float = RAW_TTL_SEC,
+        tier_ttl_sec: Optional[Dict[str, float]] = None,
+        settle_sec: float = 60,
+        rollup_chunk_sec: float = 600,
+        batch_rows: int = 5000,
+        max_batches: int = 20,
+        vacuum_pages: int = 2000,
+        analyze_interval_sec: float = 3600,
+        analysis_limit: int = 1000,
+        trace_store=None,
+        ttl_tables: Optional[Dict[str, Tuple[str, float]]] = None,
+    ):
+        self.conn = conn
+        self.trace_store = trace_store
+        # roll-up 없이 보관 기간만 적용하는 테이블 {table: (시간 컬럼(us), ttl 초)} (예: latency_sketch)
+        self.ttl_tables = dict(ttl_tables or {})
+        self.raw_ttl_sec = raw_ttl_sec
+        self.tier_ttl_sec = tier_ttl_sec or dict(TIER_TTL_SEC)
+        self.settle_sec = settle_sec
+        self.rollup_chunk_sec = rollup_chunk_sec
+        self.batch_rows = batch_rows
+        self.max_batches = max_batches
+        self.vacuum_pages = vacuum_pages
+        self.analyze_interval_sec = analyze_interval_sec
+        self.analysis_limit = analysis_limit
+
+        self._last_analyze = 0.0
+        self._warned_auto_vacuum = False
+        self.sources: List[str] = []
+        self.stats = {
+            "rolled_rows": 0,
+            "deleted_rows": 0,
+            "dropped_partitions": 0,
+            "vacuumed_pages": 0,
+            "analyze_runs": 0,
+        }
+
+        self.ensure_schema()
+
+    # ----------------------------
+    # 스키마
+    # ----------------------------
+    def _table_exists(self, name: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?;", (name,)
+        ).fetchone()
+        return row is not None
+
+    def ensure_schema(self) -> None:
+        """roll-up / watermark 테이블 생성 (원본 테이블이 아직 없으면 해당 source 는 건너뜀)"""
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS retention_state (
+                  source        TEXT    PRIMARY KEY,
+                  rolled_until  INTEGER NOT NULL
+                );
+            """)
+            self.sources = []
+            for source, spec in ROLLUP_SOURCES.items():
+                if self._table_exists(source):
+                    self.sources.append(source)
+                    self.conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS idx_{source}_retention_time ON {source}({spec['time_col']});"
+                    )
+                elif not (source == "traces" and self.trace_store is not None):
+                    continue
+                self._create_rollup_tables(source)
+
+    def _create_rollup_tables(self, source: str) -> None:
+        spec = ROLLUP_SOURCES[source]
+        key_cols = ", ".join(f"{k} TEXT NOT NULL" for k in spec["keys"])
+        agg_cols = ", ".join(f"{col} REAL" for col, _, _ in spec["aggs"])
+        for tier in ROLLUP_TIERS:
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {rollup_table(source, tier)} (
+                  bucket_us INTEGER NOT NULL,
+                  {key_cols},
+                  {agg_cols},
+                  PRIMARY KEY (bucket_us, {", ".join(spec["keys"])})
+                );
+            """)
+            # 집계 컬럼이 늘어난 경우 기존 roll-up 테이블에 추가
+            have = {row[1] for row in self.conn.execute(f"PRAGMA table_info({rollup_table(source, tier)});")}
+            for col, _, _ in spec["aggs"]:
+                if col not in have:
+                    self.conn.execute(f"ALTER TABLE {rollup_table(source, tier)} ADD COLUMN {col} REAL;")
+
+    # ----------------------------
+    # roll-up
+    # ----------------------------
+    def _rollup_sql(self, source: str, tier: str, from_table: Optional[str] = None,
+                    range_col: Optional[str] = None) -> str:
+        """range_col: 구간 조건 컬럼 (기본 time_col, 파티션 증분 roll-up 은 rowid)"""
+        spec = ROLLUP_SOURCES[source]
+        bucket_us = ROLLUP_TIERS[tier] * 1_000_000
+        keys = ", ".join(spec["keys"])
+        cols = ", ".join(col for col, _, _ in spec["aggs"])
+        exprs = ", ".join(expr for _, expr, _ in spec["aggs"])
+        merges = ", ".join(f"{col} = {_MERGE[op].format(c=col)}" for col, _, op in spec["aggs"])
+        return f"""
+            INSERT INTO {rollup_table(source, tier)} (bucket_us, {keys}, {cols})
+            SELECT
+                ({spec["bucket_col"]}) / {bucket_us} * {bucket_us} AS b,
+                {keys},
+                {exprs}
+            FROM {from_table or source}
+            WHERE {range_col or spec["time_col"]} >= ? AND {range_col or spec["time_col"]} < ?
+            GROUP BY b, {keys}
+            ON CONFLICT (bucket_us, {keys}) DO UPDATE SET {merges};
+        """
+
+    def _watermark(self, source: str) -> Optional[int]:
+        row = self.conn.execute(
+            "SELECT rolled_until FROM retention_state WHERE source=?;", (source,)
+        ).fetchone()
+        if row is not None:
+            return int(row[0])
+        # 처음: 원본의 가장 오래된 시각부터
+        row = self.conn.execute(f"SELECT MIN({ROLLUP_SOURCES[source]['time_col']}) FROM {source};").fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+
+    def rollup(self, source: str, now: int) -> int:
+        """watermark ~ (now - settle) 구간을 rollup_chunk_sec 씩 나눠 각 tier 에 반영, 반영한 raw row 수 반환"""
+        settled = now - int(self.settle_sec * 1_000_000)
+        chunk_us = int(self.rollup_chunk_sec * 1_000_000)
+        time_col = ROLLUP_SOURCES[source]["time_col"]
+
+        start = self._watermark(source)
+        if start is None:
+            return 0
+
+        rolled = 0
+        for _ in range(self.max_batches):
+            if start >= settled:
+                break
+            end = min(settled, start + chunk_us)
+            # 한 chunk 의 모든 tier + watermark 갱신을 한 트랜잭션으로 (중간 실패 시 중복 누적 없음)
+            with self.conn:
+                for tier in ROLLUP_TIERS:
+                    self.conn.execute(self._rollup_sql(source, tier), (start, end))
+                rolled += self.conn.execute(
+                    f"SELECT COUNT(*) FROM {source} WHERE {time_col} >= ? AND {time_col} < ?;", (start, end)
+                ).fetchone()[0]
+                self._set_watermark(source, end)
+            start = end
+        return rolled
+
+    def _set_watermark(self, source: str, value: int) -> None:
+        self.conn.execute(
+            "INSERT INTO retention_state (source, rolled_until) VALUES (?, ?) "
+            "ON CONFLICT (source) DO UPDATE SET rolled_until = excluded.rolled_until;",
+            (source, value),
+        )
+
+    @staticmethod
+    def _partition_key(start_sec: int) -> str:
+        return f"traces@p{start_sec}"
+
+    def _rollup_partition(self, p: int) -> Optional[int]:
+        """
+        파티션 하나의 rowid watermark 이후 row 를 roll-up, 반영한 row 수 반환 (새 row 가 없으면 None)
+
+        파티션 traces 는 INSERT OR IGNORE 만 하므로 rowid 가 기록 순서대로 증가
+        → 닫힌 뒤 늦게 들어온 row 도 watermark 이후 rowid 로 잡힘
+        """
+        key = self._partition_key(p)
+        self.conn.execute("ATTACH DATABASE ? AS rp", (self.trace_store.partition_path(p),))
+        try:
+            self.trace_store.migrate(self.conn, "rp")
+            with self.conn:
+                last = self.conn.execute(
+                    "SELECT rolled_until FROM retention_state WHERE source=?;", (key,)
+                ).fetchone()
+                top = self.conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM rp.traces;").fetchone()[0]
+                if last is None:
+                    last = 0
+                elif last[0] >= p * 1_000_000:
+                    # 예전 형식 (파티션 끝 시각, 한 번에 전체 roll-up): 그때까지의 row 는 반영된 것으로 봄
+                    self._set_watermark(key, top)
+                    return None
+                else:
+                    last = int(last[0])
+                if top <= last:
+                    return None
+                for tier in ROLLUP_TIERS:
+                    self.conn.execute(self._rollup_sql("traces", tier, "rp.traces", "rowid"), (last + 1, top + 1))
+                rolled = self.conn.execute(
+                    "SELECT COUNT(*) FROM rp.traces WHERE rowid > ? AND rowid <= ?;", (last, top)
+                ).fetchone()[0]
+                self._set_watermark(key, top)
+        finally:
+            self.conn.execute("DETACH DATABASE rp")
+        return rolled
+
+    def rollup_partitions(self, now: int) -> int:
+        """닫힌 traces 파티션마다 watermark 이후 row 를 roll-up (새 row 가 있는 파티션 max_batches 개까지)"""
+        settled = now - int(self.settle_sec * 1_000_000)
+        rolled = 0
+        done = 0
+        for p in self.trace_store.sealed(settled):
+            if done >= self.max_batches:
+                break
+            n = self._rollup_partition(p)
+            if n is not None:
+                rolled += n
+                done += 1
+        return rolled
+
+    def drop_partitions(self, now: int) -> int:
+        """raw_ttl_sec 이 지난 파티션을 마지막으로 roll-up 한 뒤 파일 삭제"""
+        cutoff = now - int(self.raw_ttl_sec * 1_000_000)
+        dropped = 0
+        for p in self.trace_store.sealed(cutoff):
+            key = self._partition_key(p)
+            if self.conn.execute("SELECT 1 FROM retention_state WHERE source=?;", (key,)).fetchone() is None:
+                continue
+            self.stats["rolled_rows"] += self._rollup_partition(p) or 0
+            self.trace_store.drop(p)
+            with self.conn:
+                self.conn.execute("DELETE FROM retention_state WHERE source=?;", (key,))
+            dropped += 1
+        return dropped
+
+    # ----------------------------
+    # 만료
+    # ----------------------------
+    def _delete_before(self, table: str, time_col: str, cutoff: int) -> int:
+        """cutoff 이전 row 를 batch_rows 씩 삭제 (batch 마다 commit → write lock 짧게)"""
+        deleted = 0
+        for _ in range(self.max_batches):
+            with self.conn:
+                cur = self.conn.execute(
+                    f"DELETE FROM {table} WHERE rowid IN "
+                    f"(SELECT rowid FROM {table} WHERE {time_col} < ? LIMIT ?);",
+                    (cutoff, self.batch_rows),
+                )
+            deleted += cur.rowcount
+            if cur.rowcount < self.batch_rows:
+                break
+        return deleted
+
+    def expire(self, source: str, now: int) -> Dict[str, int]:
+        deleted: Dict[str, int] = {}
+
+        # raw: roll-up 이 끝난 구간만 삭제
+        watermark = self._watermark(source) or 0
+        raw_cutoff = min(now - int(self.raw_ttl_sec * 1_000_000), watermark)
+        deleted[source] = self._delete_before(source, ROLLUP_SOURCES[source]["time_col"], raw_cutoff)
+
+        for tier, ttl_sec in self.tier_ttl_sec.items():
+            table = rollup_table(source, tier)
+            deleted[table] = self._delete_before(table, "bucket_us", now - int(ttl_sec * 1_000_000))
+        return deleted
+
+    # ----------------------------
+    # vacuum / analyze
+    # ----------------------------
+    def enable_incremental_vacuum(self) -> None:
+        """
+        auto_vacuum=INCREMENTAL 전환 (기존 DB 는 전체 VACUUM 1회 필요 → 수집 중지 상태에서 실행)
+        """
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        self.conn.execute("VACUUM;")
+
+    def incremental_vacuum(self) -> int:
+        mode = self.conn.execute("PRAGMA auto_vacuum;").fetchone()[0]
+        if mode != 2:
+            if not self._warned_auto_vacuum:
+                logger.warning(
+                    "auto_vacuum 이 INCREMENTAL 이 아님: 삭제된 페이지는 재사용만 되고 파일은 줄지 않음 "
+                    "(retention.py --enable-incremental-vacuum 1회 실행 필요)"
+                )
+                self._warned_auto_vacuum = True
+            return 0
+        free_before = self.conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        self.conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});").fetchall()
+        free_after = self.conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        return max(0, free_before - free_after)
+
+    def analyze(self, force: bool = False) -> bool:
+        """analysis_limit 로 샘플링 범위를 제한한 ANALYZE (인덱스 통계 갱신)"""
+        if not force and time.monotonic() - self._last_analyze < self.analyze_interval_sec:
+            return False
+        self.conn.execute(f"PRAGMA analysis_limit={int(self.analysis_limit)};")
+        for source in self.sources:
+            self.conn.execute(f"ANALYZE {source};")
+            for tier in ROLLUP_TIERS:
+                self.conn.execute(f"ANALYZE {rollup_table(source, tier)};")
+        self.conn.commit()
+        self._last_analyze = time.monotonic()
+        return True
+
+    # ----------------------------
+    # 1회 실행
+    # ----------------------------
+    def run_once(self) -> Dict[str, object]:
+        now = now_us()
+        rolled: Dict[str, int] = {}
+        deleted: Dict[str, int] = {}
+
+        dropped = 0
+
+        for source in self.sources:
+            try:
+                rolled[source] = self.rollup(source, now)
+                deleted.update(self.expire(source, now))
+            except sqlite3.OperationalError as e:
+                # database is locked 등: 이번 주기는 건너뛰고 다음 주기에 이어서
+                logger.warning(f"[retention] {source} 처리 실패: {e}")
+
+        if self.trace_store is not None:
+            try:
+                rolled["traces@partitions"] = self.rollup_partitions(now)
+                dropped = self.drop_partitions(now)
+                for tier, ttl_sec in self.tier_ttl_sec.items():
+                    if "traces" not in self.sources:
+                        table = rollup_table("traces", tier)
+                        deleted[table] = self._delete_before(table, "bucket_us", now - int(ttl_sec * 1_000_000))
+            except sqlite3.OperationalError as e:
+                logger.warning(f"[retention] traces 파티션 처리 실패: {e}")
+
+        for table, (time_col, ttl_sec) in self.ttl_tables.items():
+            try:
+                if self._table_exists(table):
+                    deleted[table] = self._delete_before(table, time_col, now - int(ttl_sec * 1_000_000))
+            except sqlite3.OperationalError as e:
+                logger.warning(f"[retention] {table} 처리 실패: {e}")
+
+        vacuumed = self.incremental_vacuum()
+        analyzed = self.analyze()
+
+        self.stats["rolled_rows"] += sum(rolled.values())
+        self.stats["deleted_rows"] += sum(deleted.values())
+        self.stats["dropped_partitions"] += dropped
+        self.stats["vacuumed_pages"] += vacuumed
+        self.stats["analyze_runs"] += int(analyzed)
+        return {
+            "rolled": rolled,
+            "deleted": deleted,
+            "dropped_partitions": dropped,
+            "vacuumed_pages": vacuumed,
+            "analyzed": analyzed,
+        }
+
+
+def main():
+    import argparse
+    import os
+    import sys
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import cfg
+    from trace_store import TracePartitionStore
+
+    parser = argparse.ArgumentParser(description="trace_store.db roll-up / 만료 / vacuum")
+    parser.add_argument("--db", default="/home/ubuntu/fairness_control/trace_store.db")
+    parser.add_argument("--raw-ttl-sec", type=float, default=RAW_TTL_SEC)
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="auto_vacuum=INCREMENTAL 전환만 하고 종료 (전체 VACUUM 1회, 수집 중지 후 실행, "
+                             "roll-up / 삭제는 하지 않음)")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    store = TracePartitionStore() if cfg.TRACE_PARTITIONED else None
+    try:
+        engine = RetentionEngine(conn, raw_ttl_sec=args.raw_ttl_sec, max_batches=1000, trace_store=store)
+        if args.enable_incremental_vacuum:
+            engine.enable_incremental_vacuum()
+            print(f"auto_vacuum={conn.execute('PRAGMA auto_vacuum;').fetchone()[0]}")
+            return
+        print(engine.run_once())
+        engine.analyze(force=True)
+    finally:
+        conn.close()
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
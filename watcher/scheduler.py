@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CollectorTask:
+    """
+    수집기 1개의 실행 설정
+
+    - fn: 수집 함수 (blocking, 수집기 전용 스레드에서 실행)
+    - sink: fn 결과를 받아 writer 로 넘기는 콜백 (이벤트 루프 스레드에서 실행)
+    - interval_sec 주기로 실행, timeout_sec 를 넘기면 실패로 처리
+    - 연속 실패 시 interval * 2^n (최대 max_backoff_sec) 만큼 쉬었다가 재시도
+    - 타임아웃 난 호출도 스레드에서는 계속 실행되므로, 늦게 끝나면 그 결과를 sink 로 넘김
+      (Jaeger 수집기는 조회 시점에 seen / hwm 을 이미 옮겨서, 버리면 그 trace 는 다시 조회되지 않음)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[], Any],
+        interval_sec: float,
+        timeout_sec: float,
+        sink: Optional[Callable[[Any], None]] = None,
+        max_backoff_sec: float = 30,
+    ):
+        self.name = name
+        self.fn = fn
+        self.interval_sec = interval_sec
+        self.timeout_sec = timeout_sec
+        self.sink = sink
+        self.max_backoff_sec = max_backoff_sec
+
+        self.failures = 0
+        self.runs = 0
+        self.late_results = 0
+        self.last_duration_sec = 0.0
+
+        # 수집기별 전용 스레드: 한 수집기가 느려도 다른 수집기는 영향 없음
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"collector-{name}")
+        self._inflight: Optional[asyncio.Future] = None
+
+    def next_delay(self) -> float:
+        if self.failures == 0:
+            return self.interval_sec
+        return min(self.max_backoff_sec, self.interval_sec * (2 ** self.failures))
+
+
+class CollectorScheduler:
+    """
+    asyncio 기반 수집 런타임: 수집기마다 독립된 주기/타임아웃/backoff 로 실행
+
+    - observer(name, duration_sec, outcome): 호출 1회마다 ("ok" / "timeout" / "error" / "skipped")
+    - on_lag(lag_sec): 이벤트 루프 지연 (lag_probe_sec 마다 측정)
+    """
+
+    def __init__(
+        self,
+        observer: Optional[Callable[[str, float, str], None]] = None,
+        on_lag: Optional[Callable[[float], None]] = None,
+        lag_probe_sec: float = 0.5,
+    ):
+        self.tasks: List[CollectorTask] = []
+        self.observer = observer
+        self.on_lag = on_lag
+        self.lag_probe_sec = lag_probe_sec
+        self.loop_lag_sec = 0.0
+
+    def add(self, task: CollectorTask) -> CollectorTask:
+        self.tasks.append(task)
+        return task
+
+    def _observe(self, name: str, duration_sec: float, outcome: str) -> None:
+        if self.observer is not None:
+            self.observer(name, duration_sec, outcome)
+
+    def _deliver_late(self, task: CollectorTask, fut: asyncio.Future) -> None:
+        """타임아웃 후에 끝난 호출의 결과 처리 (이벤트 루프 스레드에서 done callback 으로 실행)"""
+        if fut.cancelled():
+            return
+        exc = fut.exception()
+        if exc is not None:
+            logger.warning(f"[{task.name}] 타임아웃 난 호출이 실패로 끝남: {exc}")
+            return
+        task.late_results += 1
+        logger.info(f"[{task.name}] 타임아웃 난 호출 결과를 늦게 반영")
+        if task.sink is not None:
+            try:
+                task.sink(fut.result())
+            except Exception as e:
+                logger.warning(f"[{task.name}] 늦은 결과 반영 실패: {e}")
+
+    async def _run_task(self, task: CollectorTask) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            started = time.monotonic()
+
+            if task._inflight is not None and not task._inflight.done():
+                # 이전 호출이 타임아웃 후에도 아직 실행 중 → 이번 주기는 건너뜀
+                logger.warning(f"[{task.name}] 이전 호출이 아직 실행 중, 이번 주기 건너뜀")
+                self._observe(task.name, 0.0, "skipped")
+            else:
+                task._inflight = loop.run_in_executor(task._executor, task.fn)
+                outcome = "ok"
+                try:
+                    result = await asyncio.wait_for(asyncio.shield(task._inflight), task.timeout_sec)
+                    if task.sink is not None:
+                        task.sink(result)
+                    task.failures = 0
+                except asyncio.CancelledError:
+                    raise
+                except asyncio.TimeoutError:
+                    outcome = "timeout"
+                    task.failures += 1
+                    logger.warning(f"[{task.name}] {task.timeout_sec}s 타임아웃 (연속 실패 {task.failures})")
+                    task._inflight.add_done_callback(functools.partial(self._deliver_late, task))
+                except Exception as e:
+                    outcome = "error"
+                    task.failures += 1
+                    logger.warning(f"[{task.name}] 수집 실패: {e} (연속 실패 {task.failures})")
+
+                task.runs += 1
+                task.last_duration_sec = time.monotonic() - started
+                self._observe(task.name, task.last_duration_sec, outcome)
+
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(0.0, task.next_delay() - elapsed))
+
+    async def _probe_lag(self) -> None:
+        """sleep 이 예정보다 얼마나 늦게 깨어나는지로 이벤트 루프 지연 측정"""
+        while True:
+            expected = time.monotonic() + self.lag_probe_sec
+            await asyncio.sleep(self.lag_probe_sec)
+            self.loop_lag_sec = max(0.0, time.monotonic() - expected)
+            if self.on_lag is not None:
+                self.on_lag(self.loop_lag_sec)
+
+    async def run(self, stop_event: Optional[threading.Event] = None) -> None:
+        """모든 수집기 실행 (stop_event 가 set 되면 종료, 없으면 취소될 때까지)"""
+        runner = asyncio.gather(self._probe_lag(), *(self._run_task(task) for task in self.tasks))
+        try:
+            if stop_event is None:
+                await runner
+                return
+            while not stop_event.is_set() and not runner.done():
+                await asyncio.sleep(self.lag_probe_sec)
+            if runner.done():
+                runner.result()
+                return
+            runner.cancel()
+            try:
+                await runner
+            except asyncio.CancelledError:
+                pass
+        finally:
+            for task in self.tasks:
+                task._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,344 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def enable_wal(conn: sqlite3.Connection) -> None:
+    """WAL 모드: writer 가 commit 하는 동안에도 profiler/controller 의 read 가 막히지 않음"""
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+
+
+class BatchWriter:
+    """
+    수집 주기 동안 쌓인 row 를 테이블별로 버퍼링했다가
+    flush() 에서 executemany 로 한 트랜잭션에 기록 (주기당 commit/fsync 1회)
+
+    add/extend 는 여러 스레드에서 호출 가능, flush 는 conn 을 쓰는 스레드 1개에서만 호출
+    """
+
+    STATEMENTS = {
+        "pod_snapshots": """
+            INSERT OR IGNORE INTO pod_snapshots
+            (creation_time_us, service, revision, pod_count)
+            VALUES (?, ?, ?, ?)
+        """,
+        "traces": """
+            INSERT OR IGNORE INTO traces
+            (trace_id, creation_time_us, service, revision, start_time_us, duration_ms, queue_wait_ms, cold)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+    }
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.statements: Dict[str, str] = dict(self.STATEMENTS)
+        # SQL 대신 함수로 기록하는 테이블 (예: 파티션 저장소), handler(rows) -> (inserted, ignored)
+        self.handlers: Dict[str, Callable[[List[Tuple]], Tuple[int, int]]] = {}
+        self._buffer: Dict[str, List[Tuple]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        # flush 성공 시 on_flush(stats, commit 소요 초) 호출 (metrics 연동용)
+        self.on_flush: Optional[Callable[[Dict[str, Tuple[int, int]], float], None]] = None
+        self.stats = {"flushes": 0, "failures": 0}
+
+    def register(self, table: str, sql: str) -> None:
+        self.statements[table] = sql
+
+    def register_handler(self, table: str, handler: Callable[[List[Tuple]], Tuple[int, int]]) -> None:
+        self.handlers[table] = handler
+
+    def add(self, table: str, row: Tuple) -> None:
+        with self._lock:
+            self._buffer.setdefault(table, []).append(row)
+
+    def extend(self, table: str, rows: Iterable[Tuple]) -> None:
+        rows = list(rows)
+        with self._lock:
+            self._buffer.setdefault(table, []).extend(rows)
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(rows) for rows in self._buffer.values())
+
+    def flush(self) -> Dict[str, Tuple[int, int]]:
+        """
+        버퍼 전체를 한 트랜잭션으로 기록
+
+        Returns:
+            {table: (inserted, ignored)}
+        """
+        with self._flush_lock:
+            return self._flush()
+
+    def _requeue(self, buffered: Dict[str, List[Tuple]]) -> None:
+        with self._lock:
+            for table, rows in buffered.items():
+                self._buffer.setdefault(table, [])[:0] = rows
+
+    def _flush(self) -> Dict[str, Tuple[int, int]]:
+        with self._lock:
+            buffered, self._buffer = self._buffer, {}
+        stats: Dict[str, Tuple[int, int]] = {}
+        if not buffered:
+            return stats
+
+        handled = {t: buffered.pop(t) for t in list(buffered) if t in self.handlers}
+        for table in [t for t in buffered if t not in self.statements]:
+            # 등록 안 된 테이블: 다시 넣어도 계속 실패하므로 버림
+            rows = buffered.pop(table)
+            self.stats["failures"] += 1
+            logger.error(f"등록되지 않은 테이블 {table}: {len(rows)} rows 버림")
+
+        started = time.monotonic()
+        try:
+            if buffered:
+                with self.conn:
+                    for table, rows in buffered.items():
+                        before = self.conn.total_changes
+                        self.conn.executemany(self.statements[table], rows)
+                        inserted = self.conn.total_changes - before
+                        stats[table] = (inserted, max(0, len(rows) - inserted))
+        except sqlite3.Error as e:
+            # 실패한 배치는 다음 flush 에서 다시 시도
+            self.stats["failures"] += 1
+            logger.error(f"배치 기록 실패 ({sum(len(r) for r in buffered.values())} rows): {e}")
+            self._requeue(buffered)
+            stats = {}
+        except Exception:
+            # sqlite 오류가 아닌 예외는 재시도해도 같으므로 버림 (writer 스레드는 계속)
+            self.stats["failures"] += 1
+            logger.exception(f"배치 기록 중 예외, {sum(len(r) for r in buffered.values())} rows 버림")
+            stats = {}
+
+        for table, rows in handled.items():
+            try:
+                stats[table] = self.handlers[table](rows)
+            except sqlite3.Error as e:
+                self.stats["failures"] += 1
+                logger.error(f"{table} 기록 실패 ({len(rows)} rows): {e}")
+                self._requeue({table: rows})
+            except Exception:
+                self.stats["failures"] += 1
+                logger.exception(f"{table} handler 예외, {len(rows)} rows 버림")
+
+        if not stats:
+            return stats
+
+        self.stats["flushes"] += 1
+        if self.on_flush is not None:
+            try:
+                self.on_flush(stats, time.monotonic() - started)
+            except Exception:
+                logger.exception("on_flush 콜백 실패")
+        return stats
+
+
+class DBWriterThread(threading.Thread):
+    """
+    프로세스당 하나뿐인 SQLite writer 스레드
+
+    - 생산자(수집기 sink, 수신기 스레드 등)는 submit() 으로 bounded queue 에 row 를 넣기만 함
+    - 이 스레드만 BatchWriter 의 연결에 기록: flush_interval_sec 마다 또는 flush_rows 이상 쌓이면 한 트랜잭션으로 flush
+    - queue 가 가득 차면 생산자가 put_timeout_sec 까지 대기 (backpressure), 그래도 자리가 없으면 버리고 dropped 증가
+      (asyncio 이벤트 루프 스레드의 sink 는 block=False: 기다리지 않고 바로 버림 → 다른 수집기 주기가 밀리지 않음)
+    - call(fn): 같은 연결로 해야 하는 작업 (profiler 주기 등) 을 writer 스레드에서 순서대로 실행 (fn 이 트랜잭션 관리)
+    - 항목 / flush 하나가 예외를 내도 로그만 남기고 계속 (스레드가 죽으면 call() 이 영원히 대기하므로)
+    """
+
+    def __init__(
+        self,
+        writer: BatchWriter,
+        maxsize: int = 1000,
+        flush_interval_sec: float = 1.0,
+        flush_rows: int = 5000,
+        put_timeout_sec: float = 1.0,
+        on_result: Optional[Callable[[Dict[str, Tuple[int, int]]], None]] = None,
+    ):
+        super().__init__(name="db-writer", daemon=True)
+        self.writer = writer
+        self.flush_interval_sec = flush_interval_sec
+        self.flush_rows = flush_rows
+        self.put_timeout_sec = put_timeout_sec
+        self.on_result = on_result
+
+        self._queue: "queue.Queue[Tuple[str, Any, Any]]" = queue.Queue(maxsize=maxsize)
+        self._stop_event = threading.Event()
+        self._buffered_rows = 0
+        self._queued_rows = 0
+        self._queued_lock = threading.Lock()
+        self.stats = {"enqueued_rows": 0, "blocked_puts": 0, "dropped_rows": 0, "nowait_dropped_rows": 0, "calls": 0}
+
+    # ----------------------------
+    # 생산자 쪽 API
+    # ----------------------------
+    def _put(self, item: Tuple[str, Any, Any], timeout: Optional[float]) -> bool:
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.stats["blocked_puts"] += 1
+        try:
+            self._queue.put(item, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def submit(self, table: str, rows: Iterable[Tuple], block: bool = True) -> bool:
+        """
+        row 를 queue 에 넣음, 가득 찬 상태가 put_timeout_sec 동안 계속되면 버리고 False
+        block=False: 가득 차 있으면 기다리지 않고 바로 버림 (이벤트 루프 스레드에서 호출할 때)
+        """
+        rows = list(rows)
+        if not rows:
+            return True
+        if block:
+            ok = self._put(("rows", table, rows), self.put_timeout_sec)
+        else:
+            try:
+                self._queue.put_nowait(("rows", table, rows))
+                ok = True
+            except queue.Full:
+                self.stats["nowait_dropped_rows"] += len(rows)
+                ok = False
+        if not ok:
+            self.stats["dropped_rows"] += len(rows)
+            logger.warning(f"writer queue 가득 참: {table} {len(rows)} rows 버림")
+            return False
+        with self._queued_lock:
+            self._queued_rows += len(rows)
+        self.stats["enqueued_rows"] += len(rows)
+        return True
+
+    def call(self, fn: Callable[[sqlite3.Connection], Any], timeout: Optional[float] = None) -> Any:
+        """fn(conn) 을 writer 스레드에서 실행하고 결과 반환 (앞서 넣은 row 를 먼저 flush)"""
+        fut: Future = Future()
+        if not self.is_alive():
+            raise RuntimeError("db-writer 스레드가 실행 중이 아님")
+        if not self._put(("call", fn, fut), timeout):
+            raise queue.Full("writer queue 가득 참")
+        if timeout is not None:
+            return fut.result(timeout)
+        # 무기한 대기 중에도 스레드가 죽으면 빠져나옴
+        while True:
+            try:
+                return fut.result(1.0)
+            except FutureTimeout:
+                if not self.is_alive() and not fut.done():
+                    raise RuntimeError("db-writer 스레드가 종료되어 call 결과를 받을 수 없음")
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """지금까지 넣은 row 가 기록될 때까지 대기"""
+        self.call(lambda conn: None, timeout)
+
+    def depth(self) -> Tuple[int, int]:
+        """(queue 항목 수, queue + 버퍼의 row 수)"""
+        with self._queued_lock:
+            return self._queue.qsize(), self._queued_rows + self._buffered_rows
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """남은 항목을 모두 기록한 뒤 종료"""
+        self._stop_event.set()
+        self.join(timeout)
+
+    # ----------------------------
+    # writer 스레드
+    # ----------------------------
+    def _flush(self) -> None:
+        try:
+            result = self.writer.flush()
+        except Exception:
+            logger.exception("flush 실패")
+            result = {}
+        self._buffered_rows = self.writer.pending()
+        if result and self.on_result is not None:
+            try:
+                self.on_result(result)
+            except Exception:
+                logger.exception("on_result 콜백 실패")
+
+    def _handle(self, item: Tuple[str, Any, Any]) -> None:
+        kind, a, b = item
+        if kind == "rows":
+            self.writer.extend(a, b)
+            with self._queued_lock:
+                self._queued_rows -= len(b)
+                self._buffered_rows += len(b)
+            return
+
+        # call: 순서 보장을 위해 버퍼를 먼저 기록
+        self._flush()
+        self.stats["calls"] += 1
+        if not b.set_running_or_notify_cancel():
+            return
+        try:
+            b.set_result(a(self.writer.conn))
+        except BaseException as e:
+            b.set_exception(e)
+
+    def run(self) -> None:
+        next_flush = time.monotonic() + self.flush_interval_sec
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            try:
+                item = self._queue.get(timeout=max(0.0, min(next_flush - time.monotonic(), 0.5)))
+            except queue.Empty:
+                item = None
+            if item is not None:
+                try:
+                    self._handle(item)
+                except Exception:
+                    logger.exception(f"writer 항목 처리 실패: {item[0]} {item[1] if item[0] == 'rows' else ''}")
+
+            if self._buffered_rows >= self.flush_rows or time.monotonic() >= next_flush:
+                self._flush()
+                next_flush = time.monotonic() + self.flush_interval_sec
+        self._flush()
+
+
+class ChangeOnlyFilter:
+    """
+    (time_us, *key, value) 형태 row 에서 값이 바뀐 것만 통과시키는 run-length 필터
+
+    - key 별로 마지막 기록 값과 같으면 버림 (keyframe_sec 가 지나면 같은 값도 1번 기록)
+    - 이전 주기에 있던 key 가 사라지면 missing_value 로 1번 기록 후 잊음
+    읽는 쪽은 구간 시작 직전 row 부터 계단형으로 펼쳐서 사용
+    """
+
+    def __init__(self, key_len: int = 2, keyframe_sec: float = 60, missing_value=0):
+        self.key_len = key_len
+        self.keyframe_us = int(keyframe_sec * 1_000_000)
+        self.missing_value = missing_value
+        self._last: Dict[Tuple, Tuple[object, int]] = {}   # {key: (value, 기록 시각)}
+        self.stats = {"passed": 0, "suppressed": 0}
+
+    def filter(self, rows: Iterable[Tuple]) -> List[Tuple]:
+        out: List[Tuple] = []
+        seen = set()
+        ts = None
+        for row in rows:
+            ts = row[0]
+            key = tuple(row[1:1 + self.key_len])
+            value = row[1 + self.key_len]
+            seen.add(key)
+
+            last = self._last.get(key)
+            if last is not None and last[0] == value and ts - last[1] < self.keyframe_us:
+                self.stats["suppressed"] += 1
+                continue
+            self._last[key] = (value, ts)
+            out.append(row)
+
+        if ts is not None:
+            for key in [k for k in self._last if k not in seen]:
+                if self._last.pop(key)[0] != self.missing_value:
+                    out.append((ts, *key, self.missing_value))
+
+        self.stats["passed"] += len(out)
+        return out